@@ -0,0 +1,52 @@
+import asyncio
+import logging
+
+import aiosqlite
+
+from src.full_node.db_migration import DB_VERSION, migrate_db
+from src.util.config import load_config
+from src.util.path import path_from_root
+
+
+def make_parser(parser):
+
+    parser.add_argument(
+        "command",
+        choices=["migrate"],
+        type=str,
+        help=f"migrate: upgrade the full node database to version {DB_VERSION}",
+    )
+    parser.add_argument(
+        "-b",
+        "--batch-size",
+        help="Number of rows to migrate per transaction. Defaults to 10000",
+        type=int,
+        default=10000,
+    )
+
+    parser.set_defaults(function=db)
+
+
+async def async_migrate(args, parser):
+    config = load_config(args.root_path, "config.yaml", "full_node")
+    db_path = path_from_root(args.root_path, config["database_path"])
+    if not db_path.exists():
+        print(f"{db_path} does not exist")
+        return 1
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    print(f"Migrating {db_path}, the full node must be stopped")
+    connection = await aiosqlite.connect(db_path)
+    try:
+        migrated = await migrate_db(connection, args.batch_size)
+    finally:
+        await connection.close()
+    if migrated:
+        print(f"Migrated to database version {DB_VERSION}")
+    else:
+        print(f"Already at database version {DB_VERSION}")
+    return 0
+
+
+def db(args, parser):
+    return asyncio.get_event_loop().run_until_complete(async_migrate(args, parser))
@@ -224,12 +224,12 @@ async def validate_finished_block_header(
     return None
 
 
-def pre_validate_finished_block_header(constants: ConsensusConstants, data: bytes):
+def pre_validate_finished_block_header(
+    constants: ConsensusConstants, block: FullBlock
+) -> Tuple[bool, Optional[bytes]]:
     """
     Validates all parts of block that don't need to be serially checked
     """
-    block = FullBlock.from_bytes(data)
-
     if not block.proof_of_time:
         return False, None
 
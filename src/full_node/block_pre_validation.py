@@ -0,0 +1,124 @@
+from typing import Dict, List, Optional, Tuple
+
+from blspy import AugSchemeMPL, G1Element
+
+from src.consensus.constants import ConsensusConstants
+from src.full_node.block_header_validation import pre_validate_finished_block_header
+from src.types.full_block import FullBlock
+from src.types.name_puzzle_condition import NPC
+from src.util.condition_tools import pkm_pairs_for_conditions_dict
+from src.util.errors import Err
+from src.util.ints import uint64
+from src.util.mempool_check_conditions import get_name_puzzle_conditions
+
+# The error, NPC list and CLVM cost of running a block generator in a worker. The hashes in
+# the NPC list are plain bytes, since bytes32 cannot be pickled.
+WorkerNPCResult = Tuple[Optional[Err], List[Tuple[bytes, bytes, Dict]], int]
+
+# (header is valid, proof of space quality string, aggregated signature is valid, result of
+# running the generator, if the block has one which matches its generator hash)
+PreValidationResult = Tuple[bool, Optional[bytes], bool, Optional[WorkerNPCResult]]
+
+# Constants of a pre-validation worker process, set once when the process starts
+_worker_constants: Optional[ConsensusConstants] = None
+
+
+def worker_constants(constants: ConsensusConstants) -> ConsensusConstants:
+    """
+    The constants shipped to the worker processes. The genesis block is not used for
+    pre-validation, so it's left out.
+    """
+    return constants.replace(GENESIS_BLOCK=b"")
+
+
+def init_pre_validation_worker(constants: ConsensusConstants) -> None:
+    """ Initializer of the processes of the pre-validation pool. """
+    global _worker_constants
+    _worker_constants = constants
+
+
+def block_signature_pairs(
+    block: FullBlock, npc_list: List[NPC]
+) -> Tuple[List[G1Element], List[bytes]]:
+    """
+    The public keys and messages of the aggregated signature of a block. The pool signature
+    on the pool target is aggregated along with the transaction signatures.
+    """
+    pks: List[G1Element] = [block.proof_of_space.pool_public_key]
+    msgs: List[bytes] = [bytes(block.header.data.pool_target)]
+    for npc in npc_list:
+        for pk, m in pkm_pairs_for_conditions_dict(npc.condition_dict, npc.coin_name):
+            pks.append(pk)
+            msgs.append(m)
+    return pks, msgs
+
+
+def pre_validate_block_signature(
+    block: FullBlock, npc_result: Optional[Tuple[Optional[Err], List[NPC], uint64]]
+) -> bool:
+    """
+    Verifies the aggregated signature of the block, which does not depend on the chain,
+    given the result of running its generator, if it has one. If it returns False, the block
+    is invalid, or its transactions are, which full validation reports.
+    """
+    npc_list: List[NPC] = []
+    if npc_result is not None:
+        error, npc_list, _ = npc_result
+        if error is not None:
+            return False
+    if not block.header.data.aggregated_signature:
+        return False
+    try:
+        pks, msgs = block_signature_pairs(block, npc_list)
+    except (ValueError, RuntimeError):
+        # Invalid public keys in the conditions
+        return False
+    return AugSchemeMPL.agg_verify(pks, msgs, block.header.data.aggregated_signature)
+
+
+def pre_validate_blocks(blocks: List[bytes]) -> List[PreValidationResult]:
+    """
+    Runs in a worker process of the pre-validation pool. Validates all parts of the serialized
+    blocks that don't need to be serially checked.
+    """
+    assert _worker_constants is not None
+    results: List[PreValidationResult] = []
+    for data in blocks:
+        block = FullBlock.from_bytes(data)
+        valid, pos_quality_string = pre_validate_finished_block_header(
+            _worker_constants, block
+        )
+        if not valid:
+            results.append((False, None, False, None))
+            continue
+        npc_result: Optional[Tuple[Optional[Err], List[NPC], uint64]] = None
+        worker_npc_result: Optional[WorkerNPCResult] = None
+        if block.transactions_generator is not None:
+            npc_result = get_name_puzzle_conditions(block.transactions_generator)
+            # Only sent back if it can be cached under the generator hash of the block
+            if (
+                block.transactions_generator.get_tree_hash()
+                == block.header.data.generator_hash
+            ):
+                error, npc_list, cost = npc_result
+                worker_npc_result = (
+                    error,
+                    [
+                        (
+                            bytes(npc.coin_name),
+                            bytes(npc.puzzle_hash),
+                            npc.condition_dict,
+                        )
+                        for npc in npc_list
+                    ],
+                    int(cost),
+                )
+        results.append(
+            (
+                True,
+                pos_quality_string,
+                pre_validate_block_signature(block, npc_result),
+                worker_npc_result,
+            )
+        )
+    return results
@@ -24,13 +24,13 @@ class BlockStore:
         # All full blocks which have been added to the blockchain. Header_hash -> block
         self.db = connection
         await self.db.execute(
-            "CREATE TABLE IF NOT EXISTS blocks(height bigint, header_hash text PRIMARY KEY, block blob)"
+            "CREATE TABLE IF NOT EXISTS blocks(height bigint, header_hash blob PRIMARY KEY, block blob)"
         )
 
         # Headers
         await self.db.execute(
             "CREATE TABLE IF NOT EXISTS headers(height bigint, header_hash "
-            "text PRIMARY KEY, proof_hash text, challenge_hash text, header "
+            "blob PRIMARY KEY, proof_hash blob, challenge_hash blob, header "
             "blob, is_lca tinyint, is_tip tinyint)"
         )
 
@@ -43,9 +43,13 @@ class BlockStore:
         )
 
         # is_lca and is_tip index to quickly find tips and lca
-        await self.db.execute("CREATE INDEX IF NOT EXISTS hh on headers(header_hash)")
         await self.db.execute("CREATE INDEX IF NOT EXISTS lca on headers(is_lca)")
         await self.db.execute("CREATE INDEX IF NOT EXISTS tip on headers(is_tip)")
+
+        # A single row with the latest ChainSnapshot, and the version of its format
+        await self.db.execute(
+            "CREATE TABLE IF NOT EXISTS chain_snapshot(id int PRIMARY KEY, version int, snapshot blob)"
+        )
         await self.db.commit()
         self.proof_of_time_heights = {}
         self.challenge_hash_dict = {}
@@ -61,14 +65,15 @@ class BlockStore:
             return Header.from_bytes(row[0])
         return None
 
-    async def set_lca(self, header_hash: bytes32) -> None:
+    async def set_lca(self, header_hash: bytes32, commit: bool = True) -> None:
         cursor_1 = await self.db.execute("UPDATE headers SET is_lca=0 WHERE is_lca=1")
         await cursor_1.close()
         cursor_2 = await self.db.execute(
-            "UPDATE headers SET is_lca=1 WHERE header_hash=?", (header_hash.hex(),)
+            "UPDATE headers SET is_lca=1 WHERE header_hash=?", (header_hash,)
         )
         await cursor_2.close()
-        await self.db.commit()
+        if commit:
+            await self.db.commit()
 
     async def get_tips(self) -> List[bytes32]:
         cursor = await self.db.execute("SELECT header from headers WHERE is_tip=1")
@@ -76,21 +81,22 @@ class BlockStore:
         await cursor.close()
         return [Header.from_bytes(row[0]) for row in rows]
 
-    async def set_tips(self, header_hashes: List[bytes32]) -> None:
+    async def set_tips(self, header_hashes: List[bytes32], commit: bool = True) -> None:
         cursor_1 = await self.db.execute("UPDATE headers SET is_tip=0 WHERE is_tip=1")
         await cursor_1.close()
-        tips_db = tuple([h.hex() for h in header_hashes])
+        tips_db = tuple(header_hashes)
 
         formatted_str = f'UPDATE headers SET is_tip=1 WHERE header_hash in ({"?," * (len(tips_db) - 1)}?)'
         cursor_2 = await self.db.execute(formatted_str, tips_db)
         await cursor_2.close()
-        await self.db.commit()
+        if commit:
+            await self.db.commit()
 
-    async def add_block(self, block: FullBlock) -> None:
+    async def add_block(self, block: FullBlock, commit: bool = True) -> None:
         assert block.proof_of_time is not None
         cursor_1 = await self.db.execute(
             "INSERT OR REPLACE INTO blocks VALUES(?, ?, ?)",
-            (block.height, block.header_hash.hex(), bytes(block)),
+            (block.height, block.header_hash, bytes(block)),
         )
         await cursor_1.close()
         proof_hash = std_hash(
@@ -100,18 +106,19 @@ class BlockStore:
             ("INSERT OR REPLACE INTO headers VALUES(?, ?, ?, ?, ?, 0, 0)"),
             (
                 block.height,
-                block.header_hash.hex(),
-                proof_hash.hex(),
-                block.proof_of_space.challenge_hash.hex(),
+                block.header_hash,
+                proof_hash,
+                block.proof_of_space.challenge_hash,
                 bytes(block.header),
             ),
         )
         await cursor_2.close()
-        await self.db.commit()
+        if commit:
+            await self.db.commit()
 
     async def get_block(self, header_hash: bytes32) -> Optional[FullBlock]:
         cursor = await self.db.execute(
-            "SELECT block from blocks WHERE header_hash=?", (header_hash.hex(),)
+            "SELECT block from blocks WHERE header_hash=?", (header_hash,)
         )
         row = await cursor.fetchone()
         await cursor.close()
@@ -134,13 +141,60 @@ class BlockStore:
         cursor = await self.db.execute("SELECT header_hash, header from headers")
         rows = await cursor.fetchall()
         await cursor.close()
-        return {bytes.fromhex(row[0]): Header.from_bytes(row[1]) for row in rows}
+        return {bytes32(row[0]): Header.from_bytes(row[1]) for row in rows}
+
+    async def get_headers_above(
+        self, height: uint32
+    ) -> Dict[bytes32, Tuple[Header, bytes32]]:
+        """ The headers above a height, with the challenge hash of each. """
+        cursor = await self.db.execute(
+            "SELECT header_hash, header, challenge_hash from headers WHERE height>?",
+            (height,),
+        )
+        rows = await cursor.fetchall()
+        await cursor.close()
+        return {
+            bytes32(row[0]): (Header.from_bytes(row[1]), bytes32(row[2]))
+            for row in rows
+        }
+
+    async def get_header(
+        self, header_hash: bytes32
+    ) -> Optional[Tuple[Header, bytes32]]:
+        """ The header with a header hash, with its challenge hash. """
+        cursor = await self.db.execute(
+            "SELECT header, challenge_hash from headers WHERE header_hash=?",
+            (header_hash,),
+        )
+        row = await cursor.fetchone()
+        await cursor.close()
+        if row is not None:
+            return Header.from_bytes(row[0]), bytes32(row[1])
+        return None
 
     async def get_proof_hashes(self) -> Dict[bytes32, bytes32]:
         cursor = await self.db.execute("SELECT header_hash, proof_hash from headers")
         rows = await cursor.fetchall()
         await cursor.close()
-        return {bytes.fromhex(row[0]): bytes.fromhex(row[1]) for row in rows}
+        return {bytes32(row[0]): bytes32(row[1]) for row in rows}
+
+    async def get_chain_snapshot(self) -> Optional[Tuple[int, bytes]]:
+        cursor = await self.db.execute(
+            "SELECT version, snapshot from chain_snapshot WHERE id=0"
+        )
+        row = await cursor.fetchone()
+        await cursor.close()
+        if row is not None:
+            return row[0], bytes(row[1])
+        return None
+
+    async def set_chain_snapshot(self, version: int, snapshot: bytes) -> None:
+        cursor = await self.db.execute(
+            "INSERT OR REPLACE INTO chain_snapshot VALUES(0, ?, ?)",
+            (version, snapshot),
+        )
+        await cursor.close()
+        await self.db.commit()
 
     async def init_challenge_hashes(self) -> None:
         cursor = await self.db.execute(
@@ -148,9 +202,7 @@ class BlockStore:
         )
         rows = await cursor.fetchall()
         await cursor.close()
-        self.challenge_hash_dict = {
-            bytes.fromhex(row[0]): bytes.fromhex(row[1]) for row in rows
-        }
+        self.challenge_hash_dict = {bytes32(row[0]): bytes32(row[1]) for row in rows}
 
     def get_challenge_hash(self, header_hash: bytes32) -> bytes32:
         return self.challenge_hash_dict[header_hash]
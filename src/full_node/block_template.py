@@ -0,0 +1,108 @@
+import heapq
+from typing import Dict, List, Optional, Set, Tuple
+
+from src.full_node.mempool import Mempool
+from src.types.mempool_item import MempoolItem
+from src.types.sized_bytes import bytes32
+from src.types.spend_bundle import SpendBundle
+
+
+def get_package(
+    item: MempoolItem, pool: Mempool, selected: Set[bytes32]
+) -> List[MempoolItem]:
+    """
+    Returns the item and its ancestors in the pool, the items which create the coins it
+    spends, which are not selected yet. A block can only include them all together.
+    """
+    package: List[MempoolItem] = []
+    visited: Set[bytes32] = {item.name}
+    to_visit: List[MempoolItem] = [item]
+    while len(to_visit) > 0:
+        current = to_visit.pop()
+        package.append(current)
+        for coin in current.removals:
+            parent = pool.additions.get(coin.name())
+            if (
+                parent is not None
+                and parent.name not in visited
+                and parent.name not in selected
+            ):
+                visited.add(parent.name)
+                to_visit.append(parent)
+    return package
+
+
+def package_fee_per_cost(package: List[MempoolItem]) -> float:
+    cost = sum(item.cost for item in package)
+    if cost == 0:
+        return 0
+    return sum(item.fee for item in package) / cost
+
+
+class BlockTemplate:
+    """
+    The items of the pool of a tip which go into the next block on that tip. Items are
+    chosen by the fee per cost of their package, so an item which spends the coins created by
+    other items pays for them too. Packages are added with the highest fee per cost first, and
+    the ones which do not fit are skipped, so smaller packages can fill the rest of the cost.
+    """
+
+    def __init__(self, max_cost: int):
+        self.max_cost = max_cost
+        self.items: Dict[bytes32, MempoolItem] = {}
+        self.cost = 0
+        self.min_fee_per_cost = float("inf")
+        self.spend_bundle: Optional[SpendBundle] = None
+
+    @staticmethod
+    def create(pool: Mempool, max_cost: int) -> "BlockTemplate":
+        self = BlockTemplate(max_cost)
+        # Entries are (-fee per cost of the package, name of the item)
+        heap: List[Tuple[float, bytes32]] = []
+        for item in pool.spends.values():
+            package = get_package(item, pool, set())
+            heap.append((-package_fee_per_cost(package), item.name))
+        heapq.heapify(heap)
+
+        while len(heap) > 0 and self.cost < max_cost:
+            negative_fee_per_cost, name = heapq.heappop(heap)
+            if name in self.items:
+                continue
+            package = get_package(pool.spends[name], pool, set(self.items.keys()))
+            fee_per_cost = package_fee_per_cost(package)
+            if fee_per_cost != -negative_fee_per_cost:
+                # Some ancestors were selected since the entry was added
+                heapq.heappush(heap, (-fee_per_cost, name))
+                continue
+            if self.cost + sum(item.cost for item in package) > max_cost:
+                continue
+            for item in package:
+                self.items[item.name] = item
+                self.cost += item.cost
+            self.min_fee_per_cost = min(self.min_fee_per_cost, fee_per_cost)
+
+        if len(self.items) > 0:
+            self.spend_bundle = SpendBundle.aggregate(
+                [item.spend_bundle for item in self.items.values()]
+            )
+        return self
+
+    def add(self, item: MempoolItem, pool: Mempool) -> bool:
+        """
+        Updates the template for an item which was added to the pool. Returns False if the
+        template has to be created again to include it.
+        """
+        package = get_package(item, pool, set(self.items.keys()))
+        if len(package) == 1 and self.cost + item.cost <= self.max_cost:
+            self.items[item.name] = item
+            self.cost += item.cost
+            self.min_fee_per_cost = min(self.min_fee_per_cost, item.fee_per_cost)
+            if self.spend_bundle is None:
+                self.spend_bundle = item.spend_bundle
+            else:
+                self.spend_bundle = SpendBundle.aggregate(
+                    [self.spend_bundle, item.spend_bundle]
+                )
+            return True
+        # The template might have been better with this package instead of other items
+        return package_fee_per_cost(package) <= self.min_fee_per_cost
@@ -14,11 +14,20 @@ from src.consensus.constants import ConsensusConstants
 from src.full_node.block_header_validation import (
     validate_unfinished_block_header,
     validate_finished_block_header,
-    pre_validate_finished_block_header,
+)
+from src.full_node.block_pre_validation import (
+    PreValidationResult,
+    block_signature_pairs,
+    init_pre_validation_worker,
+    pre_validate_blocks,
+    worker_constants,
 )
 from src.full_node.block_store import BlockStore
+from src.full_node.chain_index import ChainIndex
 from src.full_node.coin_store import CoinStore
 from src.full_node.difficulty_adjustment import get_next_difficulty, get_next_min_iters
+from src.full_node.signature_cache import SignatureCache
+from src.types.chain_snapshot import ChainSnapshot
 from src.types.challenge import Challenge
 from src.types.coin import Coin, hash_coin_list
 from src.types.coin_record import CoinRecord
@@ -27,19 +36,25 @@ from src.types.condition_var_pair import ConditionVarPair
 from src.types.full_block import FullBlock, additions_for_npc
 from src.types.header import Header
 from src.types.header_block import HeaderBlock
+from src.types.name_puzzle_condition import NPC
 from src.types.sized_bytes import bytes32
 from src.util.blockchain_check_conditions import blockchain_check_conditions_dict
 from src.util.clvm import int_from_bytes
-from src.util.condition_tools import pkm_pairs_for_conditions_dict
 from src.util.cost_calculator import calculate_cost_of_program
 from src.util.errors import ConsensusError, Err
 from src.util.hash import std_hash
 from src.util.ints import uint32, uint64
+from src.util.mempool_check_conditions import cache_name_puzzle_conditions
 from src.util.merkle_set import MerkleSet
-from src.consensus.find_fork_point import find_fork_point_in_chain
+from src.util.type_checking import construct_unchecked
 
 log = logging.getLogger(__name__)
 
+# Version of the ChainSnapshot format, snapshots with another version are ignored
+SNAPSHOT_VERSION = 1
+# Number of blocks added to the tips between writes of the ChainSnapshot
+SNAPSHOT_INTERVAL = 1000
+
 
 class ReceiveBlockResult(Enum):
     """
@@ -67,6 +82,8 @@ class Blockchain:
     height_to_hash: Dict[uint32, bytes32]
     # All headers (but not orphans) from genesis to the tip are guaranteed to be in headers
     headers: Dict[bytes32, Header]
+    # Ancestor and fork point lookups over headers
+    chain_index: ChainIndex
     # Genesis block
     genesis: FullBlock
     # Unspent Store
@@ -77,9 +94,14 @@ class Blockchain:
     coinbase_freeze: uint32
     # Used to verify blocks in parallel
     pool: concurrent.futures.ProcessPoolExecutor
+    pool_workers: int
+    # Signatures already verified, shared with the mempool
+    signature_cache: SignatureCache
 
     # Whether blockchain is shut down or not
     _shut_down: bool
+    # Blocks added to the tips since the ChainSnapshot was last written
+    _blocks_since_snapshot: int
 
     # Lock to prevent simultaneous reads and writes
     lock: asyncio.Lock
@@ -98,16 +120,23 @@ class Blockchain:
         self = Blockchain()
         self.lock = asyncio.Lock()  # External lock handled by full node
         cpu_count = multiprocessing.cpu_count()
+        self.constants = consensus_constants
+        # The workers get the constants once, instead of with each batch of blocks
+        self.pool_workers = max(cpu_count - 1, 1)
         self.pool = concurrent.futures.ProcessPoolExecutor(
-            max_workers=max(cpu_count - 1, 1)
+            max_workers=self.pool_workers,
+            initializer=init_pre_validation_worker,
+            initargs=(worker_constants(self.constants),),
         )
-        self.constants = consensus_constants
         self.tips = []
         self.height_to_hash = {}
         self.headers = {}
+        self.chain_index = ChainIndex()
+        self.signature_cache = SignatureCache()
         self.coin_store = coin_store
         self.block_store = block_store
         self._shut_down = False
+        self._blocks_since_snapshot = 0
         self.genesis = FullBlock.from_bytes(self.constants["GENESIS_BLOCK"])
         self.coinbase_freeze = self.constants["COINBASE_FREEZE_PERIOD"]
         await self._load_chain_from_store()
@@ -120,10 +149,16 @@ class Blockchain:
     async def _load_chain_from_store(self,) -> None:
         """
         Initializes the state of the Blockchain class from the database. Sets the LCA, tips,
-        headers, height_to_hash, and block_store DiffStores.
+        headers, height_to_hash, and block_store DiffStores. Uses the ChainSnapshot if there
+        is one, otherwise rebuilds the state from all the headers.
         """
         lca_db: Optional[Header] = await self.block_store.get_lca()
         tips_db: List[Header] = await self.block_store.get_tips()
+
+        if lca_db is not None and await self._load_chain_from_snapshot(lca_db, tips_db):
+            await self.recreate_diff_stores()
+            return
+
         headers_db: Dict[bytes32, Header] = await self.block_store.get_headers()
 
         assert (lca_db is None) == (len(tips_db) == 0) == (len(headers_db) == 0)
@@ -181,9 +216,120 @@ class Blockchain:
         # Asserts that the DB genesis block is correct
         assert cur_b == self.genesis.header
 
+        for header in sorted(self.headers.values(), key=lambda h: h.height):
+            self.chain_index.add(header)
+
         # Adds the blocks to the db between LCA and tip
         await self.recreate_diff_stores()
 
+    async def _load_chain_from_snapshot(
+        self, lca_db: Header, tips_db: List[Header]
+    ) -> bool:
+        """
+        Sets the LCA, tips, headers, height_to_hash and proof of time heights from the
+        ChainSnapshot in the database, and the headers added after it was written. Only the
+        headers above the height of the snapshot are read from the database, and, after a
+        reorg, the ancestors of the tips below that height which the snapshot does not have.
+        Returns False without changing any state, if there is no snapshot, or it is corrupt.
+        """
+        row = await self.block_store.get_chain_snapshot()
+        if row is None:
+            return False
+        version, snapshot_bytes = row
+        if version != SNAPSHOT_VERSION:
+            log.info(f"Ignoring chain snapshot with version {version}")
+            return False
+
+        try:
+            snapshot = ChainSnapshot.from_bytes(snapshot_bytes)
+            headers: Dict[bytes32, Header] = {}
+            chain_index = ChainIndex()
+            for header in snapshot.headers:
+                headers[header.header_hash] = header
+                chain_index.add(header)
+            proofs_of_time = list(snapshot.proofs_of_time)
+
+            # Walks back from the tips to the headers of the snapshot
+            newer = await self.block_store.get_headers_above(
+                snapshot.headers[-1].height
+            )
+            added: Dict[bytes32, Tuple[Header, bytes32]] = {}
+            for tip in tips_db:
+                header_hash = tip.header_hash
+                while header_hash not in headers and header_hash not in added:
+                    entry = newer.get(header_hash)
+                    if entry is None:
+                        entry = await self.block_store.get_header(header_hash)
+                    assert entry is not None
+                    added[header_hash] = entry
+                    header_hash = entry[0].prev_header_hash
+            for header, challenge_hash in sorted(
+                added.values(), key=lambda entry: entry[0].height
+            ):
+                prev = headers[header.prev_header_hash]
+                headers[header.header_hash] = header
+                chain_index.add(header)
+                proofs_of_time.append(
+                    (
+                        challenge_hash,
+                        uint64(header.data.total_iters - prev.data.total_iters),
+                        header.height,
+                    )
+                )
+
+            for tip in tips_db:
+                assert headers[tip.header_hash] == tip
+            assert headers[lca_db.header_hash] == lca_db
+            height_to_hash: Dict[uint32, bytes32] = {
+                uint32(height): header_hash
+                for height, header_hash in enumerate(
+                    chain_index.get_chain(lca_db.header_hash)
+                )
+            }
+            assert headers[height_to_hash[uint32(0)]] == self.genesis.header
+        except Exception as e:
+            log.warning(f"Chain snapshot is corrupt, loading chain from headers: {e}")
+            return False
+
+        if len(added) > 0:
+            log.info(f"Loaded {len(added)} headers added after the chain snapshot")
+        self.lca_block = lca_db
+        self.tips = tips_db
+        self.headers = headers
+        self.chain_index = chain_index
+        self.height_to_hash = height_to_hash
+        for challenge_hash, iters, height in proofs_of_time:
+            self.block_store.add_proof_of_time(challenge_hash, iters, height)
+        self._blocks_since_snapshot = len(added)
+        return True
+
+    async def write_snapshot(self) -> None:
+        """
+        Persists the state derived from the headers as a ChainSnapshot. Must only be called
+        when all the database writes of receive_block have been committed. The snapshot is
+        serialized in a thread, so that the event loop is not blocked.
+        """
+        proofs_of_time = [
+            (pot[0], pot[1], height)
+            for pot, height in self.block_store.proof_of_time_heights.items()
+        ]
+        # All the parts are already in memory with the right types. They are copied, so that
+        # blocks can be added while the snapshot is serialized
+        snapshot = construct_unchecked(
+            ChainSnapshot,
+            (
+                self.lca_block.header_hash,
+                [t.header_hash for t in self.tips],
+                sorted(self.headers.values(), key=lambda h: h.height),
+                proofs_of_time,
+            ),
+        )
+        self._blocks_since_snapshot = 0
+        snapshot_bytes = await asyncio.get_running_loop().run_in_executor(
+            None, bytes, snapshot
+        )
+        await self.block_store.set_chain_snapshot(SNAPSHOT_VERSION, snapshot_bytes)
+
     def get_current_tips(self) -> List[Header]:
         """
         Return the heads.
@@ -241,20 +387,17 @@ class Blockchain:
         challenge: Optional[Challenge] = self.get_challenge(block)
         if challenge is None or block.proof_of_time is None:
             return None
-        return HeaderBlock(
-            block.proof_of_space, block.proof_of_time, challenge, block.header
+        # All the parts come from an already constructed block, so they have the right types
+        return construct_unchecked(
+            HeaderBlock,
+            (block.proof_of_space, block.proof_of_time, challenge, block.header),
         )
 
     def get_header_hashes(self, tip_header_hash: bytes32) -> List[bytes32]:
         if tip_header_hash not in self.headers:
             raise ValueError("Invalid tip requested")
 
-        curr = self.headers[tip_header_hash]
-        ret_hashes = [tip_header_hash]
-        while curr.height != 0:
-            curr = self.headers[curr.prev_header_hash]
-            ret_hashes.append(curr.header_hash)
-        return list(reversed(ret_hashes))
+        return self.chain_index.get_chain(tip_header_hash)
 
     def find_fork_point_alternate_chain(self, alternate_chain: List[bytes32]) -> uint32:
         """
@@ -294,12 +437,14 @@ class Blockchain:
         pre_validated: bool = False,
         pos_quality_string: bytes32 = None,
         sync_mode: bool = False,
+        signature_validated: bool = False,
     ) -> Tuple[ReceiveBlockResult, Optional[Header], Optional[Err]]:
         """
         Adds a new block into the blockchain, if it's valid and connected to the current
         blockchain, regardless of whether it is the child of a head, or another block.
         Returns a header if block is added to head. Returns an error if the block is
-        invalid.
+        invalid. In sync_mode, database writes are not committed until commit() is called.
+        If signature_validated, the aggregated signature was verified in pre-validation.
         """
         genesis: bool = block.height == 0 and not self.tips
 
@@ -334,16 +479,17 @@ class Blockchain:
             return ReceiveBlockResult.INVALID_BLOCK, None, error_code
 
         # Validate block body
-        error_code = await self.validate_block_body(block)
+        error_code = await self.validate_block_body(block, signature_validated)
 
         if error_code is not None:
             return ReceiveBlockResult.INVALID_BLOCK, None, error_code
 
         # Cache header in memory
         self.headers[block.header_hash] = block.header
+        self.chain_index.add(block.header)
 
         # Always immediately add the block to the database, after updating blockchain state
-        await self.block_store.add_block(block)
+        await self.block_store.add_block(block, commit=not sync_mode)
         assert block.proof_of_time is not None
         self.block_store.add_proof_of_time(
             block.proof_of_time.challenge_hash,
@@ -352,6 +498,9 @@ class Blockchain:
         )
         res, header = await self._reconsider_heads(block.header, genesis, sync_mode)
         if res:
+            self._blocks_since_snapshot += 1
+            if not sync_mode and self._blocks_since_snapshot >= SNAPSHOT_INTERVAL:
+                await self.write_snapshot()
             return ReceiveBlockResult.ADDED_TO_HEAD, header, None
         else:
             return ReceiveBlockResult.ADDED_AS_ORPHAN, None, None
@@ -370,7 +519,9 @@ class Blockchain:
                 self.tips.sort(key=lambda b: b.weight, reverse=True)
                 # This will loop only once
                 removed = self.tips.pop()
-            await self.block_store.set_tips([t.header_hash for t in self.tips])
+            await self.block_store.set_tips(
+                [t.header_hash for t in self.tips], commit=not sync_mode
+            )
             await self._reconsider_lca(genesis, sync_mode)
             return True, removed
         return False, None
@@ -380,41 +531,47 @@ class Blockchain:
         Update the least common ancestor of the heads. This is useful, since we can just assume
         there is one block per height before the LCA (and use the height_to_hash dict).
         """
-        cur: List[Header] = self.tips[:]
         old_lca: Optional[Header]
         try:
             old_lca = self.lca_block
         except AttributeError:
             old_lca = None
-        while any(b.header_hash != cur[0].header_hash for b in cur):
-            heights = [b.height for b in cur]
-            i = heights.index(max(heights))
-            cur[i] = self.headers[cur[i].prev_header_hash]
+        # The LCA is the ancestor of any tip, at the lowest fork point with the other tips
+        first_tip: bytes32 = self.tips[0].header_hash
+        lca_height = min(
+            self.chain_index.find_fork_point(first_tip, tip.header_hash)
+            for tip in self.tips
+        )
+        lca: Header = self.headers[self.chain_index.get_ancestor(first_tip, lca_height)]
         if genesis:
-            self._reconsider_heights(None, cur[0])
+            self._reconsider_heights(None, lca)
         else:
-            self._reconsider_heights(self.lca_block, cur[0])
-        self.lca_block = cur[0]
-        await self.block_store.set_lca(self.lca_block.header_hash)
+            self._reconsider_heights(self.lca_block, lca)
+        self.lca_block = lca
+        await self.block_store.set_lca(self.lca_block.header_hash, commit=not sync_mode)
 
         if old_lca is None:
             full: Optional[FullBlock] = await self.block_store.get_block(
                 self.lca_block.header_hash
             )
             assert full is not None
-            await self.coin_store.new_lca(full)
+            await self.coin_store.add_lcas([full], commit=not sync_mode)
             await self._create_diffs_for_tips(self.lca_block)
         # If LCA changed update the unspent store
         elif old_lca.header_hash != self.lca_block.header_hash:
             # New LCA is lower height but not the a parent of old LCA (Reorg)
-            fork_h = find_fork_point_in_chain(self.headers, old_lca, self.lca_block)
+            fork_h = self.chain_index.find_fork_point(
+                old_lca.header_hash, self.lca_block.header_hash
+            )
             # Rollback to fork
-            await self.coin_store.rollback_lca_to_block(fork_h)
+            await self.coin_store.rollback_lca_to_block(fork_h, commit=not sync_mode)
 
             # Add blocks between fork point and new lca
             fork_hash = self.height_to_hash[fork_h]
             fork_head = self.headers[fork_hash]
-            await self._from_fork_to_lca(fork_head, self.lca_block)
+            await self._from_fork_to_lca(
+                fork_head, self.lca_block, commit=not sync_mode
+            )
             if not sync_mode:
                 await self.recreate_diff_stores()
         else:
@@ -423,6 +580,13 @@ class Blockchain:
             # Create DiffStore
             await self._create_diffs_for_tips(self.lca_block)
 
+    async def commit(self):
+        """ Commits the database writes deferred by receive_block in sync_mode. """
+        await self.coin_store.flush()
+        await self.block_store.db.commit()
+        if self._blocks_since_snapshot >= SNAPSHOT_INTERVAL:
+            await self.write_snapshot()
+
     async def recreate_diff_stores(self):
         # Nuke DiffStore
         self.coin_store.nuke_diffs()
@@ -475,8 +639,10 @@ class Blockchain:
         blocks.reverse()
         await self.coin_store.new_heads(blocks)
 
-    async def _from_fork_to_lca(self, fork_point: Header, lca: Header):
-        """ Selects blocks between fork_point and LCA, and then adds them to coin_store. """
+    async def _from_fork_to_lca(
+        self, fork_point: Header, lca: Header, commit: bool = True
+    ):
+        """ Selects blocks between fork_point and LCA, and then adds them to coin_store in one batch. """
         blocks: List[FullBlock] = []
         tip_hash: bytes32 = lca.header_hash
         while True:
@@ -489,7 +655,7 @@ class Blockchain:
             tip_hash = full.prev_header_hash
         blocks.reverse()
 
-        await self.coin_store.add_lcas(blocks)
+        await self.coin_store.add_lcas(blocks, commit=commit)
 
     def get_next_difficulty(self, header_hash: bytes32) -> uint64:
         return get_next_difficulty(
@@ -503,26 +669,46 @@ class Blockchain:
 
     async def pre_validate_blocks_multiprocessing(
         self, blocks: List[FullBlock]
-    ) -> List[Tuple[bool, Optional[bytes32]]]:
+    ) -> List[Tuple[bool, Optional[bytes32], bool]]:
+        """
+        Validates the parts of the blocks that don't need to be serially checked, including their
+        aggregated signatures, in the pool of workers. The blocks are split into one batch for
+        each worker. Returns, for each block, whether its header is valid, its proof of space
+        quality string, and whether its aggregated signature is valid. The results of
+        running the generators are cached, so that full validation does not run them again.
+        """
+        if self._shut_down or len(blocks) == 0:
+            return [(False, None, False) for _ in range(len(blocks))]
+        batch_size = (len(blocks) + self.pool_workers - 1) // self.pool_workers
         futures = []
-        # Pool of workers to validate blocks concurrently
-        for block in blocks:
-            if self._shut_down:
-                return [(False, None) for _ in range(len(blocks))]
+        for i in range(0, len(blocks), batch_size):
             futures.append(
                 asyncio.get_running_loop().run_in_executor(
                     self.pool,
-                    pre_validate_finished_block_header,
-                    self.constants,
-                    bytes(block),
+                    pre_validate_blocks,
+                    [bytes(block) for block in blocks[i : i + batch_size]],
                 )
             )
-        results = await asyncio.gather(*futures)
-
-        for i, (val, pos) in enumerate(results):
-            if pos is not None:
-                pos = bytes32(pos)
-            results[i] = val, pos
+        batch_results: List[List[PreValidationResult]] = await asyncio.gather(*futures)
+
+        results: List[Tuple[bool, Optional[bytes32], bool]] = []
+        index = 0
+        for batch in batch_results:
+            for val, pos, signature_valid, worker_npc_result in batch:
+                if worker_npc_result is not None:
+                    error, npc_tuples, cost = worker_npc_result
+                    npc_list = [
+                        NPC(bytes32(coin_name), bytes32(puzzle_hash), condition_dict)
+                        for coin_name, puzzle_hash, condition_dict in npc_tuples
+                    ]
+                    cache_name_puzzle_conditions(
+                        blocks[index].header.data.generator_hash,
+                        (error, npc_list, uint64(cost)),
+                    )
+                results.append(
+                    (val, bytes32(pos) if pos is not None else None, signature_valid)
+                )
+                index += 1
         return results
 
     async def validate_unfinished_block(
@@ -540,10 +726,13 @@ class Blockchain:
             False,
         )
 
-    async def validate_block_body(self, block: FullBlock) -> Optional[Err]:
+    async def validate_block_body(
+        self, block: FullBlock, signature_validated: bool = False
+    ) -> Optional[Err]:
         """
         Validates the transactions and body of the block. Returns None if everything
-        validates correctly, or an Err if something does not validate.
+        validates correctly, or an Err if something does not validate. The aggregated
+        signature is not verified again if signature_validated.
         """
 
         # 6. The compact block filter must be correct, according to the body (BIP158)
@@ -562,7 +751,9 @@ class Blockchain:
 
             # 15. If not genesis, the transactions must be valid and fee must be valid
             # Verifies that fee_base + TX fees = fee_coin.amount
-            err = await self._validate_transactions(block, fee_base)
+            err = await self._validate_transactions(
+                block, fee_base, signature_validated
+            )
             if err is not None:
                 return err
         else:
@@ -578,14 +769,15 @@ class Blockchain:
                 return root_error
 
             # 17. Verify the pool signature even if there are no transactions
-            pool_target_m = bytes(block.header.data.pool_target)
-            validates = AugSchemeMPL.verify(
-                block.proof_of_space.pool_public_key,
-                pool_target_m,
-                block.header.data.aggregated_signature,
-            )
-            if not validates:
-                return Err.BAD_AGGREGATE_SIGNATURE
+            if not signature_validated:
+                pool_target_m = bytes(block.header.data.pool_target)
+                validates = AugSchemeMPL.verify(
+                    block.proof_of_space.pool_public_key,
+                    pool_target_m,
+                    block.header.data.aggregated_signature,
+                )
+                if not validates:
+                    return Err.BAD_AGGREGATE_SIGNATURE
 
         return None
 
@@ -634,7 +826,7 @@ class Blockchain:
         return None
 
     async def _validate_transactions(
-        self, block: FullBlock, fee_base: uint64
+        self, block: FullBlock, fee_base: uint64, signature_validated: bool = False
     ) -> Optional[Err]:
         # TODO(straya): review, further test the code, and number all the validation steps
 
@@ -642,8 +834,11 @@ class Blockchain:
         if not block.transactions_generator:
             return Err.UNKNOWN
         # Get List of names removed, puzzles hashes for removed coins and conditions crated
+        # The generator hash was checked in validate_block_body, so the result can be cached
         error, npc_list, cost = calculate_cost_of_program(
-            block.transactions_generator, self.constants["CLVM_COST_RATIO_CONSTANT"]
+            block.transactions_generator,
+            self.constants["CLVM_COST_RATIO_CONSTANT"],
+            block.header.data.generator_hash,
         )
 
         # 2. Check that cost <= MAX_BLOCK_COST_CLVM
@@ -708,7 +903,10 @@ class Blockchain:
                 return Err.DOUBLE_SPEND
 
         # Check if removals exist and were not previously spend. (unspent_db + diff_store + this_block)
-        fork_h = find_fork_point_in_chain(self.headers, self.lca_block, block.header)
+        # The block itself is not indexed yet, but it can not be an ancestor of the LCA
+        fork_h = self.chain_index.find_fork_point(
+            self.lca_block.header_hash, block.prev_header_hash
+        )
 
         # Get additions and removals since (after) fork_h but not including this block
         additions_since_fork: Dict[bytes32, Tuple[Coin, uint32]] = {}
@@ -831,13 +1029,7 @@ class Blockchain:
             if unspent.coin.puzzle_hash != removals_puzzle_dic[unspent.name]:
                 return Err.WRONG_PUZZLE_HASH
 
-        # Verify conditions, create hash_key list for aggsig check
-        pool_target_m = bytes(block.header.data.pool_target)
-
-        # The pool signature on the pool target is checked here as well, since the pool signature is
-        # aggregated along with the transaction signatures
-        pairs_pks = [block.proof_of_space.pool_public_key]
-        pairs_msgs = [pool_target_m]
+        # Verify conditions
         for npc in npc_list:
             unspent = removal_coin_records[npc.coin_name]
             error = blockchain_check_conditions_dict(
@@ -845,18 +1037,20 @@ class Blockchain:
             )
             if error:
                 return error
-            for pk, m in pkm_pairs_for_conditions_dict(
-                npc.condition_dict, npc.coin_name
-            ):
-                pairs_pks.append(pk)
-                pairs_msgs.append(m)
 
-        # Verify aggregated signature
-        # TODO: move this to pre_validate_blocks_multiprocessing so we can sync faster
+        # The aggregated signature does not depend on the chain, so it's verified in
+        # pre_validate_blocks_multiprocessing when syncing
+        if signature_validated:
+            return None
+
+        # Verify aggregated signature, reusing the verification of bundles seen in the mempool
         if not block.header.data.aggregated_signature:
             return Err.BAD_AGGREGATE_SIGNATURE
 
-        validates = AugSchemeMPL.agg_verify(
+        # The pool signature on the pool target is checked here as well, since the pool signature is
+        # aggregated along with the transaction signatures
+        pairs_pks, pairs_msgs = block_signature_pairs(block, npc_list)
+        validates = self.signature_cache.aggregate_verify(
             pairs_pks, pairs_msgs, block.header.data.aggregated_signature
         )
         if not validates:
@@ -0,0 +1,117 @@
+from array import array
+from typing import Dict, List
+
+from src.types.header import Header
+from src.types.sized_bytes import bytes32
+from src.util.ints import uint32
+
+
+def invert_lowest_one(n: int) -> int:
+    return n & (n - 1)
+
+
+def get_skip_height(height: int) -> int:
+    """
+    The height that the skip pointer of a block at this height points to. Chosen so that any
+    ancestor can be reached in O(log n) jumps (the same scheme as Bitcoin's CBlockIndex::pskip).
+    """
+    if height < 2:
+        return 0
+    if height & 1:
+        return invert_lowest_one(invert_lowest_one(height - 1)) + 1
+    return invert_lowest_one(height)
+
+
+class ChainIndex:
+    """
+    Compact index of a tree of headers, answering ancestor and fork point queries in
+    O(log n), without walking prev_header_hash links through the headers dict. Every header
+    gets a position, and the height, parent position and skip pointer position of each are
+    stored in flat arrays. Parents must be added before their children.
+    """
+
+    def __init__(self):
+        self.positions: Dict[bytes32, int] = {}
+        self.hashes: List[bytes32] = []
+        self.heights = array("q")
+        self.parents = array("q")
+        self.skips = array("q")
+
+    def __contains__(self, header_hash: bytes32) -> bool:
+        return header_hash in self.positions
+
+    def __len__(self) -> int:
+        return len(self.hashes)
+
+    def add(self, header: Header) -> None:
+        if header.header_hash in self.positions:
+            return
+        height = header.height
+        if height == 0:
+            parent = -1
+            skip = -1
+        else:
+            parent = self.positions[header.prev_header_hash]
+            skip = self._ancestor(parent, get_skip_height(height))
+        self.positions[header.header_hash] = len(self.hashes)
+        self.hashes.append(header.header_hash)
+        self.heights.append(height)
+        self.parents.append(parent)
+        self.skips.append(skip)
+
+    def _ancestor(self, position: int, height: int) -> int:
+        walk_height = self.heights[position]
+        assert 0 <= height <= walk_height
+        while walk_height > height:
+            skip_height = get_skip_height(walk_height)
+            skip_height_prev = get_skip_height(walk_height - 1)
+            # Only take the skip pointer if it does not overshoot, and the parent's skip
+            # pointer would not have been a better jump
+            if self.skips[position] != -1 and (
+                skip_height == height
+                or (
+                    skip_height > height
+                    and not (
+                        skip_height_prev < skip_height - 2
+                        and skip_height_prev >= height
+                    )
+                )
+            ):
+                position = self.skips[position]
+                walk_height = skip_height
+            else:
+                position = self.parents[position]
+                walk_height -= 1
+        return position
+
+    def get_ancestor(self, header_hash: bytes32, height: uint32) -> bytes32:
+        """ Returns the hash of the ancestor of header_hash (or itself) at the given height. """
+        return self.hashes[self._ancestor(self.positions[header_hash], height)]
+
+    def find_fork_point(self, hash_1: bytes32, hash_2: bytes32) -> uint32:
+        """
+        Returns the height of the last common ancestor of the two headers, with a binary
+        search over the height, so O(log n) ancestor lookups.
+        """
+        position_1 = self.positions[hash_1]
+        position_2 = self.positions[hash_2]
+        low = 0
+        high = min(self.heights[position_1], self.heights[position_2])
+        # Genesis block is the same, genesis fork
+        assert self._ancestor(position_1, 0) == self._ancestor(position_2, 0)
+        while low < high:
+            mid = (low + high + 1) // 2
+            if self._ancestor(position_1, mid) == self._ancestor(position_2, mid):
+                low = mid
+            else:
+                high = mid - 1
+        return uint32(low)
+
+    def get_chain(self, header_hash: bytes32) -> List[bytes32]:
+        """ Returns the hashes from genesis to header_hash, in order of height. """
+        position = self.positions[header_hash]
+        hashes: List[bytes32] = []
+        while position != -1:
+            hashes.append(self.hashes[position])
+            position = self.parents[position]
+        return list(reversed(hashes))
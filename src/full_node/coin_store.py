@@ -1,11 +1,14 @@
-from typing import Dict, Optional, List
+from typing import Dict, Optional, List, Set
 import aiosqlite
+from sortedcontainers import SortedDict
+
 from src.types.full_block import FullBlock
 from src.types.coin import Coin
 from src.types.coin_record import CoinRecord
 from src.types.sized_bytes import bytes32
 from src.types.header import Header
 from src.util.ints import uint32
+from src.util.lru_cache import LRUCache
 
 
 class DiffStore:
@@ -22,35 +25,46 @@ class DiffStore:
 
 class CoinStore:
     """
-    This object handles CoinRecords in DB.
+    This object handles CoinRecords in DB. Hashes are stored as 32 byte blobs.
     Coins from genesis to LCA are stored on disk db, coins from lca to head are stored in DiffStore object for each tip.
     When blockchain notifies UnspentStore of new LCA, LCA is added to the disk db,
     DiffStores are updated/recreated. (managed by blockchain.py)
+    Recently used CoinRecords are kept in an LRU cache. New CoinRecords are written back to the
+    DB in batches, on flush() or once write_batch_size of them are pending.
     """
 
     coin_record_db: aiosqlite.Connection
-    lca_coin_records: Dict[str, CoinRecord]
+    coin_record_cache: LRUCache
+    # Names of the cached CoinRecords, by the heights at which they were confirmed or spent
+    cached_names_by_height: SortedDict
+    # CoinRecords which have not been written to the DB yet
+    dirty_coin_records: Dict[bytes32, CoinRecord]
     head_diffs: Dict[bytes32, DiffStore]
     cache_size: uint32
+    write_batch_size: int
 
     @classmethod
     async def create(
-        cls, connection: aiosqlite.Connection, cache_size: uint32 = uint32(600000)
+        cls,
+        connection: aiosqlite.Connection,
+        cache_size: uint32 = uint32(600000),
+        write_batch_size: int = 10000,
     ):
         self = cls()
 
         self.cache_size = cache_size
+        self.write_batch_size = write_batch_size
         self.coin_record_db = connection
         await self.coin_record_db.execute(
             (
                 "CREATE TABLE IF NOT EXISTS coin_record("
-                "coin_name text PRIMARY KEY,"
+                "coin_name blob PRIMARY KEY,"
                 " confirmed_index bigint,"
                 " spent_index bigint,"
                 " spent int,"
                 " coinbase int,"
-                " puzzle_hash text,"
-                " coin_parent text,"
+                " puzzle_hash blob,"
+                " coin_parent blob,"
                 " amount bigint)"
             )
         )
@@ -65,42 +79,65 @@ class CoinStore:
         )
 
         await self.coin_record_db.execute(
-            "CREATE INDEX IF NOT EXISTS coin_spent on coin_record(spent)"
-        )
-
-        await self.coin_record_db.execute(
-            "CREATE INDEX IF NOT EXISTS coin_spent on coin_record(puzzle_hash)"
+            "CREATE INDEX IF NOT EXISTS coin_puzzle_hash on coin_record(puzzle_hash)"
         )
 
         await self.coin_record_db.commit()
-        self.lca_coin_records = dict()
+        self.coin_record_cache = LRUCache(cache_size, self._unindex_record)
+        self.cached_names_by_height = SortedDict()
+        self.dirty_coin_records = dict()
         self.head_diffs = dict()
         return self
 
-    async def add_lcas(self, blocks: List[FullBlock]):
+    async def add_lcas(self, blocks: List[FullBlock], commit: bool = True) -> None:
+        """
+        Applies the coin changes of a batch of consecutive LCA blocks. The resulting records are
+        computed in memory and written with a single executemany, so the whole batch is one
+        transaction. If commit is False, the records are written back later, and the caller is
+        responsible for calling flush().
+        """
+        records: Dict[bytes32, CoinRecord] = {}
         for block in blocks:
-            await self.new_lca(block)
-
-    async def new_lca(self, block: FullBlock):
-        removals, additions = await block.tx_removals_and_additions()
-
-        for coin in additions:
-            record: CoinRecord = CoinRecord(coin, block.height, uint32(0), False, False)
-            await self.add_coin_record(record)
-
-        for coin_name in removals:
-            await self.set_spent(coin_name, block.height)
+            removals, additions = await block.tx_removals_and_additions()
 
-        coinbase_coin = block.get_coinbase()
-        fees_coin = block.get_fees_coin()
+            for coin in additions:
+                record: CoinRecord = CoinRecord(
+                    coin, block.height, uint32(0), False, False
+                )
+                records[coin.name()] = record
+
+            for coin_name in removals:
+                current: Optional[CoinRecord] = records.get(coin_name)
+                if current is None:
+                    current = await self.get_coin_record(coin_name)
+                if current is None:
+                    continue
+                records[coin_name] = CoinRecord(
+                    current.coin,
+                    current.confirmed_block_index,
+                    block.height,
+                    True,
+                    current.coinbase,
+                )  # type: ignore # noqa
+
+            coinbase_coin = block.get_coinbase()
+            fees_coin = block.get_fees_coin()
+            records[coinbase_coin.name()] = CoinRecord(
+                coinbase_coin, block.height, uint32(0), False, True
+            )
+            records[fees_coin.name()] = CoinRecord(
+                fees_coin, block.height, uint32(0), False, True
+            )
 
-        coinbase_r: CoinRecord = CoinRecord(
-            coinbase_coin, block.height, uint32(0), False, True
-        )
-        fees_r: CoinRecord = CoinRecord(fees_coin, block.height, uint32(0), False, True)
+        for record in records.values():
+            self._stage_record(record)
+        if commit:
+            await self.flush()
+        elif len(self.dirty_coin_records) >= self.write_batch_size:
+            await self._write_dirty_records()
 
-        await self.add_coin_record(coinbase_r)
-        await self.add_coin_record(fees_r)
+    async def new_lca(self, block: FullBlock):
+        await self.add_lcas([block])
 
     def nuke_diffs(self):
         self.head_diffs.clear()
@@ -127,17 +164,17 @@ class CoinStore:
 
         for coin in additions:
             added: CoinRecord = CoinRecord(coin, block.height, 0, 0, 0)  # type: ignore # noqa
-            diff_store.diffs[added.name.hex()] = added
+            diff_store.diffs[added.name] = added
 
         coinbase: CoinRecord = CoinRecord(block.get_coinbase(), block.height, 0, 0, 1)  # type: ignore # noqa
-        diff_store.diffs[coinbase.name.hex()] = coinbase
+        diff_store.diffs[coinbase.name] = coinbase
         fees_coin: CoinRecord = CoinRecord(block.get_fees_coin(), block.height, 0, 0, 1)  # type: ignore # noqa
-        diff_store.diffs[fees_coin.name.hex()] = fees_coin
+        diff_store.diffs[fees_coin.name] = fees_coin
 
         for coin_name in removals:
             removed: Optional[CoinRecord] = None
-            if coin_name.hex() in diff_store.diffs:
-                removed = diff_store.diffs[coin_name.hex()]
+            if coin_name in diff_store.diffs:
+                removed = diff_store.diffs[coin_name]
             if removed is None:
                 removed = await self.get_coin_record(coin_name)
             if removed is None:
@@ -149,30 +186,70 @@ class CoinStore:
                 True,
                 removed.coinbase,
             )  # type: ignore # noqa
-            diff_store.diffs[spent.name.hex()] = spent
-
-    # Store CoinRecord in DB and ram cache
-    async def add_coin_record(self, record: CoinRecord) -> None:
-        cursor = await self.coin_record_db.execute(
+            diff_store.diffs[spent.name] = spent
+
+    def _index_record(self, name: bytes32, record: CoinRecord) -> None:
+        heights = [record.confirmed_block_index]
+        if record.spent:
+            heights.append(record.spent_block_index)
+        for height in heights:
+            if height not in self.cached_names_by_height:
+                self.cached_names_by_height[height] = set()
+            self.cached_names_by_height[height].add(name)
+
+    def _unindex_record(self, name: bytes32, record: CoinRecord) -> None:
+        for height in [record.confirmed_block_index, record.spent_block_index]:
+            names: Optional[Set[bytes32]] = self.cached_names_by_height.get(height)
+            if names is not None:
+                names.discard(name)
+                if len(names) == 0:
+                    del self.cached_names_by_height[height]
+
+    def _cache_record(self, record: CoinRecord) -> None:
+        name = record.name
+        old_record: Optional[CoinRecord] = self.coin_record_cache.remove(name)
+        if old_record is not None:
+            self._unindex_record(name, old_record)
+        # Indexed first, since putting it into a cache of size 0 evicts it right away
+        self._index_record(name, record)
+        self.coin_record_cache.put(name, record)
+
+    def _stage_record(self, record: CoinRecord) -> None:
+        self.dirty_coin_records[record.name] = record
+        self._cache_record(record)
+
+    async def _write_dirty_records(self) -> None:
+        if len(self.dirty_coin_records) == 0:
+            return
+        cursor = await self.coin_record_db.executemany(
             "INSERT OR REPLACE INTO coin_record VALUES(?, ?, ?, ?, ?, ?, ?, ?)",
-            (
-                record.coin.name().hex(),
-                record.confirmed_block_index,
-                record.spent_block_index,
-                int(record.spent),
-                int(record.coinbase),
-                str(record.coin.puzzle_hash.hex()),
-                str(record.coin.parent_coin_info.hex()),
-                record.coin.amount,
-            ),
+            [
+                (
+                    name,
+                    record.confirmed_block_index,
+                    record.spent_block_index,
+                    int(record.spent),
+                    int(record.coinbase),
+                    record.coin.puzzle_hash,
+                    record.coin.parent_coin_info,
+                    record.coin.amount,
+                )
+                for name, record in self.dirty_coin_records.items()
+            ],
         )
         await cursor.close()
+        self.dirty_coin_records.clear()
+
+    async def flush(self) -> None:
+        """ Writes all pending CoinRecords to the DB, and commits. """
+        await self._write_dirty_records()
         await self.coin_record_db.commit()
-        self.lca_coin_records[record.coin.name().hex()] = record
-        if len(self.lca_coin_records) > self.cache_size:
-            while len(self.lca_coin_records) > self.cache_size:
-                first_in = list(self.lca_coin_records.keys())[0]
-                del self.lca_coin_records[first_in]
+
+    # Store CoinRecord in ram cache, and in DB once the write batch is full
+    async def add_coin_record(self, record: CoinRecord) -> None:
+        self._stage_record(record)
+        if len(self.dirty_coin_records) >= self.write_batch_size:
+            await self.flush()
 
     # Update coin_record to be spent in DB
     async def set_spent(self, coin_name: bytes32, index: uint32):
@@ -190,20 +267,25 @@ class CoinStore:
     ) -> Optional[CoinRecord]:
         if header is not None and header.header_hash in self.head_diffs:
             diff_store = self.head_diffs[header.header_hash]
-            if coin_name.hex() in diff_store.diffs:
-                return diff_store.diffs[coin_name.hex()]
-        if coin_name.hex() in self.lca_coin_records:
-            return self.lca_coin_records[coin_name.hex()]
+            if coin_name in diff_store.diffs:
+                return diff_store.diffs[coin_name]
+        record: Optional[CoinRecord] = self.coin_record_cache.get(coin_name)
+        if record is not None:
+            return record
+        # Pending records can be evicted from the cache before they are written
+        record = self.dirty_coin_records.get(coin_name)
+        if record is not None:
+            return record
         cursor = await self.coin_record_db.execute(
-            "SELECT * from coin_record WHERE coin_name=?", (coin_name.hex(),)
+            "SELECT * from coin_record WHERE coin_name=?", (coin_name,)
         )
         row = await cursor.fetchone()
         await cursor.close()
         if row is not None:
-            coin = Coin(
-                bytes32(bytes.fromhex(row[6])), bytes32(bytes.fromhex(row[5])), row[7]
-            )
-            return CoinRecord(coin, row[1], row[2], row[3], row[4])
+            coin = Coin(bytes32(row[6]), bytes32(row[5]), row[7])
+            record = CoinRecord(coin, row[1], row[2], row[3], row[4])
+            self._cache_record(record)
+            return record
         return None
 
     # Checks DB and DiffStores for CoinRecords with puzzle_hash and returns them
@@ -217,35 +299,38 @@ class CoinStore:
                 if record.coin.puzzle_hash == puzzle_hash:
                     coins.add(record)
         cursor = await self.coin_record_db.execute(
-            "SELECT * from coin_record WHERE puzzle_hash=?", (puzzle_hash.hex(),)
+            "SELECT * from coin_record WHERE puzzle_hash=?", (puzzle_hash,)
         )
         rows = await cursor.fetchall()
         await cursor.close()
+        records: Dict[bytes32, CoinRecord] = {}
         for row in rows:
-            coin = Coin(
-                bytes32(bytes.fromhex(row[6])), bytes32(bytes.fromhex(row[5])), row[7]
-            )
-            coins.add(CoinRecord(coin, row[1], row[2], row[3], row[4]))
+            coin = Coin(bytes32(row[6]), bytes32(row[5]), row[7])
+            records[coin.name()] = CoinRecord(coin, row[1], row[2], row[3], row[4])
+        for name, record in self.dirty_coin_records.items():
+            if record.coin.puzzle_hash == puzzle_hash:
+                records[name] = record
+        coins.update(records.values())
         return list(coins)
 
-    async def rollback_lca_to_block(self, block_index):
-        # Update memory cache
-        delete_queue: bytes32 = []
-        for coin_name, coin_record in self.lca_coin_records.items():
-            if coin_record.spent_block_index > block_index:
-                new_record = CoinRecord(
-                    coin_record.coin,
-                    coin_record.confirmed_block_index,
-                    coin_record.spent_block_index,
-                    False,
-                    coin_record.coinbase,
-                )
-                self.lca_coin_records[coin_record.coin.name().hex()] = new_record
-            if coin_record.confirmed_block_index > block_index:
-                delete_queue.append(coin_name)
-
-        for coin_name in delete_queue:
-            del self.lca_coin_records[coin_name]
+    async def rollback_lca_to_block(self, block_index, commit: bool = True):
+        # Update memory cache, through the coins confirmed or spent after block_index
+        changed: Set[bytes32] = set()
+        for height in self.cached_names_by_height.irange(minimum=block_index + 1):
+            changed.update(self.cached_names_by_height[height])
+        for name in changed:
+            record: Optional[CoinRecord] = self.coin_record_cache.remove(name)
+            assert record is not None
+            self._unindex_record(name, record)
+            if record.confirmed_block_index <= block_index:
+                self._cache_record(self._unspent(record))
+
+        # Update the records not written yet
+        for name, record in list(self.dirty_coin_records.items()):
+            if record.confirmed_block_index > block_index:
+                del self.dirty_coin_records[name]
+            elif record.spent_block_index > block_index:
+                self.dirty_coin_records[name] = self._unspent(record)
 
         # Delete from storage
         c1 = await self.coin_record_db.execute(
@@ -257,4 +342,15 @@ class CoinStore:
             (block_index,),
         )
         await c2.close()
-        await self.coin_record_db.commit()
+        if commit:
+            await self.coin_record_db.commit()
+
+    @staticmethod
+    def _unspent(record: CoinRecord) -> CoinRecord:
+        return CoinRecord(
+            record.coin,
+            record.confirmed_block_index,
+            uint32(0),
+            False,
+            record.coinbase,
+        )  # type: ignore # noqa
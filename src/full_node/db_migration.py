@@ -0,0 +1,118 @@
+import logging
+from typing import Any, Dict, List, Tuple
+
+import aiosqlite
+
+from src.full_node.block_store import BlockStore
+from src.full_node.coin_store import CoinStore
+
+log = logging.getLogger(__name__)
+
+# Version 0 stored hashes as hex text, version 1 stores them as 32 byte blobs
+DB_VERSION = 1
+
+# The columns which hold hex encoded hashes in version 0, for each migrated table
+HEX_COLUMNS: Dict[str, Tuple[str, ...]] = {
+    "coin_record": ("coin_name", "puzzle_hash", "coin_parent"),
+    "blocks": ("header_hash",),
+    "headers": ("header_hash", "proof_hash", "challenge_hash"),
+}
+
+
+async def table_columns(
+    connection: aiosqlite.Connection, table: str
+) -> List[Tuple[str, str]]:
+    """ Returns the (name, type) of each column of table, or an empty list if it does not exist. """
+    cursor = await connection.execute(f"PRAGMA table_info({table})")
+    rows = await cursor.fetchall()
+    await cursor.close()
+    return [(row[1], row[2].lower()) for row in rows]
+
+
+async def table_exists(connection: aiosqlite.Connection, table: str) -> bool:
+    return len(await table_columns(connection, table)) > 0
+
+
+async def is_hex_table(connection: aiosqlite.Connection, table: str) -> bool:
+    return (HEX_COLUMNS[table][0], "text") in await table_columns(connection, table)
+
+
+async def set_aside_hex_table(connection: aiosqlite.Connection, table: str) -> None:
+    """
+    Renames a version 0 table, so the version 1 table can be created under its name. The
+    indexes are dropped, since their names are reused by the new table.
+    """
+    cursor = await connection.execute(f"PRAGMA index_list({table})")
+    indexes = await cursor.fetchall()
+    await cursor.close()
+    for index in indexes:
+        if not index[1].startswith("sqlite_autoindex"):
+            await connection.execute(f"DROP INDEX IF EXISTS {index[1]}")
+    await connection.execute(f"ALTER TABLE {table} RENAME TO {table}_hex")
+    await connection.commit()
+
+
+async def copy_hex_table(
+    connection: aiosqlite.Connection, table: str, batch_size: int
+) -> None:
+    """
+    Moves the rows of a set aside version 0 table into the version 1 table, converting hashes
+    to blobs. Every batch is deleted from the old table in the same transaction as it is
+    inserted into the new one, so an interrupted migration resumes where it stopped.
+    """
+    old_table = f"{table}_hex"
+    columns = [name for name, _ in await table_columns(connection, old_table)]
+    hex_indexes = [i for i, name in enumerate(columns) if name in HEX_COLUMNS[table]]
+    select = (
+        f"SELECT rowid, {', '.join(columns)} FROM {old_table} ORDER BY rowid LIMIT ?"
+    )
+    insert = f"INSERT OR REPLACE INTO {table}({', '.join(columns)}) VALUES({', '.join('?' * len(columns))})"
+
+    migrated = 0
+    while True:
+        cursor = await connection.execute(select, (batch_size,))
+        rows = list(await cursor.fetchall())
+        await cursor.close()
+        if len(rows) == 0:
+            break
+        new_rows: List[List[Any]] = []
+        for row in rows:
+            values = list(row[1:])
+            for i in hex_indexes:
+                values[i] = bytes.fromhex(values[i])
+            new_rows.append(values)
+        await connection.executemany(insert, new_rows)
+        await connection.execute(
+            f"DELETE FROM {old_table} WHERE rowid<=?", (rows[-1][0],)
+        )
+        await connection.commit()
+        migrated += len(rows)
+        log.info(f"Migrated {migrated} rows of {table}")
+
+    await connection.execute(f"DROP TABLE {old_table}")
+    await connection.commit()
+
+
+async def migrate_db(connection: aiosqlite.Connection, batch_size: int = 10000) -> bool:
+    """
+    Upgrades a full node database in place to the blob schema of DB_VERSION, without
+    resyncing. Creates the tables if they do not exist yet. Returns True if any rows had
+    to be migrated.
+    """
+    migrated = False
+    for table in HEX_COLUMNS.keys():
+        if await is_hex_table(connection, table):
+            log.info(f"Migrating table {table} to database version {DB_VERSION}")
+            await set_aside_hex_table(connection, table)
+
+    await BlockStore.create(connection)
+    await CoinStore.create(connection)
+
+    for table in HEX_COLUMNS.keys():
+        if await table_exists(connection, f"{table}_hex"):
+            await copy_hex_table(connection, table, batch_size)
+            migrated = True
+
+    await connection.execute(f"PRAGMA user_version={DB_VERSION}")
+    await connection.commit()
+    return migrated
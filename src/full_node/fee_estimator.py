@@ -0,0 +1,197 @@
+import json
+import logging
+import math
+from typing import Dict, List, Optional, Tuple
+
+import aiosqlite
+
+from src.types.mempool_item import MempoolItem
+from src.types.sized_bytes import bytes32
+from src.util.ints import uint32
+
+log = logging.getLogger(__name__)
+
+# Version of the persisted estimates, estimates with another version are ignored
+ESTIMATES_VERSION = 1
+# Lower bound of the first bucket above 0, and the ratio between the bounds of the buckets
+MIN_FEE_PER_COST = 0.00001
+FEE_SPACING = 1.2
+BUCKET_COUNT = 140
+# Estimates are made for confirmation within 1 to MAX_TARGET_BLOCKS blocks
+MAX_TARGET_BLOCKS = 25
+# Weight of the statistics after each block, so that older blocks count less
+DECAY = 0.998
+# Fraction of the items of a group of buckets which have to be confirmed in the target
+SUCCESS_THRESHOLD = 0.85
+# Decayed number of items a group of buckets needs, before an estimate is made from it
+MIN_SAMPLES = 10.0
+# Number of blocks between writes of the estimates to the database
+SAVE_INTERVAL = 100
+
+
+def bucket_floor(bucket: int) -> float:
+    """ The lowest fee per cost of a bucket. """
+    if bucket == 0:
+        return 0
+    return MIN_FEE_PER_COST * FEE_SPACING ** (bucket - 1)
+
+
+def bucket_for_fee_per_cost(fee_per_cost: float) -> int:
+    if fee_per_cost < MIN_FEE_PER_COST:
+        return 0
+    bucket = 1 + int(math.log(fee_per_cost / MIN_FEE_PER_COST, FEE_SPACING))
+    return min(bucket, BUCKET_COUNT - 1)
+
+
+class FeeEstimator:
+    """
+    Estimates the fee per cost which gets an item into a block within a number of blocks, from
+    the items this node saw entering the mempool. An item is tracked from the height of the tip
+    it was first added at, until it's confirmed or leaves all the pools. The items are counted
+    in buckets of fee per cost, with the statistics decayed at each new height, so that recent
+    blocks weigh the most.
+    """
+
+    db: Optional[aiosqlite.Connection]
+    # Height of the highest tip seen
+    height: uint32
+    # Decayed number of tracked items which were confirmed or dropped, by bucket
+    totals: List[float]
+    # Decayed number of them which were confirmed within target + 1 blocks, by target and bucket
+    confirmed: List[List[float]]
+    # Height at which each tracked item entered, and its bucket
+    pending: Dict[bytes32, Tuple[uint32, int]]
+    _blocks_since_save: int
+
+    def __init__(self):
+        """ An estimator which is only kept in memory. """
+        self.db = None
+        self.height = uint32(0)
+        self.totals = [0.0] * BUCKET_COUNT
+        self.confirmed = [[0.0] * BUCKET_COUNT for _ in range(MAX_TARGET_BLOCKS)]
+        self.pending = {}
+        self._blocks_since_save = 0
+
+    @classmethod
+    async def create(cls, connection: aiosqlite.Connection):
+        """ Creates an estimator which is persisted to the database. """
+        self = cls()
+        self.db = connection
+        # A single row with the latest estimates as JSON, and the version of its format
+        await self.db.execute(
+            "CREATE TABLE IF NOT EXISTS fee_estimates(id int PRIMARY KEY, version int, estimates text)"
+        )
+        await self.db.commit()
+        await self._load()
+        return self
+
+    async def _load(self) -> None:
+        assert self.db is not None
+        cursor = await self.db.execute(
+            "SELECT version, estimates from fee_estimates WHERE id=0"
+        )
+        row = await cursor.fetchone()
+        await cursor.close()
+        if row is None:
+            return
+        version, estimates_json = row
+        if version != ESTIMATES_VERSION:
+            log.info(f"Ignoring fee estimates with version {version}")
+            return
+        try:
+            estimates = json.loads(estimates_json)
+            totals = [float(total) for total in estimates["totals"]]
+            confirmed = [
+                [float(count) for count in counts] for counts in estimates["confirmed"]
+            ]
+            if len(totals) != BUCKET_COUNT or len(confirmed) != MAX_TARGET_BLOCKS:
+                raise ValueError("Wrong number of buckets")
+            if any(len(counts) != BUCKET_COUNT for counts in confirmed):
+                raise ValueError("Wrong number of buckets")
+        except (ValueError, KeyError, TypeError) as e:
+            log.warning(f"Fee estimates are corrupt, starting without them: {e}")
+            return
+        self.height = uint32(estimates["height"])
+        self.totals = totals
+        self.confirmed = confirmed
+
+    async def save(self) -> None:
+        """ Writes the estimates to the database. Tracked items are not kept. """
+        self._blocks_since_save = 0
+        if self.db is None:
+            return
+        estimates = {
+            "height": self.height,
+            "totals": self.totals,
+            "confirmed": self.confirmed,
+        }
+        cursor = await self.db.execute(
+            "INSERT OR REPLACE INTO fee_estimates VALUES(0, ?, ?)",
+            (ESTIMATES_VERSION, json.dumps(estimates)),
+        )
+        await cursor.close()
+        await self.db.commit()
+
+    def item_added(self, item: MempoolItem, height: uint32) -> None:
+        """ Starts tracking an item, first added to the pool of a tip at height. """
+        if item.name not in self.pending:
+            self.pending[item.name] = (
+                height,
+                bucket_for_fee_per_cost(item.fee_per_cost),
+            )
+
+    def item_included(self, name: bytes32, height: uint32) -> None:
+        """ Records that a tracked item was included in a block at height. """
+        entry = self.pending.pop(name, None)
+        if entry is None:
+            return
+        entry_height, bucket = entry
+        blocks = max(height - entry_height, 1)
+        self.totals[bucket] += 1
+        for target in range(blocks - 1, MAX_TARGET_BLOCKS):
+            self.confirmed[target][bucket] += 1
+
+    def item_removed(self, name: bytes32) -> None:
+        """ Records that an item left all the pools. Counts as a failure if it's tracked. """
+        entry = self.pending.pop(name, None)
+        if entry is not None:
+            self.totals[entry[1]] += 1
+
+    async def new_height(self, height: uint32) -> None:
+        """ Decays the statistics for each height above the highest tip seen so far. """
+        if height <= self.height:
+            return
+        blocks = height - self.height
+        self.height = height
+        decay = DECAY ** min(blocks, 10000)
+        self.totals = [total * decay for total in self.totals]
+        self.confirmed = [
+            [count * decay for count in counts] for counts in self.confirmed
+        ]
+        self._blocks_since_save += blocks
+        if self._blocks_since_save >= SAVE_INTERVAL:
+            await self.save()
+
+    def estimate_fee_per_cost(self, target_blocks: int) -> Optional[float]:
+        """
+        Returns the lowest fee per cost for which enough items were confirmed within
+        target_blocks, or None if there is not enough data. Buckets are grouped from the highest
+        fee per cost down until the group has enough items, and the search stops at the first
+        group with too few of them confirmed.
+        """
+        target = min(max(target_blocks, 1), MAX_TARGET_BLOCKS)
+        confirmed_counts = self.confirmed[target - 1]
+        estimate: Optional[float] = None
+        group_confirmed = 0.0
+        group_total = 0.0
+        for bucket in reversed(range(BUCKET_COUNT)):
+            group_confirmed += confirmed_counts[bucket]
+            group_total += self.totals[bucket]
+            if group_total < MIN_SAMPLES:
+                continue
+            if group_confirmed / group_total < SUCCESS_THRESHOLD:
+                break
+            estimate = bucket_floor(bucket)
+            group_confirmed = 0.0
+            group_total = 0.0
+        return estimate
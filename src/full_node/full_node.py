@@ -19,11 +19,17 @@ from src.consensus.coinbase import create_coinbase_coin, create_fees_coin
 from src.full_node.block_store import BlockStore
 from src.full_node.blockchain import Blockchain, ReceiveBlockResult
 from src.full_node.coin_store import CoinStore
+from src.full_node.db_migration import DB_VERSION, migrate_db
+from src.full_node.fee_estimator import FeeEstimator
 from src.full_node.full_node_store import FullNodeStore
 from src.full_node.mempool_manager import MempoolManager
 from src.full_node.sync_blocks_processor import SyncBlocksProcessor
 from src.full_node.sync_peers_handler import SyncPeersHandler
 from src.full_node.sync_store import SyncStore
+from src.full_node.transaction_inventory import (
+    MAX_INVENTORY_PER_MESSAGE,
+    TransactionInventory,
+)
 from src.protocols import (
     introducer_protocol,
     farmer_protocol,
@@ -65,6 +71,9 @@ class FullNode:
     sync_store: SyncStore
     coin_store: CoinStore
     mempool_manager: MempoolManager
+    transaction_inventory: TransactionInventory
+    adding_transactions: int
+    transactions_added: asyncio.Event
     connection: aiosqlite.Connection
     sync_peers_handler: Optional[SyncPeersHandler]
     blockchain: Blockchain
@@ -103,6 +112,8 @@ class FullNode:
     async def _start(self):
         # create the store (db) and full node instance
         self.connection = await aiosqlite.connect(self.db_path)
+        if await migrate_db(self.connection):
+            self.log.info(f"Migrated {self.db_path} to database version {DB_VERSION}")
         self.block_store = await BlockStore.create(self.connection)
         self.full_node_store = await FullNodeStore.create(self.connection)
         self.sync_store = await SyncStore.create()
@@ -116,8 +127,23 @@ class FullNode:
             f"Blockchain initialized to tips at {[t.height for t in self.blockchain.get_current_tips()]}"
         )
 
-        self.mempool_manager = MempoolManager(self.coin_store, self.constants)
+        self.mempool_manager = MempoolManager(
+            self.coin_store,
+            self.constants,
+            self.blockchain.signature_cache,
+            self.config["mempool_validation_workers"],
+            await FeeEstimator.create(self.connection),
+        )
         await self.mempool_manager.new_tips(await self.blockchain.get_full_tips())
+        self.transaction_inventory = TransactionInventory()
+        # Number of transactions being validated and added to the mempools, and an event which
+        # is set while there are none
+        self.adding_transactions = 0
+        self.transactions_added = asyncio.Event()
+        self.transactions_added.set()
+        self.trickle_transactions_task = asyncio.create_task(
+            self._trickle_transactions(self.config["tx_trickle_interval"])
+        )
         self.state_changed_callback = None
         uncompact_interval = self.config["send_uncompact_interval"]
         if uncompact_interval > 0:
@@ -295,9 +321,19 @@ class FullNode:
 
     def _close(self):
         self._shut_down = True
+        self.trickle_transactions_task.cancel()
         self.blockchain.shut_down()
+        self.mempool_manager.shut_down()
 
     async def _await_closed(self):
+        # Persists the chain state, so that the next start does not rebuild it from the
+        # headers. Writing it commits, so it is skipped while syncing, when the writes of a
+        # batch of blocks might not be complete.
+        if not self.sync_store.get_sync_mode():
+            async with self.blockchain.lock:
+                await self.blockchain.commit()
+                await self.blockchain.write_snapshot()
+        await self.mempool_manager.fee_estimator.save()
         await self.connection.close()
 
     async def _sync(self) -> OutboundMessageGenerator:
@@ -594,36 +630,154 @@ class FullNode:
     ) -> OutboundMessageGenerator:
         """
         Receives a full transaction from peer.
-        If tx is added to mempool, send tx_id to others. (new_transaction)
+        If tx is added to mempool, queues its id to be announced to others. (new_transactions)
         """
         # Ignore if syncing
         if self.sync_store.get_sync_mode():
             return
 
-        async with self.blockchain.lock:
-            # Ignore if we have already added this transaction
-            if self.mempool_manager.get_spendbundle(tx.transaction.name()) is not None:
-                return
-            cost, status, error = await self.mempool_manager.add_spendbundle(
-                tx.transaction
+        # Ignore if we have already added this transaction
+        if self.mempool_manager.get_spendbundle(tx.transaction.name()) is not None:
+            return
+        cost, status, error = await self._add_transaction(tx.transaction)
+        if status == MempoolInclusionStatus.SUCCESS:
+            fees = tx.transaction.fees()
+            assert fees >= 0
+            assert cost is not None
+            # Announced to the other peers with the next batch
+            self.transaction_inventory.add_transaction(
+                tx.transaction.name(), cost, uint64(fees)
             )
-            if status == MempoolInclusionStatus.SUCCESS:
-                fees = tx.transaction.fees()
-                assert fees >= 0
-                assert cost is not None
-                new_tx = full_node_protocol.NewTransaction(
-                    tx.transaction.name(), cost, uint64(tx.transaction.fees()),
-                )
-                yield OutboundMessage(
-                    NodeType.FULL_NODE,
-                    Message("new_transaction", new_tx),
-                    Delivery.BROADCAST_TO_OTHERS,
-                )
-            else:
-                self.log.warning(
-                    f"Wasn't able to add transaction with id {tx.transaction.name()}, {status} error: {error}"
-                )
-                return
+        else:
+            self.log.warning(
+                f"Wasn't able to add transaction with id {tx.transaction.name()}, {status} error: {error}"
+            )
+        for _ in []:
+            yield _
+
+    async def _add_transaction(
+        self, spend_bundle: SpendBundle
+    ) -> Tuple[Optional[uint64], MempoolInclusionStatus, Optional[Err]]:
+        """
+        Adds a transaction to the mempools. The CLVM and signature checks run in the
+        validation workers without the blockchain lock, which is only held while the
+        transaction is checked against the coins of each tip and added.
+        """
+        self.adding_transactions += 1
+        self.transactions_added.clear()
+        try:
+            item, error = await self.mempool_manager.validate_spendbundle(spend_bundle)
+            if item is None:
+                return None, MempoolInclusionStatus.FAILED, error
+            async with self.blockchain.lock:
+                return await self.mempool_manager.add_item(item)
+        finally:
+            self.adding_transactions -= 1
+            if self.adding_transactions == 0:
+                self.transactions_added.set()
+
+    @api_request
+    async def respond_transaction_with_peer_name(
+        self, tx: full_node_protocol.RespondTransaction, name: str
+    ) -> OutboundMessageGenerator:
+        """
+        Receives a full transaction from a peer, which is not announced back to that peer.
+        """
+        self.transaction_inventory.mark_known(name, [tx.transaction.name()])
+        async for msg in self.respond_transaction(tx):
+            yield msg
+
+    @api_request
+    async def new_transactions_with_peer_name(
+        self, request: full_node_protocol.NewTransactions, name: str
+    ) -> OutboundMessageGenerator:
+        """
+        A peer announces a batch of transactions. Requests the ones we haven't seen, and whose
+        fees are enough, in one message. Transactions which were just requested from another
+        peer are not requested again.
+        """
+        transactions = request.transactions[:MAX_INVENTORY_PER_MESSAGE]
+        self.transaction_inventory.mark_known(
+            name, [transaction_id for transaction_id, _, _ in transactions]
+        )
+        # Ignore if syncing
+        if self.sync_store.get_sync_mode():
+            return
+        wanted: List[bytes32] = [
+            transaction_id
+            for transaction_id, cost, fees in transactions
+            if not self.mempool_manager.seen(transaction_id)
+            and self.mempool_manager.is_fee_enough(fees, cost)
+        ]
+        to_request = self.transaction_inventory.to_request(wanted)
+        if len(to_request) > 0:
+            yield OutboundMessage(
+                NodeType.FULL_NODE,
+                Message(
+                    "request_transactions",
+                    full_node_protocol.RequestTransactions(to_request),
+                ),
+                Delivery.RESPOND,
+            )
+
+    @api_request
+    async def request_transactions(
+        self, request: full_node_protocol.RequestTransactions
+    ) -> OutboundMessageGenerator:
+        """ Peer has requested a batch of full transactions from us. """
+        for transaction_id in request.transaction_ids[:MAX_INVENTORY_PER_MESSAGE]:
+            async for msg in self.request_transaction(
+                full_node_protocol.RequestTransaction(transaction_id)
+            ):
+                yield msg
+
+    async def _trickle_transactions(self, interval: float):
+        """
+        Announces the transactions which were added to the mempool, once every interval
+        seconds, to the full node peers which don't know about them yet.
+        """
+        while not self._shut_down:
+            await asyncio.sleep(interval)
+            try:
+                self._announce_transactions()
+            except Exception:
+                self.log.error(f"Error announcing transactions: {traceback.format_exc()}")
+
+    def _announce_transactions(self) -> None:
+        """
+        Sends the queued transactions to the full node peers. Peers which don't support
+        batched transactions get one new_transaction message for each.
+        """
+        if self.server is None or self.global_connections is None:
+            return
+        connections = self.global_connections.get_full_node_connections()
+        announcements = self.transaction_inventory.pop_announcements(
+            [connection.get_peername() for connection in connections]
+        )
+        for connection in connections:
+            for batch in announcements.get(connection.get_peername(), []):
+                if connection.peer_batched_transactions:
+                    messages = [
+                        Message(
+                            "new_transactions", full_node_protocol.NewTransactions(batch),
+                        )
+                    ]
+                else:
+                    messages = [
+                        Message(
+                            "new_transaction", full_node_protocol.NewTransaction(*entry),
+                        )
+                        for entry in batch
+                    ]
+                for message in messages:
+                    self.server.push_message(
+                        OutboundMessage(
+                            NodeType.FULL_NODE,
+                            message,
+                            Delivery.SPECIFIC,
+                            connection.node_id,
+                        )
+                    )
 
     @api_request
     async def reject_transaction_request(
@@ -1778,29 +1932,21 @@ class FullNode:
             status = MempoolInclusionStatus.FAILED
             error: Optional[Err] = Err.UNKNOWN
         else:
-            async with self.blockchain.lock:
-                cost, status, error = await self.mempool_manager.add_spendbundle(
-                    tx.transaction
+            cost, status, error = await self._add_transaction(tx.transaction)
+            if status == MempoolInclusionStatus.SUCCESS:
+                # Only broadcast successful transactions, not pending ones. Otherwise it's a DOS
+                # vector.
+                fees = tx.transaction.fees()
+                assert fees >= 0
+                assert cost is not None
+                self.transaction_inventory.add_transaction(
+                    tx.transaction.name(), cost, uint64(fees)
+                )
+            else:
+                self.log.warning(
+                    f"Wasn't able to add transaction with id {tx.transaction.name()}, "
+                    f"status {status} error: {error}"
                 )
-                if status == MempoolInclusionStatus.SUCCESS:
-                    # Only broadcast successful transactions, not pending ones. Otherwise it's a DOS
-                    # vector.
-                    fees = tx.transaction.fees()
-                    assert fees >= 0
-                    assert cost is not None
-                    new_tx = full_node_protocol.NewTransaction(
-                        tx.transaction.name(), cost, uint64(tx.transaction.fees()),
-                    )
-                    yield OutboundMessage(
-                        NodeType.FULL_NODE,
-                        Message("new_transaction", new_tx),
-                        Delivery.BROADCAST_TO_OTHERS,
-                    )
-                else:
-                    self.log.warning(
-                        f"Wasn't able to add transaction with id {tx.transaction.name()}, "
-                        f"status {status} error: {error}"
-                    )
 
         error_name = error.name if error is not None else None
         if status == MempoolInclusionStatus.SUCCESS:
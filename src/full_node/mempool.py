@@ -1,8 +1,7 @@
-from typing import List, Dict
+from typing import Dict, Optional
 
 from sortedcontainers import SortedDict
 
-from src.types.coin import Coin
 from src.types.mempool_item import MempoolItem
 from src.types.sized_bytes import bytes32
 from src.util.ints import uint32, uint64
@@ -10,6 +9,12 @@ from src.types.header import Header
 
 
 class Mempool:
+    """
+    The view of the mempool from one tip. The MempoolItems are validated once and shared by
+    the views of all the tips; a view only records which of them are valid on top of its
+    tip, indexed by fee and by the coins they add and remove.
+    """
+
     header: Header
     spends: Dict[bytes32, MempoolItem]
     sorted_spends: SortedDict
@@ -31,6 +36,19 @@ class Mempool:
         self.size = size
         return self
 
+    def copy(self, tip: Header) -> "Mempool":
+        """ Returns a view for another tip, with the same items. """
+        new_pool = Mempool.create(tip, self.size)
+        new_pool.spends = self.spends.copy()
+        new_pool.additions = self.additions.copy()
+        new_pool.removals = self.removals.copy()
+        new_pool.min_fee = self.min_fee
+        new_pool.sorted_spends = SortedDict(
+            (fee_per_cost, dic.copy())
+            for fee_per_cost, dic in self.sorted_spends.items()
+        )
+        return new_pool
+
     def get_min_fee_rate(self) -> float:
         if self.at_full_capacity():
             fee_per_cost, val = self.sorted_spends.peekitem(index=0)
@@ -39,11 +57,9 @@ class Mempool:
             return 0
 
     def remove_spend(self, item: MempoolItem):
-        removals: List[Coin] = item.spend_bundle.removals()
-        additions: List[Coin] = item.spend_bundle.additions()
-        for rem in removals:
+        for rem in item.removals:
             del self.removals[rem.name()]
-        for add in additions:
+        for add in item.additions:
             del self.additions[add.name()]
         del self.spends[item.name]
         del self.sorted_spends[item.fee_per_cost][item.name]
@@ -51,17 +67,15 @@ class Mempool:
         if len(dic.values()) == 0:
             del self.sorted_spends[item.fee_per_cost]
 
-    def add_to_pool(
-        self,
-        item: MempoolItem,
-        additions: List[Coin],
-        removals_dic: Dict[bytes32, Coin],
-    ):
+    def add_to_pool(self, item: MempoolItem) -> Optional[MempoolItem]:
+        """ Adds an item, returns the item which was removed to make space for it, if any. """
+        removed: Optional[MempoolItem] = None
         if self.at_full_capacity():
             # Val is Dict[hash, MempoolItem]
             fee_per_cost, val = self.sorted_spends.peekitem(index=0)
-            to_remove = list(val.values())[0]
-            self.remove_spend(to_remove)
+            lowest: MempoolItem = list(val.values())[0]
+            self.remove_spend(lowest)
+            removed = lowest
 
         self.spends[item.name] = item
 
@@ -72,10 +86,11 @@ class Mempool:
             self.sorted_spends[item.fee_per_cost] = {}
             self.sorted_spends[item.fee_per_cost][item.name] = item
 
-        for add in additions:
+        for add in item.additions:
             self.additions[add.name()] = item
-        for key in removals_dic.keys():
-            self.removals[key] = item
+        for rem in item.removals:
+            self.removals[rem.name()] = item
+        return removed
 
     def at_full_capacity(self) -> bool:
         return len(self.spends.keys()) >= self.size
@@ -1,10 +1,12 @@
+import asyncio
 import collections
+import concurrent
 import sys
-from typing import Dict, Optional, Tuple, List, Set
+from typing import Counter, Dict, Optional, Tuple, List, Set
 import logging
 
 from chiabip158 import PyBIP158
-from blspy import G1Element, G2Element, AugSchemeMPL
+from blspy import G1Element, AugSchemeMPL
 
 from src.consensus.constants import ConsensusConstants
 from src.types.condition_opcodes import ConditionOpcode
@@ -16,7 +18,11 @@ from src.types.spend_bundle import SpendBundle
 from src.types.coin_record import CoinRecord
 from src.types.header import Header
 from src.types.mempool_item import MempoolItem
+from src.types.name_puzzle_condition import NPC
+from src.full_node.block_template import BlockTemplate
+from src.full_node.fee_estimator import FeeEstimator
 from src.full_node.mempool import Mempool
+from src.full_node.signature_cache import SignatureCache
 from src.types.sized_bytes import bytes32
 from src.full_node.coin_store import CoinStore
 from src.util.errors import Err
@@ -25,6 +31,7 @@ from src.util.cost_calculator import calculate_cost_of_program
 from src.util.mempool_check_conditions import mempool_check_conditions_dict
 from src.util.condition_tools import pkm_pairs_for_conditions_dict
 from src.util.ints import uint64, uint32
+from src.util.lru_cache import FIFOCache, LRUCache
 from src.types.mempool_inclusion_status import MempoolInclusionStatus
 from sortedcontainers import SortedDict
 
@@ -32,18 +39,77 @@ from sortedcontainers import SortedDict
 log = logging.getLogger(__name__)
 
 
+def pre_validate_spendbundle(
+    spend_bundle_bytes: bytes, clvm_cost_ratio_constant: int
+) -> Tuple[Optional[Err], List[Tuple[bytes, bytes, Dict]], int, bool]:
+    """
+    Runs the CLVM of a spend bundle and verifies its aggregate signature. Neither depends on
+    the state of the coins, so this can run in a worker process. Returns the error of the
+    program if any, the NPC list, the cost, and whether the signature is valid. The hashes
+    in the NPC list are returned as plain bytes, since bytes32 cannot be pickled.
+    """
+    spend_bundle = SpendBundle.from_bytes(spend_bundle_bytes)
+    program = best_solution_program(spend_bundle)
+    # npc contains names of the coins removed, puzzle_hashes and their spend conditions
+    fail_reason, npc_list, cost = calculate_cost_of_program(
+        program, clvm_cost_ratio_constant
+    )
+    if fail_reason:
+        return fail_reason, [], int(cost), False
+
+    pks: List[G1Element] = []
+    msgs: List[bytes] = []
+    for npc in npc_list:
+        for pk, m in pkm_pairs_for_conditions_dict(npc.condition_dict, npc.coin_name):
+            pks.append(pk)
+            msgs.append(m)
+    validates = AugSchemeMPL.agg_verify(pks, msgs, spend_bundle.aggregated_signature)
+    npc_tuples = [
+        (bytes(npc.coin_name), bytes(npc.puzzle_hash), npc.condition_dict)
+        for npc in npc_list
+    ]
+    return None, npc_tuples, int(cost), validates
+
+
 class MempoolManager:
-    def __init__(self, coin_store: CoinStore, consensus_constants: ConsensusConstants):
+    def __init__(
+        self,
+        coin_store: CoinStore,
+        consensus_constants: ConsensusConstants,
+        signature_cache: Optional[SignatureCache] = None,
+        validation_workers: int = 0,
+        fee_estimator: Optional[FeeEstimator] = None,
+    ):
         self.constants: ConsensusConstants = consensus_constants
 
-        # Transactions that were unable to enter mempool, used for retry. (they were invalid)
-        self.potential_txs: Dict[bytes32, SpendBundle] = {}
-        # Keep track of seen spend_bundles
-        self.seen_bundle_hashes: Dict[bytes32, bytes32] = {}
-        # Mempool for each tip
+        # Runs the CLVM and signature checks of new spend bundles off the event loop. With no
+        # workers, the default, they run in the event loop
+        self.pool: Optional[concurrent.futures.ProcessPoolExecutor] = None
+        if validation_workers > 0:
+            self.pool = concurrent.futures.ProcessPoolExecutor(
+                max_workers=validation_workers
+            )
+
+        # Verified signatures, so a bundle is only verified once for all the pools
+        self.signature_cache: SignatureCache = (
+            signature_cache if signature_cache is not None else SignatureCache()
+        )
+        # Statistics of the fees of the items, by the number of blocks they took to confirm
+        self.fee_estimator: FeeEstimator = (
+            fee_estimator if fee_estimator is not None else FeeEstimator()
+        )
+
+        # Every item which is in the pool of at least one tip, validated once and shared
+        self.items: Dict[bytes32, MempoolItem] = {}
+        # The number of pools each item is in
+        self.item_pool_counts: Counter[bytes32] = collections.Counter()
+        # The view of the items from each tip
         self.mempools: Dict[bytes32, Mempool] = {}
+        # The block template of each tip, kept up to date as items are added to its pool
+        self.templates: Dict[bytes32, BlockTemplate] = {}
 
-        # old_mempools will contain transactions that were removed in the last 10 blocks
+        # old_mempools will contain transactions that were removed in the last
+        # old_mempool_heights blocks
         self.old_mempools: SortedDict[
             uint32, Dict[bytes32, MempoolItem]
         ] = SortedDict()  # pylint: disable=E1136
@@ -57,39 +123,84 @@ class MempoolManager:
         self.mempool_size = tx_per_sec * sec_per_block * block_buffer_count
         self.potential_cache_size = 300
         self.seen_cache_size = 10000
+        self.old_mempool_heights = 10
         self.coinbase_freeze = self.constants["COINBASE_FREEZE_PERIOD"]
 
+        # Transactions that were unable to enter mempool, used for retry. (they were invalid)
+        self.potential_txs = FIFOCache(self.potential_cache_size)
+        # Keep track of seen spend_bundles
+        self.seen_bundle_hashes = FIFOCache(self.seen_cache_size)
+
+        # Results of pre_validate_spendbundle, so bundles that are added to several pools, or
+        # added again when the tips change, only run in a worker once
+        self.pre_validation_cache = LRUCache(self.seen_cache_size)
+
+    def shut_down(self):
+        if self.pool is not None:
+            self.pool.shutdown(wait=True)
+
+    async def pre_validate_spendbundle(
+        self, new_spend: SpendBundle
+    ) -> Tuple[Optional[Err], List[NPC], uint64, bool]:
+        """
+        Returns the error, NPC list, cost and signature validity of a spend bundle, computed
+        in the worker pool. Valid signatures are added to the signature cache, so they are not
+        verified again when the bundle is included in a block.
+        """
+        spend_name = new_spend.name()
+        cached = self.pre_validation_cache.get(spend_name)
+        if cached is not None:
+            return cached
+
+        if self.pool is None:
+            validation = pre_validate_spendbundle(
+                bytes(new_spend), self.constants.CLVM_COST_RATIO_CONSTANT
+            )
+        else:
+            validation = await asyncio.get_running_loop().run_in_executor(
+                self.pool,
+                pre_validate_spendbundle,
+                bytes(new_spend),
+                self.constants.CLVM_COST_RATIO_CONSTANT,
+            )
+        fail_reason, npc_tuples, cost, validates = validation
+        npc_list = [
+            NPC(bytes32(coin_name), bytes32(puzzle_hash), condition_dict)
+            for coin_name, puzzle_hash, condition_dict in npc_tuples
+        ]
+        result = (fail_reason, npc_list, uint64(cost), validates)
+        if fail_reason is None and validates:
+            pks: List[G1Element] = []
+            msgs: List[bytes] = []
+            for npc in npc_list:
+                for pk, m in pkm_pairs_for_conditions_dict(
+                    npc.condition_dict, npc.coin_name
+                ):
+                    pks.append(pk)
+                    msgs.append(m)
+            if len(pks) > 0:
+                self.signature_cache.add(pks, msgs, new_spend.aggregated_signature)
+
+        self.pre_validation_cache.put(spend_name, result)
+        return result
+
     async def create_bundle_for_tip(self, header: Header) -> Optional[SpendBundle]:
         """
         Returns aggregated spendbundle that can be used for creating new block
         """
-        if header.header_hash in self.mempools:
-            mempool: Mempool = self.mempools[header.header_hash]
-            cost_sum = 0
-            spend_bundles: List[SpendBundle] = []
-            for dic in mempool.sorted_spends.values():
-                for item in dic.values():
-                    if item.cost + cost_sum <= self.constants["MAX_BLOCK_COST_CLVM"]:
-                        spend_bundles.append(item.spend_bundle)
-                        cost_sum += item.cost
-                    else:
-                        break
-            if len(spend_bundles) > 0:
-                block_bundle = SpendBundle.aggregate(spend_bundles)
-                return block_bundle
-            else:
-                return None
-        else:
+        if header.header_hash not in self.mempools:
             return None
+        template = self.templates.get(header.header_hash)
+        if template is None:
+            template = BlockTemplate.create(
+                self.mempools[header.header_hash],
+                self.constants["MAX_BLOCK_COST_CLVM"],
+            )
+            self.templates[header.header_hash] = template
+        return template.spend_bundle
 
     def get_filter(self) -> bytes:
-        all_transactions: Set[bytes32] = set()
-        byte_array_list = []
-        for _, mempool in self.mempools.items():
-            for key, mempool_item in mempool.spends.items():
-                if key not in all_transactions:
-                    all_transactions.add(key)
-                    byte_array_list.append(bytearray(key))
+        byte_array_list = [bytearray(key) for key in self.items.keys()]
 
         filter: PyBIP158 = PyBIP158(byte_array_list)
         return bytes(filter.GetEncoded())
@@ -107,62 +218,127 @@ class MempoolManager:
                 return True
         return False
 
-    def maybe_pop_seen(self):
-        while len(self.seen_bundle_hashes) > self.seen_cache_size:
-            first_in = list(self.seen_bundle_hashes.keys())[0]
-            self.seen_bundle_hashes.pop(first_in)
-
     async def add_spendbundle(
-        self, new_spend: SpendBundle, to_pool: Mempool = None
+        self, new_spend: SpendBundle, to_pool: Optional[Mempool] = None
     ) -> Tuple[Optional[uint64], MempoolInclusionStatus, Optional[Err]]:
         """
         Tries to add spendbundle to either self.mempools or to_pool if it's specified.
         Returns true if it's added in any of pools, Returns error if it fails.
         """
-        self.seen_bundle_hashes[new_spend.name()] = new_spend.name()
-        self.maybe_pop_seen()
-
-        # Calculate the cost and fees
-        program = best_solution_program(new_spend)
-        # npc contains names of the coins removed, puzzle_hashes and their spend conditions
-        fail_reason, npc_list, cost = calculate_cost_of_program(
-            program, self.constants.CLVM_COST_RATIO_CONSTANT,
+        item, error = await self.validate_spendbundle(new_spend)
+        if item is None:
+            return None, MempoolInclusionStatus.FAILED, error
+        return await self.add_item(item, to_pool)
+
+    async def validate_spendbundle(
+        self, new_spend: SpendBundle
+    ) -> Tuple[Optional[MempoolItem], Optional[Err]]:
+        """
+        Marks a spend bundle as seen, and returns its MempoolItem, or the error. The item is
+        created by create_mempool_item, unless it is already in a pool. This does not read the
+        coin store, so it can run without the blockchain lock.
+        """
+        self.seen_bundle_hashes.put(new_spend.name(), new_spend.name())
+
+        item: Optional[MempoolItem] = self.items.get(new_spend.name())
+        if item is not None:
+            return item, None
+        return await self.create_mempool_item(new_spend)
+
+    async def create_mempool_item(
+        self, new_spend: SpendBundle
+    ) -> Tuple[Optional[MempoolItem], Optional[Err]]:
+        """
+        Runs the checks of a spend bundle which do not depend on any tip: the CLVM, the
+        signature, the amounts and the fee conditions. Returns the MempoolItem, or the error.
+        """
+        # Calculate the cost, and verify the signature
+        fail_reason, npc_list, cost, validates = await self.pre_validate_spendbundle(
+            new_spend
         )
         if fail_reason:
-            return None, MempoolInclusionStatus.FAILED, fail_reason
-
-        # build removal list
-        removal_names: List[bytes32] = new_spend.removal_names()
+            return None, fail_reason
 
-        additions = new_spend.additions()
-        additions_dict: Dict[bytes32, Coin] = {}
-        for add in additions:
-            additions_dict[add.name()] = add
+        removals: List[Coin] = new_spend.removals()
+        removal_dict: Dict[bytes32, Coin] = {coin.name(): coin for coin in removals}
+        additions: List[Coin] = new_spend.additions()
 
         addition_amount = uint64(0)
 
         # Check additions for max coin amount
         for coin in additions:
             if coin.amount >= uint64.from_bytes(self.constants["MAX_COIN_AMOUNT"]):
-                return (
-                    None,
-                    MempoolInclusionStatus.FAILED,
-                    Err.COIN_AMOUNT_EXCEEDS_MAXIMUM,
-                )
+                return None, Err.COIN_AMOUNT_EXCEEDS_MAXIMUM
             addition_amount = uint64(addition_amount + coin.amount)
 
         # Check for duplicate outputs
         addition_counter = collections.Counter(_.name() for _ in additions)
         for k, v in addition_counter.items():
             if v > 1:
-                return None, MempoolInclusionStatus.FAILED, Err.DUPLICATE_OUTPUT
+                return None, Err.DUPLICATE_OUTPUT
 
         # Check for duplicate inputs
-        removal_counter = collections.Counter(name for name in removal_names)
+        removal_counter = collections.Counter(coin.name() for coin in removals)
         for k, v in removal_counter.items():
             if v > 1:
-                return None, MempoolInclusionStatus.FAILED, Err.DOUBLE_SPEND
+                return None, Err.DOUBLE_SPEND
+
+        # The amount of a coin is committed to by its name, so it does not depend on the tip
+        removal_amount = uint64(sum(coin.amount for coin in removals))
+        if addition_amount > removal_amount:
+            return None, Err.MINTING_COIN
+
+        fees = removal_amount - addition_amount
+        assert_fee_sum: uint64 = uint64(0)
+
+        for npc in npc_list:
+            if ConditionOpcode.ASSERT_FEE in npc.condition_dict:
+                fee_list: List[ConditionVarPair] = npc.condition_dict[
+                    ConditionOpcode.ASSERT_FEE
+                ]
+                for cvp in fee_list:
+                    fee = int_from_bytes(cvp.var1)
+                    assert_fee_sum = assert_fee_sum + fee
+
+        if fees < assert_fee_sum:
+            return None, Err.ASSERT_FEE_CONDITION_FAILED
 
+        if cost == 0:
+            return None, Err.UNKNOWN
+
+        # Check that the revealed removal puzzles actually match the puzzle hash
+        for npc in npc_list:
+            coin = removal_dict[npc.coin_name]
+            if npc.puzzle_hash != coin.puzzle_hash:
+                log.warning(
+                    "Mempool rejecting transaction because of wrong puzzle_hash"
+                )
+                log.warning(f"{npc.puzzle_hash} != {coin.puzzle_hash}")
+                return None, Err.WRONG_PUZZLE_HASH
+
+        # Aggregated signature was verified by pre_validate_spendbundle
+        if not validates:
+            return None, Err.BAD_AGGREGATE_SIGNATURE
+
+        fees_per_cost: float = fees / cost
+        item = MempoolItem(
+            new_spend,
+            fees_per_cost,
+            uint64(fees),
+            uint64(cost),
+            npc_list,
+            additions,
+            removals,
+        )
+        return item, None
+
+    async def add_item(
+        self, item: MempoolItem, to_pool: Optional[Mempool] = None
+    ) -> Tuple[Optional[uint64], MempoolInclusionStatus, Optional[Err]]:
+        """
+        Tries to add an already created MempoolItem to either self.mempools or to_pool if
+        it's specified.
+        """
         # Spend might be valid for one pool but not for other
         added_count = 0
         errors: List[Err] = []
@@ -179,166 +355,191 @@ class MempoolManager:
 
         for pool in targets:
             # Skip if already added
-            if new_spend.name() in pool.spends:
+            if item.name in pool.spends:
                 added_count += 1
                 continue
 
-            removal_record_dict: Dict[bytes32, CoinRecord] = {}
-            removal_coin_dict: Dict[bytes32, Coin] = {}
-
-            unknown_unspent_error: bool = False
-            removal_amount = uint64(0)
-            for name in removal_names:
-                removal_record = await self.coin_store.get_coin_record(
-                    name, pool.header
-                )
-                if removal_record is None and name not in additions_dict:
-                    unknown_unspent_error = True
-                    break
-                elif name in additions_dict:
-                    removal_coin = additions_dict[name]
-                    removal_record = CoinRecord(
-                        removal_coin,
-                        uint32(pool.header.height + 1),
-                        uint32(0),
-                        False,
-                        False,
-                    )
-
-                assert removal_record is not None
-                removal_amount = uint64(removal_amount + removal_record.coin.amount)
-                removal_record_dict[name] = removal_record
-                removal_coin_dict[name] = removal_record.coin
-
-            if unknown_unspent_error:
-                errors.append(Err.UNKNOWN_UNSPENT)
+            error, retry = await self.add_item_to_pool(item, pool)
+            if error is None:
+                added_count += 1
                 continue
+            errors.append(error)
+            if retry:
+                self.add_to_potential_tx_set(item.spend_bundle)
+                added_to_potential = True
+                potential_error = error
 
-            if addition_amount > removal_amount:
-                return None, MempoolInclusionStatus.FAILED, Err.MINTING_COIN
-
-            fees = removal_amount - addition_amount
-            assert_fee_sum: uint64 = uint64(0)
+        if added_count > 0:
+            return item.cost, MempoolInclusionStatus.SUCCESS, None
+        elif added_to_potential:
+            return item.cost, MempoolInclusionStatus.PENDING, potential_error
+        else:
+            return None, MempoolInclusionStatus.FAILED, errors[0]
 
-            for npc in npc_list:
-                if ConditionOpcode.ASSERT_FEE in npc.condition_dict:
-                    fee_list: List[ConditionVarPair] = npc.condition_dict[
-                        ConditionOpcode.ASSERT_FEE
-                    ]
-                    for cvp in fee_list:
-                        fee = int_from_bytes(cvp.var1)
-                        assert_fee_sum = assert_fee_sum + fee
-
-            if fees < assert_fee_sum:
-                return (
-                    None,
-                    MempoolInclusionStatus.FAILED,
-                    Err.ASSERT_FEE_CONDITION_FAILED,
+    async def add_item_to_pool(
+        self, item: MempoolItem, pool: Mempool
+    ) -> Tuple[Optional[Err], bool]:
+        """
+        Runs the checks of an item which depend on the tip of the pool: the state of the coins
+        it spends, conflicts with other items, and the conditions. Adds it to the pool if they
+        pass. Otherwise returns the error, and whether the item might become valid later.
+        """
+        additions_dict: Dict[bytes32, Coin] = {
+            add.name(): add for add in item.additions
+        }
+        removal_record_dict: Dict[bytes32, CoinRecord] = {}
+        for removal_coin in item.removals:
+            name = removal_coin.name()
+            removal_record: Optional[CoinRecord]
+            if name in additions_dict or name in pool.additions:
+                # Ephemeral coin, created by this bundle or by another item in the pool
+                removal_record = CoinRecord(
+                    removal_coin,
+                    uint32(pool.header.height + 1),
+                    uint32(0),
+                    False,
+                    False,
                 )
-
-            if cost == 0:
-                return None, MempoolInclusionStatus.FAILED, Err.UNKNOWN
-
-            fees_per_cost: float = fees / cost
-
-            # If pool is at capacity check the fee, if not then accept even without the fee
-            if pool.at_full_capacity():
-                if fees == 0:
-                    errors.append(Err.INVALID_FEE_LOW_FEE)
-                    continue
-                if fees_per_cost < pool.get_min_fee_rate():
-                    errors.append(Err.INVALID_FEE_LOW_FEE)
-                    continue
-
-            # Check removals against UnspentDB + DiffStore + Mempool + SpendBundle
-            # Use this information later when constructing a block
-            fail_reason, conflicts = await self.check_removals(
-                removal_record_dict, pool
+            else:
+                removal_record = await self.coin_store.get_coin_record(
+                    name, pool.header
+                )
+                if removal_record is None:
+                    return Err.UNKNOWN_UNSPENT, False
+            removal_record_dict[name] = removal_record
+
+        # If pool is at capacity check the fee, if not then accept even without the fee
+        if pool.at_full_capacity():
+            if item.fee == 0:
+                return Err.INVALID_FEE_LOW_FEE, False
+            if item.fee_per_cost < pool.get_min_fee_rate():
+                return Err.INVALID_FEE_LOW_FEE, False
+
+        # Check removals against UnspentDB + DiffStore + Mempool + SpendBundle
+        # Use this information later when constructing a block
+        fail_reason, conflicts = await self.check_removals(removal_record_dict, pool)
+        # If there is a mempool conflict check if this spendbundle has a higher fee per cost than all others
+        conflicting_pool_items: Dict[bytes32, MempoolItem] = {}
+        if fail_reason is Err.MEMPOOL_CONFLICT:
+            for conflicting in conflicts:
+                sb: MempoolItem = pool.removals[conflicting.name()]
+                conflicting_pool_items[sb.name] = sb
+            for conflicting_item in conflicting_pool_items.values():
+                if conflicting_item.fee_per_cost >= item.fee_per_cost:
+                    return Err.MEMPOOL_CONFLICT, True
+        elif fail_reason:
+            return fail_reason, False
+
+        # Verify conditions
+        for npc in item.npc_list:
+            coin_record: CoinRecord = removal_record_dict[npc.coin_name]
+            error = mempool_check_conditions_dict(
+                coin_record, item.spend_bundle, npc.condition_dict, pool
             )
-            # If there is a mempool conflict check if this spendbundle has a higher fee per cost than all others
-            tmp_error: Optional[Err] = None
-            conflicting_pool_items: Dict[bytes32, MempoolItem] = {}
-            if fail_reason is Err.MEMPOOL_CONFLICT:
-                for conflicting in conflicts:
-                    sb: MempoolItem = pool.removals[conflicting.name()]
-                    conflicting_pool_items[sb.name] = sb
-                for item in conflicting_pool_items.values():
-                    if item.fee_per_cost >= fees_per_cost:
-                        tmp_error = Err.MEMPOOL_CONFLICT
-                        self.add_to_potential_tx_set(new_spend)
-                        added_to_potential = True
-                        potential_error = Err.MEMPOOL_CONFLICT
-                        break
-            elif fail_reason:
-                errors.append(fail_reason)
+            if error:
+                retry = (
+                    error is Err.ASSERT_BLOCK_INDEX_EXCEEDS_FAILED
+                    or error is Err.ASSERT_BLOCK_AGE_EXCEEDS_FAILED
+                )
+                return error, retry
+
+        # Remove all conflicting Coins and SpendBundles
+        for conflicting_item in conflicting_pool_items.values():
+            self.remove_from_pool(conflicting_item, pool)
+
+        removed = pool.add_to_pool(item)
+        if item.name not in self.items:
+            self.fee_estimator.item_added(item, pool.header.height)
+        self.reference_item(item)
+        if removed is not None:
+            self.dereference_item(removed)
+            self.drop_template(removed, pool)
+            self.remove_descendants(removed, pool)
+        template = self.templates.get(pool.header.header_hash)
+        if template is not None and not template.add(item, pool):
+            del self.templates[pool.header.header_hash]
+        return None, False
+
+    def remove_from_pool(
+        self,
+        item: MempoolItem,
+        pool: Mempool,
+        kept_coins: Optional[Set[bytes32]] = None,
+    ) -> List[MempoolItem]:
+        """
+        Removes an item and its descendants, the items which spend the coins it creates,
+        from a pool. Descendants which spend one of kept_coins stay, since the coin exists
+        without the item. Returns the removed items.
+        """
+        pool.remove_spend(item)
+        self.dereference_item(item)
+        self.drop_template(item, pool)
+        removed = [item] + self.remove_descendants(item, pool, kept_coins)
+        return removed
+
+    def remove_descendants(
+        self,
+        item: MempoolItem,
+        pool: Mempool,
+        kept_coins: Optional[Set[bytes32]] = None,
+    ) -> List[MempoolItem]:
+        removed: List[MempoolItem] = []
+        to_check: List[Coin] = list(item.additions)
+        while len(to_check) > 0:
+            coin_name = to_check.pop().name()
+            if kept_coins is not None and coin_name in kept_coins:
                 continue
-
-            if tmp_error:
-                errors.append(tmp_error)
+            descendant = pool.removals.get(coin_name)
+            if descendant is None or descendant is item:
                 continue
-
-            # Verify conditions, create hash_key list for aggsig check
-            pks: List[G1Element] = []
-            msgs: List[G2Element] = []
-            error: Optional[Err] = None
-            for npc in npc_list:
-                coin_record: CoinRecord = removal_record_dict[npc.coin_name]
-                # Check that the revealed removal puzzles actually match the puzzle hash
-                if npc.puzzle_hash != coin_record.coin.puzzle_hash:
-                    log.warning(
-                        "Mempool rejecting transaction because of wrong puzzle_hash"
-                    )
-                    log.warning(f"{npc.puzzle_hash} != {coin_record.coin.puzzle_hash}")
-                    return None, MempoolInclusionStatus.FAILED, Err.WRONG_PUZZLE_HASH
-
-                error = mempool_check_conditions_dict(
-                    coin_record, new_spend, npc.condition_dict, pool
-                )
-
-                if error:
-                    if (
-                        error is Err.ASSERT_BLOCK_INDEX_EXCEEDS_FAILED
-                        or error is Err.ASSERT_BLOCK_AGE_EXCEEDS_FAILED
-                    ):
-                        self.add_to_potential_tx_set(new_spend)
-                        added_to_potential = True
-                        potential_error = error
-                    break
-
-                for pk, m in pkm_pairs_for_conditions_dict(
-                    npc.condition_dict, npc.coin_name
+            pool.remove_spend(descendant)
+            self.dereference_item(descendant)
+            self.drop_template(descendant, pool)
+            removed.append(descendant)
+            to_check.extend(descendant.additions)
+        return removed
+
+    def drop_template(self, item: MempoolItem, pool: Mempool) -> None:
+        """ Drops the template of the tip of the pool, if it has an item which left the pool. """
+        template = self.templates.get(pool.header.header_hash)
+        if template is not None and item.name in template.items:
+            del self.templates[pool.header.header_hash]
+
+    def remove_block_spends(
+        self, pool: Mempool, removals: List[bytes32], additions: List[Coin]
+    ) -> List[MempoolItem]:
+        """
+        Updates the pool of the parent of a block to be the pool of the block, in
+        O(spends in the block). The items which spend a coin spent by the block are included
+        in it, or conflict with it, and are removed. So are their descendants, unless the
+        coins they spend were created by the block. The confirmations of the items included
+        in the block are recorded for the fee estimates. Returns the removed items.
+        """
+        block_removals: Set[bytes32] = set(removals)
+        block_additions: Set[bytes32] = set(coin.name() for coin in additions)
+        removed: List[MempoolItem] = []
+        for coin_name in removals:
+            item = pool.removals.get(coin_name)
+            if item is not None:
+                if all(coin.name() in block_removals for coin in item.removals) and all(
+                    coin.name() in block_additions for coin in item.additions
                 ):
-                    pks.append(pk)
-                    msgs.append(m)
-
-            if error:
-                errors.append(error)
-                continue
-
-            # Verify aggregated signature
-            validates = AugSchemeMPL.agg_verify(
-                pks, msgs, new_spend.aggregated_signature
-            )
-            if not validates:
-                return None, MempoolInclusionStatus.FAILED, Err.BAD_AGGREGATE_SIGNATURE
-
-            # Remove all conflicting Coins and SpendBundles
-            if fail_reason:
-                mitem: MempoolItem
-                for mitem in conflicting_pool_items.values():
-                    pool.remove_spend(mitem)
-
-            new_item = MempoolItem(new_spend, fees_per_cost, uint64(fees), uint64(cost))
-            pool.add_to_pool(new_item, additions, removal_coin_dict)
-
-            added_count += 1
-
-        if added_count > 0:
-            return uint64(cost), MempoolInclusionStatus.SUCCESS, None
-        elif added_to_potential:
-            return uint64(cost), MempoolInclusionStatus.PENDING, potential_error
-        else:
-            return None, MempoolInclusionStatus.FAILED, errors[0]
+                    self.fee_estimator.item_included(item.name, pool.header.height)
+                removed.extend(self.remove_from_pool(item, pool, block_additions))
+        return removed
+
+    def reference_item(self, item: MempoolItem) -> None:
+        """ Records that an item was added to the pool of a tip, storing it if it's new. """
+        self.items[item.name] = item
+        self.item_pool_counts[item.name] += 1
+
+    def dereference_item(self, item: MempoolItem) -> None:
+        """ Records that an item left the pool of a tip, dropping it once it's in none. """
+        self.item_pool_counts[item.name] -= 1
+        if self.item_pool_counts[item.name] <= 0:
+            del self.item_pool_counts[item.name]
+            del self.items[item.name]
+            self.fee_estimator.item_removed(item.name)
 
     async def check_removals(
         self, removals: Dict[bytes32, CoinRecord], mempool: Mempool
@@ -376,11 +577,7 @@ class MempoolManager:
         Adds SpendBundles that have failed to be added to the pool in potential tx set.
         This is later used to retry to add them.
         """
-        self.potential_txs[spend.name()] = spend
-
-        while len(self.potential_txs) > self.potential_cache_size:
-            first_in = list(self.potential_txs.keys())[0]
-            self.potential_txs.pop(first_in)
+        self.potential_txs.put(spend.name(), spend)
 
     def seen(self, bundle_hash: bytes32) -> bool:
         """ Return true if we saw this spendbundle before """
@@ -391,64 +588,106 @@ class MempoolManager:
 
     def get_spendbundle(self, bundle_hash: bytes32) -> Optional[SpendBundle]:
         """ Returns a full SpendBundle if it's inside one the mempools"""
-        for pool in self.mempools.values():
-            if bundle_hash in pool.spends:
-                return pool.spends[bundle_hash].spend_bundle
+        item = self.items.get(bundle_hash)
+        if item is not None:
+            return item.spend_bundle
         return None
 
     async def new_tips(self, new_tips: List[FullBlock]):
         """
-        Called when new tips are available, we try to recreate a mempool for each of the new tips.
-        For tip that we already have mempool we don't do anything.
+        Called when new tips are available, we create a mempool for each of the new tips.
+        For tip that we already have mempool we don't do anything. A tip which is the child
+        of the tip of a current pool starts from that pool, and only drops the items which
+        conflict with the spends of the new block. Other tips get a pool built from the stored
+        items, which only checks them against the state of the coins at that tip.
         """
         new_pools: Dict[bytes32, Mempool] = {}
+        # Pools which are changed in place to become the pool of their child
+        reused_pools: Set[bytes32] = set()
+        # Items dropped from the pools, with the tip they were dropped from
+        dropped_items: List[Tuple[MempoolItem, Header]] = []
 
         min_mempool_height = sys.maxsize
         for pool in self.mempools.values():
             if pool.header.height < min_mempool_height:
                 min_mempool_height = pool.header.height
 
+        new_tip_hashes: Set[bytes32] = set(tip.header_hash for tip in new_tips)
+        child_counts = collections.Counter(tip.prev_header_hash for tip in new_tips)
+
         for tip in new_tips:
             if tip.header_hash in self.mempools:
                 # Nothing to change, we already have mempool for this head
                 new_pools[tip.header_hash] = self.mempools[tip.header_hash]
                 continue
 
-            new_pool = Mempool.create(tip.header, self.mempool_size)
-            if tip.height < min_mempool_height:
-                # Update old mempool
-                if len(self.old_mempools) > 0:
-                    log.info(f"Creating new pool: {new_pool.header}")
-
-                    # If old spends height is bigger than the new tip height, try adding spends to the pool
-                    for height in self.old_mempools.keys():
-                        old_spend_dict: Dict[bytes32, MempoolItem] = self.old_mempools[
-                            height
-                        ]
-                        await self.add_old_spends_to_pool(new_pool, old_spend_dict)
+            new_pool: Mempool
+            parent_pool: Optional[Mempool] = self.mempools.get(tip.prev_header_hash)
+            if parent_pool is not None:
+                parent_header = parent_pool.header
+                if (
+                    child_counts[tip.prev_header_hash] == 1
+                    and tip.prev_header_hash not in new_tip_hashes
+                ):
+                    # The parent's pool is not needed anymore, so it becomes the new pool
+                    new_pool = parent_pool
+                    new_pool.header = tip.header
+                    reused_pools.add(tip.prev_header_hash)
+                else:
+                    new_pool = parent_pool.copy(tip.header)
+                    for item in new_pool.spends.values():
+                        self.reference_item(item)
+                removals, additions = await tip.tx_removals_and_additions()
+                for removed in self.remove_block_spends(new_pool, removals, additions):
+                    dropped_items.append((removed, parent_header))
+            else:
+                new_pool = Mempool.create(tip.header, self.mempool_size)
+                if tip.height < min_mempool_height:
+                    # Update old mempool
+                    if len(self.old_mempools) > 0:
+                        log.info(f"Creating new pool: {new_pool.header}")
+
+                        # If old spends height is bigger than the new tip height, try adding spends to the pool
+                        for height in self.old_mempools.keys():
+                            old_spend_dict: Dict[
+                                bytes32, MempoolItem
+                            ] = self.old_mempools[height]
+                            await self.add_old_spends_to_pool(new_pool, old_spend_dict)
+
+                await self.initialize_pool_from_current_pools(new_pool)
+                # Items dropped from the pool of another tip might still be valid here
+                for item, _ in dropped_items:
+                    await self.add_item(item, new_pool)
 
-            await self.initialize_pool_from_current_pools(new_pool)
             await self.add_potential_spends_to_pool(new_pool)
             new_pools[new_pool.header.header_hash] = new_pool
 
-        for pool in self.mempools.values():
-            if pool.header.header_hash not in new_pools:
-                await self.add_to_old_mempool_cache(
-                    list(pool.spends.values()), pool.header
-                )
+        for header_hash, pool in self.mempools.items():
+            if header_hash not in new_pools and header_hash not in reused_pools:
+                for item in pool.spends.values():
+                    self.dereference_item(item)
+                    dropped_items.append((item, pool.header))
 
         self.mempools = new_pools
+        if len(new_tips) > 0:
+            await self.fee_estimator.new_height(max(tip.height for tip in new_tips))
+        self.templates = {
+            header_hash: template
+            for header_hash, template in self.templates.items()
+            if header_hash in new_pools
+        }
+
+        dropped_by_tip: Dict[bytes32, List[MempoolItem]] = {}
+        tip_headers: Dict[bytes32, Header] = {}
+        for item, header in dropped_items:
+            dropped_by_tip.setdefault(header.header_hash, []).append(item)
+            tip_headers[header.header_hash] = header
+        for header_hash, items in dropped_by_tip.items():
+            await self.add_to_old_mempool_cache(items, tip_headers[header_hash])
 
     async def create_filter_for_pools(self) -> bytes:
         # Create filter for items in mempools
-        byte_array_tx: List[bytes32] = []
-        added_items: Set[bytes32] = set()
-        for mempool in self.mempools:
-            for key, item in mempool.spends.items():
-                if key in added_items:
-                    continue
-                added_items.add(key)
-                byte_array_tx.append(bytearray(item.name()))
+        byte_array_tx: List[bytes32] = [bytearray(key) for key in self.items.keys()]
 
         bip158: PyBIP158 = PyBIP158(byte_array_tx)
         encoded_filter = bytes(bip158.GetEncoded())
@@ -459,17 +698,11 @@ class MempoolManager:
         self, mempool_filter: PyBIP158
     ) -> List[MempoolItem]:
         items: List[MempoolItem] = []
-        checked_items: Set[bytes32] = set()
-
-        for _, mempool in self.mempools.items():
-            for key, item in mempool.spends.items():
-                if key in checked_items:
-                    continue
-                if mempool_filter.Match(bytearray(key)):
-                    checked_items.add(key)
-                    continue
-                checked_items.add(key)
-                items.append(item)
+
+        for key, item in self.items.items():
+            if mempool_filter.Match(bytearray(key)):
+                continue
+            items.append(item)
 
         return items
 
@@ -488,29 +721,21 @@ class MempoolManager:
                 continue
             dic_for_height[item.name] = item
 
-        # Keep only last 10 heights in cache
-        while len(dic_for_height) > 10:
-            keys = list(dic_for_height.keys())
-            lowest_h = keys[0]
-            dic_for_height.pop(lowest_h)
+        # Keep only the last heights in cache
+        while len(self.old_mempools) > self.old_mempool_heights:
+            self.old_mempools.popitem(index=0)
 
     async def initialize_pool_from_current_pools(self, pool: Mempool):
-        tried_already: Dict[bytes32, bytes32] = {}
-        current_pool: Mempool
-        for current_pool in self.mempools.values():
-            for item in current_pool.spends.values():
-                # Don't try to add same mempool item twice
-                if item.name in tried_already:
-                    continue
-                tried_already[item.name] = item.name
-                await self.add_spendbundle(item.spend_bundle, pool)
+        for item in list(self.items.values()):
+            await self.add_item(item, pool)
 
     async def add_old_spends_to_pool(
         self, pool: Mempool, old_spends: Dict[bytes32, MempoolItem]
     ):
         for old in old_spends.values():
-            await self.add_spendbundle(old.spend_bundle, pool)
+            await self.add_item(old, pool)
 
     async def add_potential_spends_to_pool(self, pool: Mempool):
-        for tx in self.potential_txs.values():
+        # Retrying a transaction can put it in the cache again
+        for tx in list(self.potential_txs.values()):
             await self.add_spendbundle(tx, pool)
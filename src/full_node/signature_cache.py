@@ -0,0 +1,99 @@
+import collections
+from typing import Dict, List, Tuple
+
+from blspy import AugSchemeMPL, G1Element, G2Element
+
+from src.types.sized_bytes import bytes32
+from src.util.hash import std_hash
+from src.util.lru_cache import LRUCache
+
+
+def pair_hash(pk: G1Element, msg: bytes) -> bytes32:
+    return std_hash(bytes(pk) + msg)
+
+
+class SignatureCache:
+    """
+    Bounded cache of aggregate signatures that have already been verified, such as the
+    signatures of spend bundles accepted into the mempool, keyed by their (pk, message)
+    pairs. When a larger aggregate signature is verified, for example the signature of a
+    block which includes these bundles, the pairings of the cached bundles do not have to be
+    computed again: their signatures are subtracted from the aggregate signature, and only
+    the remaining pairs are verified against what is left.
+    """
+
+    def __init__(self, capacity: int = 100000):
+        # Hash of the pairs of a bundle -> (pair hashes, signature)
+        self.bundles = LRUCache(capacity, self._unindex_bundle)
+        # Pair hash -> hash of the pairs of a cached bundle which contains it
+        self.bundle_for_pair: Dict[bytes32, bytes32] = {}
+
+    @staticmethod
+    def _bundle_key(pair_hashes: Tuple[bytes32, ...]) -> bytes32:
+        return std_hash(b"".join(pair_hashes))
+
+    def _unindex_bundle(
+        self, key: bytes32, value: Tuple[Tuple[bytes32, ...], G2Element]
+    ) -> None:
+        for h in value[0]:
+            if self.bundle_for_pair.get(h) == key:
+                del self.bundle_for_pair[h]
+
+    def add(
+        self, pks: List[G1Element], msgs: List[bytes], signature: G2Element
+    ) -> None:
+        """ Caches a signature, which must already have been verified for these pairs. """
+        pair_hashes = tuple(pair_hash(pk, m) for pk, m in zip(pks, msgs))
+        key = self._bundle_key(pair_hashes)
+        self.bundles.put(key, (pair_hashes, signature))
+        for h in pair_hashes:
+            self.bundle_for_pair[h] = key
+
+    def aggregate_verify(
+        self, pks: List[G1Element], msgs: List[bytes], signature: G2Element
+    ) -> bool:
+        """
+        Same result as AugSchemeMPL.agg_verify, but only computes the pairings of the pairs
+        which are not covered by cached bundles.
+        """
+        if len(pks) == 0:
+            return AugSchemeMPL.agg_verify(pks, msgs, signature)
+
+        pair_hashes = [pair_hash(pk, m) for pk, m in zip(pks, msgs)]
+        exact = self.bundles.get(self._bundle_key(tuple(pair_hashes)))
+        if exact is not None and exact[1] == signature:
+            return True
+
+        remaining = collections.Counter(pair_hashes)
+        cached_signatures: List[G2Element] = []
+        checked: set = set()
+        for h in pair_hashes:
+            key = self.bundle_for_pair.get(h)
+            if key is None or key in checked:
+                continue
+            checked.add(key)
+            entry = self.bundles.get(key)
+            if entry is None:
+                continue
+            bundle_pairs = collections.Counter(entry[0])
+            # A cached bundle can only be used if all of its pairs are in the aggregate
+            if any(remaining[p] < count for p, count in bundle_pairs.items()):
+                continue
+            remaining -= bundle_pairs
+            cached_signatures.append(entry[1])
+
+        if len(cached_signatures) == 0:
+            return AugSchemeMPL.agg_verify(pks, msgs, signature)
+
+        residual = signature + AugSchemeMPL.aggregate(cached_signatures).inverse()
+        if len(remaining) == 0:
+            return residual == G2Element()
+
+        remaining_pks: List[G1Element] = []
+        remaining_msgs: List[bytes] = []
+        for pk, m, h in zip(pks, msgs, pair_hashes):
+            if remaining[h] > 0:
+                remaining[h] -= 1
+                remaining_pks.append(pk)
+                remaining_msgs.append(m)
+        return AugSchemeMPL.agg_verify(remaining_pks, remaining_msgs, residual)
@@ -1,19 +1,33 @@
 import asyncio
 import concurrent
+import contextlib
 import logging
 import time
-from typing import Optional
+from typing import Dict, List, Optional, Tuple
 
 from src.full_node.blockchain import Blockchain, ReceiveBlockResult
 from src.full_node.sync_store import SyncStore
 from src.types.full_block import FullBlock
+from src.types.sized_bytes import bytes32
 from src.util.errors import ConsensusError
 from src.util.ints import uint32
 
 log = logging.getLogger(__name__)
 
+# A batch of blocks, and the results of pre-validating them
+PreValidatedBatch = Tuple[List[FullBlock], List[Tuple[bool, Optional[bytes32], bool]]]
+
 
 class SyncBlocksProcessor:
+    """
+    Adds the blocks downloaded during sync to the blockchain, in a pipeline of three stages:
+    fetch waits for the next batch of blocks to be received, pre_validate validates the
+    batch in the blockchain's pool of workers, and apply adds its blocks to the chain. The
+    batches are passed from pre_validate to apply through a bounded queue, so that the next
+    batches are fetched and pre-validated while one is applied. The database writes of
+    COMMIT_INTERVAL blocks are committed together.
+    """
+
     def __init__(
         self,
         sync_store: SyncStore,
@@ -27,22 +41,93 @@ class SyncBlocksProcessor:
         self.tip_height = tip_height
         self._shut_down = False
         self.BATCH_SIZE = 10
+        # Number of pre-validated batches which can wait to be applied
+        self.PIPELINE_DEPTH = 2
+        self.COMMIT_INTERVAL = 100
         self.SLEEP_INTERVAL = 10
         self.TOTAL_TIMEOUT = 200
+        # Stage -> (blocks, seconds spent)
+        self.stage_totals: Dict[str, Tuple[int, float]] = {
+            "fetch": (0, 0.0),
+            "pre_validate": (0, 0.0),
+            "apply": (0, 0.0),
+        }
+        self.queue: asyncio.Queue = asyncio.Queue(self.PIPELINE_DEPTH)
+        self.max_queue_depth = 0
 
     def shut_down(self):
         self._shut_down = True
 
-    async def process(self) -> None:
-        header_hashes = self.sync_store.get_potential_hashes()
+    def _add_stage_time(self, stage: str, blocks: int, start_time: float) -> None:
+        total_blocks, total_seconds = self.stage_totals[stage]
+        self.stage_totals[stage] = (
+            total_blocks + blocks,
+            total_seconds + time.time() - start_time,
+        )
+
+    def get_metrics(self) -> Dict[str, float]:
+        """
+        The blocks each stage processed per second it was busy, and the number of batches
+        waiting to be applied. The stage with the lowest throughput limits the sync.
+        """
+        metrics: Dict[str, float] = {}
+        for stage, (blocks, seconds) in self.stage_totals.items():
+            metrics[f"{stage}_blocks"] = blocks
+            metrics[f"{stage}_blocks_per_second"] = (
+                blocks / seconds if seconds > 0 else 0.0
+            )
+        metrics["queue_depth"] = self.queue.qsize()
+        metrics["max_queue_depth"] = self.max_queue_depth
+        return metrics
+
+    async def _fetch_batch(
+        self, batch_start_height: int, batch_end_height: int
+    ) -> Optional[List[FullBlock]]:
+        """
+        Waits until all the blocks of the batch are received. Returns None on shut down.
+        """
+        total_time_slept = 0
+        while True:
+            if self._shut_down:
+                return None
+            if total_time_slept > self.TOTAL_TIMEOUT:
+                raise TimeoutError("Took too long to fetch blocks")
+            awaitables = [
+                (self.sync_store.potential_blocks_received[uint32(height)]).wait()
+                for height in range(batch_start_height, batch_end_height + 1)
+            ]
+            future = asyncio.gather(*awaitables, return_exceptions=True)
+            try:
+                await asyncio.wait_for(future, timeout=self.SLEEP_INTERVAL)
+                break
+            except concurrent.futures.TimeoutError:
+                try:
+                    await future
+                except asyncio.CancelledError:
+                    pass
+                total_time_slept += self.SLEEP_INTERVAL
+                log.info(
+                    f"Did not receive desired blocks ({batch_start_height}, {batch_end_height})"
+                )
 
-        # TODO: run this in a new process so it doesn't have to share CPU time with other things
+        # We are guaranteed to have this batch (since we broke from the above loop)
+        blocks = []
+        for height in range(batch_start_height, batch_end_height + 1):
+            b: Optional[FullBlock] = self.sync_store.potential_blocks[uint32(height)]
+            assert b is not None
+            blocks.append(b)
+        return blocks
+
+    async def _pre_validate_batches(self) -> None:
+        """
+        Fetches and pre-validates the batches in order, and queues them to be applied.
+        """
+        header_hashes = self.sync_store.get_potential_hashes()
         for batch_start_height in range(
             self.fork_height + 1, self.tip_height + 1, self.BATCH_SIZE
         ):
             if self._shut_down:
                 return
-            total_time_slept = 0
             batch_end_height = min(
                 batch_start_height + self.BATCH_SIZE - 1, self.tip_height
             )
@@ -50,76 +135,107 @@ class SyncBlocksProcessor:
                 # If we have already added this block to the chain, skip it
                 if header_hashes[height] in self.blockchain.headers:
                     batch_start_height = height + 1
+            if batch_start_height > batch_end_height:
+                continue
 
-            while True:
-                if self._shut_down:
-                    return
-                if total_time_slept > self.TOTAL_TIMEOUT:
-                    raise TimeoutError("Took too long to fetch blocks")
-                awaitables = [
-                    (self.sync_store.potential_blocks_received[uint32(height)]).wait()
-                    for height in range(batch_start_height, batch_end_height + 1)
-                ]
-                future = asyncio.gather(*awaitables, return_exceptions=True)
-                try:
-                    await asyncio.wait_for(future, timeout=self.SLEEP_INTERVAL)
-                    break
-                except concurrent.futures.TimeoutError:
-                    try:
-                        await future
-                    except asyncio.CancelledError:
-                        pass
-                    total_time_slept += self.SLEEP_INTERVAL
-                    log.info(
-                        f"Did not receive desired blocks ({batch_start_height}, {batch_end_height})"
-                    )
-
-            # Verifies this batch, which we are guaranteed to have (since we broke from the above loop)
-            blocks = []
-            for height in range(batch_start_height, batch_end_height + 1):
-                b: Optional[FullBlock] = self.sync_store.potential_blocks[
-                    uint32(height)
-                ]
-                assert b is not None
-                blocks.append(b)
-
-            validation_start_time = time.time()
-
-            prevalidate_results = await self.blockchain.pre_validate_blocks_multiprocessing(
-                blocks
-            )
-
+            fetch_start_time = time.time()
+            blocks = await self._fetch_batch(batch_start_height, batch_end_height)
+            if blocks is None:
+                return
+            self._add_stage_time("fetch", len(blocks), fetch_start_time)
+
+            pre_validate_start_time = time.time()
+            results = await self.blockchain.pre_validate_blocks_multiprocessing(blocks)
+            self._add_stage_time("pre_validate", len(blocks), pre_validate_start_time)
+
+            # Waits while PIPELINE_DEPTH batches are already waiting to be applied
+            await self.queue.put((blocks, results))
+            self.max_queue_depth = max(self.max_queue_depth, self.queue.qsize())
+
+    async def _next_batch(
+        self, pre_validate_task: asyncio.Task
+    ) -> Optional[PreValidatedBatch]:
+        """
+        Returns the next pre-validated batch, or None if the pre-validation stage finished,
+        or failed, and there are no more batches.
+        """
+        get_task = asyncio.create_task(self.queue.get())
+        await asyncio.wait(
+            [get_task, pre_validate_task], return_when=asyncio.FIRST_COMPLETED
+        )
+        if get_task.done():
+            return get_task.result()
+        get_task.cancel()
+        if not self.queue.empty():
+            return self.queue.get_nowait()
+        return None
+
+    async def _apply_batch(self, batch: PreValidatedBatch) -> None:
+        blocks, prevalidate_results = batch
+        for index, block in enumerate(blocks):
             if self._shut_down:
                 return
 
-            for index, block in enumerate(blocks):
-                assert block is not None
-
-                # The block gets permanantly added to the blockchain
-                validated, pos = prevalidate_results[index]
-
-                async with self.blockchain.lock:
-                    (
-                        result,
-                        header_block,
-                        error_code,
-                    ) = await self.blockchain.receive_block(
-                        block, validated, pos, sync_mode=True
-                    )
-                    if (
-                        result == ReceiveBlockResult.INVALID_BLOCK
-                        or result == ReceiveBlockResult.DISCONNECTED_BLOCK
-                    ):
-                        if error_code is not None:
-                            raise ConsensusError(error_code, block.header_hash)
-                        raise RuntimeError(f"Invalid block {block.header_hash}")
-                assert (
-                    max([h.height for h in self.blockchain.get_current_tips()])
-                    >= block.height
+            # The block gets permanantly added to the blockchain
+            validated, pos, signature_validated = prevalidate_results[index]
+
+            async with self.blockchain.lock:
+                (
+                    result,
+                    header_block,
+                    error_code,
+                ) = await self.blockchain.receive_block(
+                    block,
+                    validated,
+                    pos,
+                    sync_mode=True,
+                    signature_validated=signature_validated,
                 )
-                del self.sync_store.potential_blocks[block.height]
-
-            log.info(
-                f"Took {time.time() - validation_start_time} seconds to validate and add blocks "
-                f"{batch_start_height} to {batch_end_height + 1}."
+                if (
+                    result == ReceiveBlockResult.INVALID_BLOCK
+                    or result == ReceiveBlockResult.DISCONNECTED_BLOCK
+                ):
+                    if error_code is not None:
+                        raise ConsensusError(error_code, block.header_hash)
+                    raise RuntimeError(f"Invalid block {block.header_hash}")
+            assert (
+                max([h.height for h in self.blockchain.get_current_tips()])
+                >= block.height
             )
+            del self.sync_store.potential_blocks[block.height]
+
+    async def process(self) -> None:
+        # Pre-validation runs in the process pool of the blockchain, while the blocks it has
+        # finished are applied here. Applying stays in this process, since it updates the
+        # in memory chain state and the database, one block at a time.
+        pre_validate_task = asyncio.create_task(self._pre_validate_batches())
+        uncommitted_blocks = 0
+        try:
+            while True:
+                batch = await self._next_batch(pre_validate_task)
+                if batch is None or self._shut_down:
+                    break
+                blocks = batch[0]
+                apply_start_time = time.time()
+                # Blocks are written without committing, so that COMMIT_INTERVAL blocks are
+                # written in a single transaction
+                await self._apply_batch(batch)
+                uncommitted_blocks += len(blocks)
+                if uncommitted_blocks >= self.COMMIT_INTERVAL:
+                    await self.blockchain.commit()
+                    uncommitted_blocks = 0
+                self._add_stage_time("apply", len(blocks), apply_start_time)
+
+                log.info(
+                    f"Took {time.time() - apply_start_time} seconds to add blocks "
+                    f"{blocks[0].height} to {blocks[-1].height + 1}. Sync metrics: "
+                    f"{self.get_metrics()}"
+                )
+            # Raises the error of the pre-validation stage, if there was one
+            await pre_validate_task
+        finally:
+            pre_validate_task.cancel()
+            # An error of the pre-validation stage was already raised above
+            with contextlib.suppress(asyncio.CancelledError, Exception):
+                await pre_validate_task
+            await self.blockchain.commit()
@@ -0,0 +1,97 @@
+import time
+from typing import Any, Dict, List, Set, Tuple
+
+from src.types.sized_bytes import bytes32
+from src.util.ints import uint64
+from src.util.lru_cache import FIFOCache
+
+# (transaction_id, cost, fees) of a transaction, as announced to peers
+InventoryEntry = Tuple[bytes32, uint64, uint64]
+
+# Number of transaction ids remembered for each peer
+KNOWN_CAPACITY = 50000
+# Maximum number of transactions announced or requested in one message
+MAX_INVENTORY_PER_MESSAGE = 1000
+# Seconds before a transaction which was requested from a peer can be requested from another
+REQUEST_TIMEOUT = 10
+
+
+class TransactionInventory:
+    """
+    Tracks the transactions which are announced to full node peers and requested from them.
+    New transactions are queued, and announced to all the peers in batches every trickle
+    interval. Each peer only gets the ids it did not already announce to us, or get from us.
+    Transactions announced by several peers are only requested from the first one, unless it
+    does not send them in time. Peers are identified by their peer name.
+    """
+
+    def __init__(self, known_capacity: int = KNOWN_CAPACITY):
+        self.known_capacity = known_capacity
+        # Transaction ids each peer knows about
+        self.known: Dict[Any, FIFOCache] = {}
+        # Transactions which were added since the last announcement
+        self.queue: Dict[bytes32, InventoryEntry] = {}
+        # Transaction ids we requested, and when
+        self.requested = FIFOCache(known_capacity)
+
+    def _known_for_peer(self, peer: Any) -> FIFOCache:
+        known = self.known.get(peer)
+        if known is None:
+            known = FIFOCache(self.known_capacity)
+            self.known[peer] = known
+        return known
+
+    def mark_known(self, peer: Any, transaction_ids: List[bytes32]) -> None:
+        known = self._known_for_peer(peer)
+        for transaction_id in transaction_ids:
+            known.put(transaction_id, True)
+
+    def add_transaction(self, transaction_id: bytes32, cost: uint64, fees: uint64):
+        """ Queues a transaction which was added to the mempool, to be announced. """
+        self.queue[transaction_id] = (transaction_id, cost, fees)
+
+    def pop_announcements(
+        self, peers: List[Any]
+    ) -> Dict[Any, List[List[InventoryEntry]]]:
+        """
+        Returns the batches of queued transactions to announce to each of the peers, and
+        clears the queue. Peers which are not in the list are forgotten.
+        """
+        entries = list(self.queue.values())
+        self.queue = {}
+        self.known = {peer: self._known_for_peer(peer) for peer in peers}
+
+        announcements: Dict[Any, List[List[InventoryEntry]]] = {}
+        for peer in peers:
+            known = self.known[peer]
+            new_entries: List[InventoryEntry] = []
+            for entry in entries:
+                if entry[0] not in known:
+                    known.put(entry[0], True)
+                    new_entries.append(entry)
+            if len(new_entries) > 0:
+                announcements[peer] = [
+                    new_entries[i : i + MAX_INVENTORY_PER_MESSAGE]
+                    for i in range(0, len(new_entries), MAX_INVENTORY_PER_MESSAGE)
+                ]
+        return announcements
+
+    def to_request(self, transaction_ids: List[bytes32]) -> List[bytes32]:
+        """
+        Returns the ids which were not requested from another peer recently, and marks them
+        as requested.
+        """
+        now = time.time()
+        result: List[bytes32] = []
+        seen: Set[bytes32] = set()
+        for transaction_id in transaction_ids:
+            if transaction_id in seen:
+                continue
+            seen.add(transaction_id)
+            requested_time = self.requested.get(transaction_id)
+            if requested_time is not None and now - requested_time < REQUEST_TIMEOUT:
+                continue
+            self.requested.remove(transaction_id)
+            self.requested.put(transaction_id, now)
+            result.append(transaction_id)
+        return result
@@ -1,5 +1,5 @@
 from dataclasses import dataclass
-from typing import List
+from typing import List, Tuple
 
 from src.types.full_block import FullBlock
 from src.types.spend_bundle import SpendBundle
@@ -55,6 +55,19 @@ class RejectTransactionRequest:
     transaction_id: bytes32
 
 
+@dataclass(frozen=True)
+@cbor_message
+class NewTransactions:
+    # (transaction_id, cost, fees) of each transaction
+    transactions: List[Tuple[bytes32, uint64, uint64]]
+
+
+@dataclass(frozen=True)
+@cbor_message
+class RequestTransactions:
+    transaction_ids: List[bytes32]
+
+
 @dataclass(frozen=True)
 @cbor_message
 class NewProofOfTime:
@@ -0,0 +1,94 @@
+from typing import List, Tuple, Type
+
+from src.protocols import (
+    farmer_protocol,
+    full_node_protocol,
+    harvester_protocol,
+    introducer_protocol,
+    shared_protocol,
+    timelord_protocol,
+    wallet_protocol,
+)
+
+"""
+Messages which can be sent with binary framing, as a message type id followed by the streamable
+serialization of the message data. The id of each message is its index in this list, plus one,
+since id 0 means that the message is CBOR encoded. Only ever append to this list: peers advertise
+how many of these types they know in their HandshakeAck, and both must agree on the ids.
+
+Messages which are not in this list, such as the handshake, or whose data can't be streamed,
+such as TransactionAck (which has an IntEnum), are always sent as CBOR.
+"""
+
+MESSAGE_TYPES: List[Tuple[str, Type]] = [
+    ("ping", shared_protocol.Ping),
+    ("pong", shared_protocol.Pong),
+    ("new_tip", full_node_protocol.NewTip),
+    ("removing_tip", full_node_protocol.RemovingTip),
+    ("new_transaction", full_node_protocol.NewTransaction),
+    ("request_transaction", full_node_protocol.RequestTransaction),
+    ("respond_transaction", full_node_protocol.RespondTransaction),
+    ("reject_transaction_request", full_node_protocol.RejectTransactionRequest),
+    ("new_transactions", full_node_protocol.NewTransactions),
+    ("request_transactions", full_node_protocol.RequestTransactions),
+    ("new_proof_of_time", full_node_protocol.NewProofOfTime),
+    ("request_proof_of_time", full_node_protocol.RequestProofOfTime),
+    ("respond_proof_of_time", full_node_protocol.RespondProofOfTime),
+    ("reject_proof_of_time_request", full_node_protocol.RejectProofOfTimeRequest),
+    ("new_unfinished_block", full_node_protocol.NewUnfinishedBlock),
+    ("request_unfinished_block", full_node_protocol.RequestUnfinishedBlock),
+    ("respond_unfinished_block", full_node_protocol.RespondUnfinishedBlock),
+    (
+        "reject_unfinished_block_request",
+        full_node_protocol.RejectUnfinishedBlockRequest,
+    ),
+    ("request_block", full_node_protocol.RequestBlock),
+    ("respond_block", full_node_protocol.RespondBlock),
+    ("reject_block_request", full_node_protocol.RejectBlockRequest),
+    ("request_all_header_hashes", full_node_protocol.RequestAllHeaderHashes),
+    ("all_header_hashes", full_node_protocol.AllHeaderHashes),
+    ("request_header_block", full_node_protocol.RequestHeaderBlock),
+    ("respond_header_block", full_node_protocol.RespondHeaderBlock),
+    ("reject_header_block_request", full_node_protocol.RejectHeaderBlockRequest),
+    ("request_mempool_transactions", full_node_protocol.RequestMempoolTransactions),
+    ("send_transaction", wallet_protocol.SendTransaction),
+    ("request_all_proof_hashes", wallet_protocol.RequestAllProofHashes),
+    ("respond_all_proof_hashes", wallet_protocol.RespondAllProofHashes),
+    ("request_all_header_hashes_after", wallet_protocol.RequestAllHeaderHashesAfter),
+    ("respond_all_header_hashes_after", wallet_protocol.RespondAllHeaderHashesAfter),
+    (
+        "reject_all_header_hashes_after_request",
+        wallet_protocol.RejectAllHeaderHashesAfterRequest,
+    ),
+    ("new_lca", wallet_protocol.NewLCA),
+    ("request_header", wallet_protocol.RequestHeader),
+    ("respond_header", wallet_protocol.RespondHeader),
+    ("reject_header_request", wallet_protocol.RejectHeaderRequest),
+    ("request_removals", wallet_protocol.RequestRemovals),
+    ("respond_removals", wallet_protocol.RespondRemovals),
+    ("reject_removals_request", wallet_protocol.RejectRemovalsRequest),
+    ("request_additions", wallet_protocol.RequestAdditions),
+    ("respond_additions", wallet_protocol.RespondAdditions),
+    ("reject_additions_request", wallet_protocol.RejectAdditionsRequest),
+    ("request_generator", wallet_protocol.RequestGenerator),
+    ("respond_generator", wallet_protocol.RespondGenerator),
+    ("reject_generator_request", wallet_protocol.RejectGeneratorRequest),
+    ("proof_of_space_finalized", farmer_protocol.ProofOfSpaceFinalized),
+    ("proof_of_space_arrived", farmer_protocol.ProofOfSpaceArrived),
+    ("request_header_hash", farmer_protocol.RequestHeaderHash),
+    ("header_hash", farmer_protocol.HeaderHash),
+    ("header_signature", farmer_protocol.HeaderSignature),
+    ("proof_of_time_rate", farmer_protocol.ProofOfTimeRate),
+    ("harvester_handshake", harvester_protocol.HarvesterHandshake),
+    ("new_challenge", harvester_protocol.NewChallenge),
+    ("challenge_response", harvester_protocol.ChallengeResponse),
+    ("request_proof_of_space", harvester_protocol.RequestProofOfSpace),
+    ("respond_proof_of_space", harvester_protocol.RespondProofOfSpace),
+    ("request_signature", harvester_protocol.RequestSignature),
+    ("respond_signature", harvester_protocol.RespondSignature),
+    ("proof_of_time_finished", timelord_protocol.ProofOfTimeFinished),
+    ("challenge_start", timelord_protocol.ChallengeStart),
+    ("proof_of_space_info", timelord_protocol.ProofOfSpaceInfo),
+    ("request_peers", introducer_protocol.RequestPeers),
+    ("respond_peers", introducer_protocol.RespondPeers),
+]
@@ -1,6 +1,6 @@
 from dataclasses import dataclass
 
-from src.server.connection import NodeType
+from src.server.outbound_message import NodeType
 from src.types.sized_bytes import bytes32
 from src.util.cbor_message import cbor_message
 from src.util.ints import uint16
@@ -25,7 +25,12 @@ class Handshake:
 @dataclass(frozen=True)
 @cbor_message
 class HandshakeAck:
-    pass
+    # Number of the message types in protocol_message_types that we can receive with binary
+    # framing. Older nodes send an empty HandshakeAck, and are only sent CBOR.
+    binary_message_types: uint16
+    # Whether we handle new_transactions and request_transactions. Older nodes are sent one
+    # new_transaction message for each transaction instead.
+    batched_transactions: bool
 
 
 @dataclass(frozen=True)
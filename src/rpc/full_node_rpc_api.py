@@ -1,4 +1,5 @@
 from src.full_node.full_node import FullNode
+import math
 from typing import Callable, List, Optional, Dict
 
 from aiohttp import web
@@ -28,6 +29,7 @@ class FullNodeRpcApi:
             "/get_network_space": self.get_network_space,
             "/get_unspent_coins": self.get_unspent_coins,
             "/get_heaviest_block_seen": self.get_heaviest_block_seen,
+            "/get_fee_estimate": self.get_fee_estimate,
         }
 
     async def _state_changed(self, change: str) -> List[str]:
@@ -371,3 +373,25 @@ class FullNodeRpcApi:
                 if pot_block.weight > max_tip.weight:
                     max_tip = pot_block.header
         return {"success": True, "tip": max_tip}
+
+    async def get_fee_estimate(self, request: Dict) -> Optional[Dict]:
+        """
+        Estimates the fee per cost which gets a transaction into a block within target_blocks,
+        and the fee for a transaction with the given cost, if any. They are None until the node
+        has seen enough transactions confirmed.
+        """
+        if "target_blocks" not in request:
+            return None
+        target_blocks = int(request["target_blocks"])
+        fee_per_cost = self.service.mempool_manager.fee_estimator.estimate_fee_per_cost(
+            target_blocks
+        )
+        fee: Optional[uint64] = None
+        if fee_per_cost is not None and "cost" in request:
+            fee = uint64(math.ceil(fee_per_cost * int(request["cost"])))
+        return {
+            "success": True,
+            "target_blocks": target_blocks,
+            "fee_per_cost": fee_per_cost,
+            "fee": fee,
+        }
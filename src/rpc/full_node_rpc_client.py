@@ -94,3 +94,12 @@ class FullNodeRpcClient(RpcClient):
     async def get_heaviest_block_seen(self) -> Header:
         response = await self.fetch("get_heaviest_block_seen", {})
         return Header.from_json_dict(response["tip"])
+
+    async def get_fee_estimate(
+        self, target_blocks: int, cost: Optional[uint64] = None
+    ) -> Dict:
+        if cost is not None:
+            d = {"target_blocks": target_blocks, "cost": cost}
+        else:
+            d = {"target_blocks": target_blocks}
+        return await self.fetch("get_fee_estimate", d)
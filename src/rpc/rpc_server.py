@@ -83,11 +83,20 @@ class RpcServer:
                 "bytes_read": con.bytes_read,
                 "bytes_written": con.bytes_written,
                 "last_message_time": con.last_message_time,
+                "send_queue": con.send_queue.get_metrics(),
             }
             for con in connections
         ]
         return {"success": True, "connections": con_info}
 
+    async def get_message_handler_metrics(self, request: Dict) -> Dict:
+        server = getattr(self.rpc_api.service, "server", None)
+        if server is None:
+            return {"success": False}
+        metrics = server.handler_scheduler.get_metrics()
+        metrics["rate_limits"] = server.rate_limiter.get_metrics()
+        return {"success": True, "metrics": metrics}
+
     async def open_connection(self, request: Dict):
         host = request["host"]
         port = request["port"]
@@ -252,6 +261,10 @@ async def start_rpc_server(
             "/get_connections",
             rpc_server._wrap_http_handler(rpc_server.get_connections),
         ),
+        aiohttp.web.post(
+            "/get_message_handler_metrics",
+            rpc_server._wrap_http_handler(rpc_server.get_message_handler_metrics),
+        ),
         aiohttp.web.post(
             "/open_connection",
             rpc_server._wrap_http_handler(rpc_server.open_connection),
@@ -2,12 +2,13 @@ import logging
 import random
 import time
 import asyncio
-from typing import Any, AsyncGenerator, Callable, Dict, List, Optional
+from typing import Any, AsyncGenerator, Callable, Dict, List, Optional, Union
 
 from src.server.outbound_message import Message, NodeType, OutboundMessage
+from src.server.send_queue import SendQueue
 from src.types.peer_info import PeerInfo
 from src.types.sized_bytes import bytes32
-from src.util import cbor
+from src.util import binary_message, cbor
 from src.util.ints import uint16, uint64
 
 # Each message is prepended with LENGTH_BYTES bytes specifying the length
@@ -17,6 +18,28 @@ log = logging.getLogger(__name__)
 OnConnectFunc = Optional[Callable[[], AsyncGenerator[OutboundMessage, None]]]
 
 
+class EncodedMessage:
+    """
+    A message which is sent to many peers, such as a broadcast. It is framed once for each
+    framing used by the peers (CBOR, or binary with a number of message types), and the
+    resulting bytes are shared by all the connections that use that framing.
+    """
+
+    def __init__(self, message: Message):
+        self.message = message
+        self.function = message.function
+        # Peer binary message types -> length prefixed bytes
+        self._framed: Dict[int, bytes] = {}
+
+    def framed_for(self, connection: "ChiaConnection") -> bytes:
+        key = connection.peer_binary_message_types
+        framed = self._framed.get(key)
+        if framed is None:
+            framed = connection.frame(self.message)
+            self._framed[key] = framed
+        return framed
+
+
 class ChiaConnection:
     """
     Represents a connection to another node. Local host and port are ours, while peer host and
@@ -47,6 +70,15 @@ class ChiaConnection:
         self.node_id = None
         self.on_connect = on_connect
         self.log = log
+        # Number of binary message types the peer advertised in its HandshakeAck. Messages are
+        # CBOR framed while this is 0, which is always the case for older peers.
+        self.peer_binary_message_types: int = 0
+        # Whether the peer advertised new_transactions and request_transactions in its
+        # HandshakeAck
+        self.peer_batched_transactions: bool = False
+        # Outbound messages, written one at a time by the writer task
+        self.send_queue = SendQueue()
+        self.writer_task: Optional[asyncio.Task] = None
 
         # ChiaConnection metrics
         self.creation_time = time.time()
@@ -72,16 +104,31 @@ class ChiaConnection:
     def is_closing(self) -> bool:
         return self.writer.is_closing()
 
-    async def send(self, message: Message):
-        encoded: bytes = cbor.dumps({"f": message.function, "d": message.data})
+    def encode(self, message: Message) -> bytes:
+        if self.peer_binary_message_types > 0:
+            return binary_message.dumps(message, self.peer_binary_message_types)
+        return cbor.dumps({"f": message.function, "d": message.data})
+
+    def frame(self, message: Message) -> bytes:
+        """
+        The bytes of the message on the wire, prefixed with their length.
+        """
+        encoded: bytes = self.encode(message)
         assert len(encoded) < (2 ** (LENGTH_BYTES * 8))
-        self.writer.write(len(encoded).to_bytes(LENGTH_BYTES, "big") + encoded)
+        return len(encoded).to_bytes(LENGTH_BYTES, "big") + encoded
+
+    async def send(self, message: Union[Message, EncodedMessage]):
+        if isinstance(message, EncodedMessage):
+            framed = message.framed_for(self)
+        else:
+            framed = self.frame(message)
+        self.writer.write(framed)
         try:
             # Need timeout here in case connection is closed, this allows GC to clean up
             await asyncio.wait_for(self.writer.drain(), timeout=10 * 60)
         except asyncio.TimeoutError:
             raise TimeoutError("self.writer.drain()")
-        self.bytes_written += LENGTH_BYTES + len(encoded)
+        self.bytes_written += len(framed)
 
     async def read_one_message(self) -> Message:
         size: bytes = b""
@@ -104,13 +151,17 @@ class ChiaConnection:
         except asyncio.TimeoutError:
             raise TimeoutError("self.reader.readexactly(full_message_length)")
 
-        full_message_loaded: Any = cbor.loads(full_message)
         self.bytes_read += LENGTH_BYTES + full_message_length
         self.last_message_time = time.time()
+        if self.peer_binary_message_types > 0:
+            return binary_message.loads(full_message)
+        full_message_loaded: Any = cbor.loads(full_message)
         return Message(full_message_loaded["f"], full_message_loaded["d"])
 
     def close(self):
         # Closes the connection. This should only be called by PeerConnections class.
+        if self.writer_task is not None:
+            self.writer_task.cancel()
         self.writer.close()
 
     def __str__(self) -> str:
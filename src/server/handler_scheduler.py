@@ -0,0 +1,206 @@
+import asyncio
+import time
+from typing import Any, Dict, List, Optional
+
+# Queries which only look things up, and are handled without waiting behind the expensive
+# handlers, such as respond_block, which takes the blockchain lock and validates
+CHEAP_FUNCTIONS = {
+    "ping",
+    "pong",
+    "new_tip",
+    "removing_tip",
+    "request_peers",
+    "respond_peers",
+    "request_block",
+    "request_header",
+    "request_header_block",
+    "request_unfinished_block",
+    "request_proof_of_time",
+    "request_transaction",
+    "request_transactions",
+    "request_generator",
+}
+
+# Messages of a peer which are handled one at a time, in the order they were received. The
+# handlers of these must not wait for later messages from the same peer.
+ORDERED_FUNCTIONS = {
+    "new_tip",
+    "removing_tip",
+    "respond_transaction",
+}
+
+# Upper bounds, in seconds, of the buckets of the handler latency histograms
+LATENCY_BUCKETS: List[float] = [0.001, 0.01, 0.1, 1, 10, 60, float("inf")]
+
+
+class LatencyHistogram:
+    def __init__(self):
+        self.counts: List[int] = [0 for _ in LATENCY_BUCKETS]
+        self.total_seconds = 0.0
+
+    def add(self, seconds: float) -> None:
+        for index, upper_bound in enumerate(LATENCY_BUCKETS):
+            if seconds <= upper_bound:
+                self.counts[index] += 1
+                break
+        self.total_seconds += seconds
+
+    def to_json_dict(self) -> Dict[str, Any]:
+        count = sum(self.counts)
+        return {
+            "count": count,
+            "mean_seconds": self.total_seconds / count if count > 0 else 0.0,
+            "buckets": {
+                f"<={upper_bound}": bucket_count
+                for upper_bound, bucket_count in zip(LATENCY_BUCKETS, self.counts)
+            },
+        }
+
+
+class PeerHandlers:
+    """
+    The handler limits of one peer.
+    """
+
+    def __init__(self, max_pending: int, max_handlers: int):
+        # Messages read but not handled yet. The peer is not read while this is exhausted.
+        self.pending = asyncio.Semaphore(max_pending)
+        self.handler_slots = asyncio.Semaphore(max_handlers)
+        # Set when the last ordered message that was received has been handled
+        self.last_ordered: Optional[asyncio.Event] = None
+
+
+class HandlerTicket:
+    """
+    Admission of one message to be handled. Used as an async context manager around the
+    handler, which waits for the previous ordered message of the peer and for a free slot.
+    """
+
+    def __init__(
+        self,
+        scheduler: "HandlerScheduler",
+        peer: PeerHandlers,
+        function: str,
+        previous: Optional[asyncio.Event],
+        done: Optional[asyncio.Event],
+    ):
+        self.scheduler = scheduler
+        self.peer = peer
+        self.function = function
+        self.previous = previous
+        self.done = done
+        self.cheap = function in CHEAP_FUNCTIONS
+        self.admitted_time = time.time()
+        self.acquired: List[asyncio.Semaphore] = []
+        self.running = False
+        self.released = False
+
+    async def __aenter__(self) -> "HandlerTicket":
+        try:
+            if self.previous is not None:
+                await self.previous.wait()
+            if self.cheap:
+                slots = [self.scheduler.cheap_slots]
+            else:
+                # Always in this order, so that two handlers never wait for each other's slots
+                slots = [self.peer.handler_slots, self.scheduler.handler_slots]
+            for semaphore in slots:
+                await semaphore.acquire()
+                self.acquired.append(semaphore)
+        except BaseException:
+            # __aexit__ is not called when __aenter__ raises, for example when cancelled
+            await self.__aexit__(None, None, None)
+            raise
+        self.running = True
+        self.scheduler.in_flight += 1
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        if self.running:
+            self.running = False
+            self.scheduler.in_flight -= 1
+        for semaphore in self.acquired:
+            semaphore.release()
+        self.acquired = []
+        self.release()
+
+    def release(self) -> None:
+        """
+        Marks the message as handled. Also used for messages that are never handled.
+        """
+        if self.released:
+            return
+        self.released = True
+        if self.done is not None:
+            self.done.set()
+        self.peer.pending.release()
+        self.scheduler.record_latency(self.function, time.time() - self.admitted_time)
+
+
+class HandlerScheduler:
+    """
+    Limits the API handlers that run at the same time, so that peers can't create unbounded
+    concurrency. Expensive handlers are limited to max_handlers in total, and to
+    max_handlers_per_peer for each peer. Cheap queries (CHEAP_FUNCTIONS) have their own
+    max_cheap_handlers slots, so they are not queued behind expensive handlers. A peer can
+    have max_pending_per_peer messages that are waiting or being handled, after which it is
+    not read until one of them is done. The messages in ORDERED_FUNCTIONS are handled one at
+    a time for each peer, in the order they were received.
+
+    The latency of each message, from being read to being handled, is recorded in a histogram
+    for its message type.
+    """
+
+    def __init__(
+        self,
+        max_handlers: int = 100,
+        max_cheap_handlers: int = 100,
+        max_handlers_per_peer: int = 10,
+        max_pending_per_peer: int = 100,
+    ):
+        self.max_handlers_per_peer = max_handlers_per_peer
+        self.max_pending_per_peer = max_pending_per_peer
+        self.handler_slots = asyncio.Semaphore(max_handlers)
+        self.cheap_slots = asyncio.Semaphore(max_cheap_handlers)
+        # Connection -> handler limits of that peer
+        self.peers: Dict[Any, PeerHandlers] = {}
+        self.in_flight = 0
+        self.latencies: Dict[str, LatencyHistogram] = {}
+
+    async def admit(self, connection: Any, function: str) -> HandlerTicket:
+        """
+        Waits until the peer can have another message pending, and admits the message.
+        Called in the order the messages of the peer are received.
+        """
+        peer = self.peers.get(connection)
+        if peer is None:
+            peer = PeerHandlers(self.max_pending_per_peer, self.max_handlers_per_peer)
+            self.peers[connection] = peer
+        await peer.pending.acquire()
+        previous: Optional[asyncio.Event] = None
+        done: Optional[asyncio.Event] = None
+        if function in ORDERED_FUNCTIONS:
+            previous = peer.last_ordered
+            done = asyncio.Event()
+            peer.last_ordered = done
+        return HandlerTicket(self, peer, function, previous, done)
+
+    def remove_peer(self, connection: Any) -> None:
+        self.peers.pop(connection, None)
+
+    def record_latency(self, function: str, seconds: float) -> None:
+        histogram = self.latencies.get(function)
+        if histogram is None:
+            histogram = LatencyHistogram()
+            self.latencies[function] = histogram
+        histogram.add(seconds)
+
+    def get_metrics(self) -> Dict[str, Any]:
+        return {
+            "in_flight": self.in_flight,
+            "peers": len(self.peers),
+            "latencies": {
+                function: histogram.to_json_dict()
+                for function, histogram in self.latencies.items()
+            },
+        }
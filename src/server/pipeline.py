@@ -3,7 +3,7 @@ import concurrent
 import logging
 import random
 import ssl
-from typing import Any, AsyncGenerator, List, Optional, Tuple
+from typing import Any, AsyncGenerator, List, Optional, Tuple, Union
 
 from aiter import aiter_forker, iter_to_aiter, join_aiters, map_aiter, push_aiter
 
@@ -14,7 +14,15 @@ from src.protocols.shared_protocol import (
     Pong,
     protocol_version,
 )
-from src.server.connection import ChiaConnection, OnConnectFunc, PeerConnections
+from src.protocols.protocol_message_types import MESSAGE_TYPES
+from src.server.handler_scheduler import HandlerScheduler, HandlerTicket
+from src.server.rate_limits import RateLimiter
+from src.server.connection import (
+    ChiaConnection,
+    EncodedMessage,
+    OnConnectFunc,
+    PeerConnections,
+)
 from src.server.outbound_message import Delivery, Message, NodeType, OutboundMessage
 from src.types.sized_bytes import bytes32
 from src.util import partial_func
@@ -33,6 +41,8 @@ async def initialize_pipeline(
     node_id: bytes32,
     network_id: bytes32,
     log: logging.Logger,
+    handler_scheduler: HandlerScheduler,
+    rate_limiter: RateLimiter,
 ):
     """
     A pipeline that starts with (StreamReader, StreamWriter), maps it though to
@@ -72,12 +82,20 @@ async def initialize_pipeline(
     handshake_finished_1 = forker
     handshake_finished_2 = forker.fork(is_active=True)
 
-    # Reads messages one at a time from the TCP connection
+    # Reads messages one at a time from the TCP connection, while the rate limiter and the
+    # handler scheduler admit them
     messages_aiter = join_aiters(
-        map_aiter(connection_to_message, handshake_finished_1, 100)
+        map_aiter(
+            partial_func.partial_async_gen(
+                connection_to_message, handler_scheduler, rate_limiter
+            ),
+            handshake_finished_1,
+            100,
+        )
     )
 
-    # Handles each message one at a time, and yields responses to send back or broadcast
+    # Handles each message when the handler scheduler lets it run, and yields responses to
+    # send back or broadcast
     responses_aiter = join_aiters(
         map_aiter(
             partial_func.partial_async_gen(handle_message, api), messages_aiter, 100,
@@ -107,17 +125,21 @@ async def initialize_pipeline(
         map_aiter(expand_outbound_messages, responses_aiter, 100)
     )
 
-    async def send(connection: ChiaConnection, message: Message):
-        try:
-            await connection.send(message)
-        except Exception as e:
-            connection.log.warning(
-                f"Cannot write to {connection}, already closed. Error {e}."
-            )
-            global_connections.close(connection, True)
+    async def write_messages(connection: ChiaConnection):
+        # Writes the queued messages of one connection in order, until it is closed
+        while True:
+            message = await connection.send_queue.get()
+            try:
+                await connection.send(message)
+            except Exception as e:
+                connection.log.warning(
+                    f"Cannot write to {connection}, already closed. Error {e}."
+                )
+                global_connections.close(connection)
+                return
 
-    # This will run forever. Sends each message through the TCP connection, using the
-    # length encoding and CBOR serialization
+    # This will run forever. Queues each message to be sent through the TCP connection, using
+    # the length encoding and CBOR or binary serialization
     async for connection, message in expanded_messages_aiter:
         if connection is None:
             continue
@@ -130,10 +152,23 @@ async def initialize_pipeline(
                 f"Closing, so will not send {message.function} to peer {connection.get_peername()}"
             )
             continue
+        if connection.send_queue.is_stalled():
+            # Does not ban the peer, which might just be slow
+            connection.log.warning(
+                f"Peer {connection.get_peername()} is not reading messages, closing connection."
+            )
+            global_connections.close(connection, True)
+            continue
+        if not connection.send_queue.put(message):
+            connection.log.warning(
+                f"Send queue full, dropping {message.function} to peer {connection.get_peername()}"
+            )
+            continue
         connection.log.info(
             f"-> {message.function} to peer {connection.get_peername()}"
         )
-        asyncio.create_task(send(connection, message))
+        if connection.writer_task is None:
+            connection.writer_task = asyncio.create_task(write_messages(connection))
 
 
 async def stream_reader_writer_to_connection(
@@ -205,14 +240,25 @@ async def perform_handshake(
         if not global_connections.add(connection):
             raise ProtocolError(Err.DUPLICATE_CONNECTION, [False])
 
-        # Send Ack message
-        await connection.send(Message("handshake_ack", HandshakeAck()))
+        # Send Ack message, advertising binary framing and batched transactions
+        await connection.send(
+            Message("handshake_ack", HandshakeAck(uint16(len(MESSAGE_TYPES)), True))
+        )
 
         # Read Ack message
         full_message = await connection.read_one_message()
         if full_message.function != "handshake_ack":
             raise ProtocolError(Err.INVALID_ACK)
 
+        # Both sides switch to binary framing after reading the other's ack, so all the
+        # messages after the acks are binary framed, if both peers support it
+        connection.peer_binary_message_types = int(
+            uint16(full_message.data.get("binary_message_types", 0))
+        )
+        connection.peer_batched_transactions = bool(
+            full_message.data.get("batched_transactions", False)
+        )
+
         if inbound_handshake.version != protocol_version:
             raise ProtocolError(
                 Err.INCOMPATIBLE_PROTOCOL_VERSION,
@@ -238,19 +284,45 @@ async def perform_handshake(
 
 async def connection_to_message(
     pair: Tuple[ChiaConnection, PeerConnections],
-) -> AsyncGenerator[Tuple[ChiaConnection, Message, PeerConnections], None]:
+    handler_scheduler: HandlerScheduler,
+    rate_limiter: RateLimiter,
+) -> AsyncGenerator[
+    Tuple[ChiaConnection, Message, HandlerTicket, PeerConnections], None
+]:
     """
     Async generator which yields complete binary messages from connections,
-    along with a streamwriter to send back responses. On EOF received, the connection
-    is removed from the global list.
+    along with a streamwriter to send back responses, and the admission of the message
+    by the handler scheduler. On EOF received, the connection is removed from the global list.
     """
     connection, global_connections = pair
 
     try:
         while not connection.reader.at_eof():
             message = await connection.read_one_message()
+            if not isinstance(message.function, str):
+                raise ProtocolError(Err.INVALID_PROTOCOL_MESSAGE, [message.function])
+            delay = rate_limiter.process_message(
+                connection, connection.connection_type, message.function
+            )
+            if delay is None:
+                connection.log.warning(
+                    f"Peer {connection.get_peername()} is over the rate limits with "
+                    f"{message.function}, closing connection."
+                )
+                global_connections.close(connection)
+                return
+            if delay > 0:
+                # Throttles the peer, by not reading its next messages for a while
+                connection.log.info(
+                    f"Peer {connection.get_peername()} is over the rate limits with "
+                    f"{message.function}, throttling for {delay:.2f} seconds."
+                )
+                await asyncio.sleep(delay)
+            # Waits while the peer has too many messages that are not handled yet, so that
+            # the peer is not read any further
+            ticket = await handler_scheduler.admit(connection, message.function)
             # Read one message at a time, forever
-            yield (connection, message, global_connections)
+            yield (connection, message, ticket, global_connections)
     except asyncio.IncompleteReadError:
         connection.log.info(
             f"Received EOF from {connection.get_peername()}, closing connection."
@@ -267,6 +339,10 @@ async def connection_to_message(
         connection.log.warning(
             f"SSLError {e} in connection with peer {connection.get_peername()}."
         )
+    except ProtocolError as e:
+        connection.log.warning(
+            f"Invalid message {e.errors} from peer {connection.get_peername()}, closing connection."
+        )
     except (
         concurrent.futures._base.CancelledError,
         OSError,
@@ -279,59 +355,72 @@ async def connection_to_message(
             f"Timeout/OSError {e} in connection with peer {connection.get_peername()}, closing connection."
         )
     finally:
+        handler_scheduler.remove_peer(connection)
+        rate_limiter.remove_peer(connection)
         # Removes the connection from the global list, so we don't try to send things to it
         global_connections.close(connection, True)
 
 
 async def handle_message(
-    triple: Tuple[ChiaConnection, Message, PeerConnections], api: Any
+    quad: Tuple[ChiaConnection, Message, HandlerTicket, PeerConnections], api: Any
 ) -> AsyncGenerator[Tuple[ChiaConnection, OutboundMessage, PeerConnections], None]:
     """
     Async generator which takes messages, parses, them, executes the right
     api function, and yields responses (to same connection, propagated, etc).
+    The handler runs when the ticket of the message lets it.
     """
-    connection, full_message, global_connections = triple
+    connection, full_message, ticket, global_connections = quad
 
     try:
-        if len(full_message.function) == 0 or full_message.function.startswith("_"):
-            # This prevents remote calling of private methods that start with "_"
-            raise ProtocolError(Err.INVALID_PROTOCOL_MESSAGE, [full_message.function])
+        async with ticket:
+            if len(full_message.function) == 0 or full_message.function.startswith(
+                "_"
+            ):
+                # This prevents remote calling of private methods that start with "_"
+                raise ProtocolError(
+                    Err.INVALID_PROTOCOL_MESSAGE, [full_message.function]
+                )
 
-        connection.log.info(
-            f"<- {full_message.function} from peer {connection.get_peername()}"
-        )
-        if full_message.function == "ping":
-            ping_msg = Ping(full_message.data["nonce"])
-            assert connection.connection_type
-            outbound_message = OutboundMessage(
-                connection.connection_type,
-                Message("pong", Pong(ping_msg.nonce)),
-                Delivery.RESPOND,
+            connection.log.info(
+                f"<- {full_message.function} from peer {connection.get_peername()}"
             )
-            yield connection, outbound_message, global_connections
-            return
-        elif full_message.function == "pong":
-            return
+            if full_message.function == "ping":
+                if isinstance(full_message.data, Ping):
+                    ping_msg = full_message.data
+                else:
+                    ping_msg = Ping(full_message.data["nonce"])
+                assert connection.connection_type
+                outbound_message = OutboundMessage(
+                    connection.connection_type,
+                    Message("pong", Pong(ping_msg.nonce)),
+                    Delivery.RESPOND,
+                )
+                yield connection, outbound_message, global_connections
+                return
+            elif full_message.function == "pong":
+                return
 
-        f_with_peer_name = getattr(api, full_message.function + "_with_peer_name", None)
+            f_with_peer_name = getattr(
+                api, full_message.function + "_with_peer_name", None
+            )
 
-        if f_with_peer_name is not None:
-            result = f_with_peer_name(full_message.data, connection.get_peername())
-        else:
-            f = getattr(api, full_message.function, None)
+            if f_with_peer_name is not None:
+                result = f_with_peer_name(full_message.data, connection.get_peername())
+            else:
+                f = getattr(api, full_message.function, None)
 
-            if f is None:
-                raise ProtocolError(
-                    Err.INVALID_PROTOCOL_MESSAGE, [full_message.function]
-                )
+                if f is None:
+                    raise ProtocolError(
+                        Err.INVALID_PROTOCOL_MESSAGE, [full_message.function]
+                    )
 
-            result = f(full_message.data)
+                result = f(full_message.data)
 
-        if isinstance(result, AsyncGenerator):
-            async for outbound_message in result:
-                yield connection, outbound_message, global_connections
-        else:
-            await result
+            if isinstance(result, AsyncGenerator):
+                async for outbound_message in result:
+                    yield connection, outbound_message, global_connections
+            else:
+                await result
     except Exception:
         tb = traceback.format_exc()
         connection.log.error(f"Error, closing connection {connection}. {tb}")
@@ -341,7 +430,9 @@ async def handle_message(
 
 async def expand_outbound_messages(
     triple: Tuple[ChiaConnection, OutboundMessage, PeerConnections]
-) -> AsyncGenerator[Tuple[ChiaConnection, Optional[Message]], None]:
+) -> AsyncGenerator[
+    Tuple[ChiaConnection, Optional[Union[Message, EncodedMessage]]], None
+]:
     """
     Expands each of the outbound messages into it's own message.
     """
@@ -367,14 +458,15 @@ async def expand_outbound_messages(
         outbound_message.delivery_method == Delivery.BROADCAST
         or outbound_message.delivery_method == Delivery.BROADCAST_TO_OTHERS
     ):
-        # Broadcast to all peers.
+        # Broadcast to all peers. The message is encoded once, and the bytes are shared
+        shared_message = EncodedMessage(outbound_message.message)
         for peer in global_connections.get_connections():
             if peer.connection_type == outbound_message.peer_type:
                 if peer == connection:
                     if outbound_message.delivery_method == Delivery.BROADCAST:
-                        yield (peer, outbound_message.message)
+                        yield (peer, shared_message)
                 else:
-                    yield (peer, outbound_message.message)
+                    yield (peer, shared_message)
 
     elif outbound_message.delivery_method == Delivery.SPECIFIC:
         # Send to a specific peer, by node_id, assuming the NodeType matches.
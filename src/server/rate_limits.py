@@ -0,0 +1,169 @@
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, Optional, Tuple
+
+from src.server.outbound_message import NodeType
+
+# Key of the limit on the total cost of all the messages of a peer
+TOTAL = "total"
+
+# Messages which build large responses from the whole chain or mempool. Every other
+# message costs 1.
+MESSAGE_COSTS: Dict[str, int] = {
+    "request_all_header_hashes": 100,
+    "request_all_proof_hashes": 100,
+    "request_mempool_transactions": 100,
+    "request_all_header_hashes_after": 20,
+    "request_block": 2,
+    "request_header_block": 2,
+    "request_removals": 2,
+    "request_additions": 2,
+}
+
+
+@dataclass(frozen=True)
+class RateLimit:
+    # Tokens added to the bucket per second
+    rate: float
+    # Maximum number of tokens in the bucket, which is the largest burst
+    burst: float
+
+
+# NodeType -> (message type or TOTAL -> limit). Peers of other types, such as our own
+# farmer and timelord, are not limited.
+DEFAULT_RATE_LIMITS: Dict[NodeType, Dict[str, RateLimit]] = {
+    NodeType.FULL_NODE: {
+        TOTAL: RateLimit(200, 5000),
+        "request_all_header_hashes": RateLimit(1 / 60, 5),
+        "request_mempool_transactions": RateLimit(1 / 60, 5),
+    },
+    NodeType.WALLET: {
+        TOTAL: RateLimit(100, 2000),
+        "request_all_proof_hashes": RateLimit(1 / 60, 5),
+        "request_all_header_hashes_after": RateLimit(1, 50),
+        "request_mempool_transactions": RateLimit(1 / 60, 5),
+    },
+}
+
+
+def rate_limits_from_config(
+    config: Optional[Dict[str, Any]]
+) -> Dict[NodeType, Dict[str, RateLimit]]:
+    """
+    The default limits, updated with the ones in the rate_limits section of a service
+    config, which maps node type names to message types (or total) to [rate, burst].
+    """
+    limits = {
+        node_type: dict(node_limits)
+        for node_type, node_limits in DEFAULT_RATE_LIMITS.items()
+    }
+    if config is None:
+        return limits
+    for node_type_name, node_limits in config.items():
+        node_type = NodeType[node_type_name.upper()]
+        for function, (rate, burst) in node_limits.items():
+            limits.setdefault(node_type, {})[function] = RateLimit(
+                float(rate), float(burst)
+            )
+    return limits
+
+
+class TokenBucket:
+    def __init__(self, limit: RateLimit, now: float):
+        self.limit = limit
+        self.tokens = limit.burst
+        self.last_time = now
+
+    def take(self, cost: float, now: float) -> float:
+        """
+        Takes cost tokens, going into debt if there are not enough. Returns the seconds until
+        the debt is repaid.
+        """
+        self.tokens = min(
+            self.limit.burst, self.tokens + (now - self.last_time) * self.limit.rate
+        )
+        self.last_time = now
+        self.tokens -= cost
+        if self.tokens >= 0:
+            return 0.0
+        return -self.tokens / self.limit.rate
+
+
+class RateLimiter:
+    """
+    Limits the rate of the messages that each peer sends us, with token buckets. Each message
+    takes one token from the bucket of its message type, if that type is limited for the type
+    of the peer, and its cost (MESSAGE_COSTS) from the bucket of the total cost of the peer.
+    A peer over its limits is throttled, by not reading its next message until the buckets
+    are refilled. A peer which is throttled for more than max_throttled_seconds within
+    throttle_window seconds keeps sending more than its limits, and should be disconnected.
+    """
+
+    def __init__(
+        self,
+        config: Optional[Dict[str, Any]] = None,
+        throttle_window: float = 600,
+        max_throttled_seconds: float = 300,
+    ):
+        self.limits = rate_limits_from_config(config)
+        self.throttle_window = throttle_window
+        self.max_throttled_seconds = max_throttled_seconds
+        # Connection -> (message type or TOTAL -> bucket)
+        self.buckets: Dict[Any, Dict[str, TokenBucket]] = {}
+        # Connection -> (start of the throttle window, seconds throttled in it)
+        self.throttle_windows: Dict[Any, Tuple[float, float]] = {}
+        self.throttled = 0
+        self.disconnected = 0
+
+    def process_message(
+        self,
+        connection: Any,
+        node_type: Optional[NodeType],
+        function: str,
+        now: Optional[float] = None,
+    ) -> Optional[float]:
+        """
+        Returns the seconds to wait before reading the next message of the peer, or None if
+        the peer has been over its limits for too long and should be disconnected.
+        """
+        node_limits = self.limits.get(node_type) if node_type is not None else None
+        if not node_limits:
+            return 0.0
+        peer_buckets = self.buckets.setdefault(connection, {})
+        if now is None:
+            now = time.time()
+        delay = 0.0
+        for key, cost in (
+            (function, 1),
+            (TOTAL, MESSAGE_COSTS.get(function, 1)),
+        ):
+            limit = node_limits.get(key)
+            if limit is None:
+                continue
+            bucket = peer_buckets.get(key)
+            if bucket is None:
+                bucket = TokenBucket(limit, now)
+                peer_buckets[key] = bucket
+            delay = max(delay, bucket.take(cost, now))
+        if delay == 0:
+            return delay
+
+        window_start, throttled_seconds = self.throttle_windows.get(
+            connection, (now, 0.0)
+        )
+        if now - window_start > self.throttle_window:
+            window_start, throttled_seconds = now, 0.0
+        throttled_seconds += delay
+        if throttled_seconds > self.max_throttled_seconds:
+            self.disconnected += 1
+            return None
+        self.throttle_windows[connection] = (window_start, throttled_seconds)
+        self.throttled += 1
+        return delay
+
+    def remove_peer(self, connection: Any) -> None:
+        self.buckets.pop(connection, None)
+        self.throttle_windows.pop(connection, None)
+
+    def get_metrics(self) -> Dict[str, int]:
+        return {"throttled": self.throttled, "disconnected": self.disconnected}
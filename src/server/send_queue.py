@@ -0,0 +1,140 @@
+import asyncio
+import time
+from collections import deque
+from enum import IntEnum
+from typing import Any, Deque, Dict, List, Optional
+
+
+class MessagePriority(IntEnum):
+    # Blocks, proofs of time, and the messages of farming and timelords
+    HIGH = 0
+    # Requests and responses of headers, peers, sync, etc.
+    NORMAL = 1
+    # Transaction gossip, which can be dropped when a peer falls behind
+    LOW = 2
+
+
+HIGH_PRIORITY_FUNCTIONS = {
+    "new_tip",
+    "removing_tip",
+    "respond_block",
+    "new_unfinished_block",
+    "respond_unfinished_block",
+    "new_proof_of_time",
+    "respond_proof_of_time",
+    "new_lca",
+    "proof_of_space_finalized",
+    "proof_of_space_arrived",
+    "request_header_hash",
+    "header_hash",
+    "header_signature",
+    "proof_of_time_rate",
+    "new_challenge",
+    "challenge_response",
+    "request_proof_of_space",
+    "respond_proof_of_space",
+    "request_signature",
+    "respond_signature",
+    "proof_of_time_finished",
+    "challenge_start",
+    "proof_of_space_info",
+}
+
+LOW_PRIORITY_FUNCTIONS = {
+    "new_transaction",
+    "new_transactions",
+    "request_transaction",
+    "request_transactions",
+    "respond_transaction",
+    "reject_transaction_request",
+    "request_mempool_transactions",
+}
+
+
+def message_priority(function: str) -> MessagePriority:
+    if function in HIGH_PRIORITY_FUNCTIONS:
+        return MessagePriority.HIGH
+    if function in LOW_PRIORITY_FUNCTIONS:
+        return MessagePriority.LOW
+    return MessagePriority.NORMAL
+
+
+class SendQueue:
+    """
+    A bounded queue of the messages waiting to be written to one peer. Messages are taken in
+    order of priority, and in the order they were put within each priority. When the queue is
+    full, a new message replaces the newest queued message of a lower priority, or is dropped
+    if there is none. If the peer does not take any message for stalled_timeout seconds while
+    the queue is full, it is stalled, and should be disconnected.
+    """
+
+    def __init__(self, max_size: int = 1000, stalled_timeout: float = 60):
+        self.max_size = max_size
+        self.stalled_timeout = stalled_timeout
+        self.queues: List[Deque[Any]] = [deque() for _ in MessagePriority]
+        self.size = 0
+        self._not_empty = asyncio.Event()
+        # Time at which the queue was found full, since the last message was taken
+        self.full_since: Optional[float] = None
+        self.max_size_reached = 0
+        self.sent = 0
+        self.dropped: List[int] = [0 for _ in MessagePriority]
+
+    def put(self, message: Any) -> bool:
+        """
+        Queues a Message or EncodedMessage. Returns False if it was dropped.
+        """
+        priority = message_priority(message.function)
+        if self.size >= self.max_size:
+            if self.full_since is None:
+                self.full_since = time.time()
+            for lower in range(len(self.queues) - 1, priority, -1):
+                if self.queues[lower]:
+                    self.queues[lower].pop()
+                    self.size -= 1
+                    self.dropped[lower] += 1
+                    break
+            else:
+                self.dropped[priority] += 1
+                return False
+        self.queues[priority].append(message)
+        self.size += 1
+        self.max_size_reached = max(self.max_size_reached, self.size)
+        self._not_empty.set()
+        return True
+
+    async def get(self) -> Any:
+        """
+        Waits for and takes the queued message with the highest priority.
+        """
+        while self.size == 0:
+            self._not_empty.clear()
+            await self._not_empty.wait()
+        for queue in self.queues:
+            if queue:
+                message = queue.popleft()
+                break
+        self.size -= 1
+        self.sent += 1
+        self.full_since = None
+        return message
+
+    def is_stalled(self) -> bool:
+        return (
+            self.full_since is not None
+            and time.time() - self.full_since > self.stalled_timeout
+        )
+
+    def get_metrics(self) -> Dict[str, Any]:
+        return {
+            "queued": self.size,
+            "max_queued": self.max_size_reached,
+            "sent": self.sent,
+            "queued_by_priority": {
+                priority.name: len(self.queues[priority])
+                for priority in MessagePriority
+            },
+            "dropped_by_priority": {
+                priority.name: self.dropped[priority] for priority in MessagePriority
+            },
+        }
@@ -9,6 +9,8 @@ from aiter.server import start_server_aiter
 
 from src.protocols.shared_protocol import Ping
 from src.server.connection import OnConnectFunc, PeerConnections
+from src.server.handler_scheduler import HandlerScheduler
+from src.server.rate_limits import RateLimiter
 from src.server.outbound_message import Delivery, Message, NodeType, OutboundMessage
 from src.types.peer_info import PeerInfo
 from src.types.sized_bytes import bytes32
@@ -79,6 +81,11 @@ class ChiaServer:
         # Aiter used to broadcase messages
         self._outbound_aiter: push_aiter = push_aiter()
 
+        # Limits the message handlers that run at the same time
+        self.handler_scheduler = HandlerScheduler()
+        # Limits the rate of the messages of each peer
+        self.rate_limiter = RateLimiter(config.get("rate_limits"))
+
         # Taks list to keep references to tasks, so they don'y get GCd
         self._tasks: List[asyncio.Task] = []
         if local_type != NodeType.INTRODUCER:
@@ -108,6 +115,8 @@ class ChiaServer:
                 node_id,
                 network_id,
                 self.log,
+                self.handler_scheduler,
+                self.rate_limiter,
             )
         )
 
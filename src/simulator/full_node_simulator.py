@@ -118,6 +118,9 @@ class FullNodeSimulator(FullNode):
     @api_request
     async def farm_new_block(self, request: FarmNewBlockProtocol):
         self.log.info("Farming new block!")
+        # Transactions which were received before, but are still being validated, are
+        # included in the block
+        await self.transactions_added.wait()
         top_tip = self.get_tip()
         if top_tip is None or self.server is None:
             return
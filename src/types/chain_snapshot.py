@@ -0,0 +1,24 @@
+from dataclasses import dataclass
+from typing import List, Tuple
+
+from src.types.header import Header
+from src.types.sized_bytes import bytes32
+from src.util.streamable import Streamable, streamable
+from src.util.ints import uint32, uint64
+
+
+@dataclass(frozen=True)
+@streamable
+class ChainSnapshot(Streamable):
+    """
+    The in memory state of the Blockchain, derived from the headers table, which is
+    persisted so that it does not have to be rebuilt at startup. The headers which were
+    added after it was written are loaded from the headers table.
+    """
+
+    lca_hash: bytes32
+    tip_hashes: List[bytes32]
+    # In order of height
+    headers: List[Header]
+    # Challenge hash, number of iterations and height of each proof of time
+    proofs_of_time: List[Tuple[bytes32, uint64, uint32]]
@@ -1,5 +1,8 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field
+from typing import List
 
+from src.types.coin import Coin
+from src.types.name_puzzle_condition import NPC
 from src.types.spend_bundle import SpendBundle
 from src.types.sized_bytes import bytes32
 from src.util.ints import uint64
@@ -11,6 +14,15 @@ class MempoolItem:
     fee_per_cost: float
     fee: uint64
     cost: uint64
+    # Results of running the spend bundle, so it can be checked against other tips
+    npc_list: List[NPC]
+    additions: List[Coin]
+    removals: List[Coin]
+    # The name is the key of the item everywhere, so the bundle is only hashed once
+    _name: bytes32 = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        object.__setattr__(self, "_name", self.spend_bundle.name())
 
     def __lt__(self, other):
         # TODO test to see if it's < or >
@@ -18,4 +30,4 @@ class MempoolItem:
 
     @property
     def name(self) -> bytes32:
-        return self.spend_bundle.name()
+        return self._name
@@ -0,0 +1,78 @@
+import io
+import struct
+from typing import Any, Dict
+
+from src.protocols.protocol_message_types import MESSAGE_TYPES
+from src.server.outbound_message import Message
+from src.util import cbor
+from src.util.errors import Err, ProtocolError
+from src.util.streamable import compile_streamer, compile_view_parser
+from src.util.type_checking import construct_unchecked
+
+"""
+Binary framing of messages, for peers that advertise it in their HandshakeAck. Each message is
+a 2 byte message type id from protocol_message_types, followed by the streamable serialization
+of the message data, so that it can be parsed directly with the compiled parser of its class,
+instead of going through CBOR dicts and the strictdataclass checks. Messages which don't have
+an id, or that the peer does not know, are sent with id 0, followed by their CBOR encoding.
+"""
+
+TYPE_ID_BYTES: int = 2
+CBOR_TYPE_ID: int = 0
+
+message_type_ids: Dict[str, int] = {
+    function: index + 1 for index, (function, _) in enumerate(MESSAGE_TYPES)
+}
+
+
+def _stream_fields(cls: Any):
+    stream_fields = cls.__dict__.get("_stream_fields")
+    if stream_fields is None:
+        stream_fields = compile_streamer(cls)
+        setattr(cls, "_stream_fields", stream_fields)
+    return stream_fields
+
+
+def _parse_view_fields(cls: Any):
+    parse_view_fields = cls.__dict__.get("_parse_view_fields")
+    if parse_view_fields is None:
+        parse_view_fields = compile_view_parser(cls)
+        setattr(cls, "_parse_view_fields", parse_view_fields)
+    return parse_view_fields
+
+
+def dumps(message: Message, peer_message_types: int) -> bytes:
+    """
+    Encodes a message for a peer which knows the first peer_message_types message types.
+    """
+    type_id = message_type_ids.get(message.function, CBOR_TYPE_ID)
+    if (
+        type_id == CBOR_TYPE_ID
+        or type_id > peer_message_types
+        or type(message.data) is not MESSAGE_TYPES[type_id - 1][1]
+    ):
+        encoded = cbor.dumps({"f": message.function, "d": message.data})
+        return CBOR_TYPE_ID.to_bytes(TYPE_ID_BYTES, "big") + encoded
+    f = io.BytesIO()
+    f.write(type_id.to_bytes(TYPE_ID_BYTES, "big"))
+    _stream_fields(type(message.data))(message.data, f)
+    return f.getvalue()
+
+
+def loads(data: bytes) -> Message:
+    buf = memoryview(data)
+    type_id = int.from_bytes(buf[:TYPE_ID_BYTES], "big")
+    if type_id == CBOR_TYPE_ID:
+        loaded: Any = cbor.loads(data[TYPE_ID_BYTES:])
+        return Message(loaded["f"], loaded["d"])
+    if type_id > len(MESSAGE_TYPES):
+        raise ProtocolError(Err.INVALID_PROTOCOL_MESSAGE, [type_id])
+    function, cls = MESSAGE_TYPES[type_id - 1]
+    try:
+        values, pos = _parse_view_fields(cls)(buf, TYPE_ID_BYTES)
+    except (ValueError, struct.error, IndexError):
+        raise ProtocolError(Err.INVALID_PROTOCOL_MESSAGE, [function])
+    if pos != len(buf):
+        raise ProtocolError(Err.INVALID_PROTOCOL_MESSAGE, [function])
+    # The parsers produce values of exactly the annotated types
+    return Message(function, construct_unchecked(cls, values))
@@ -36,8 +36,9 @@ def make_sized_bytes(size):
     @classmethod  # type: ignore
     def from_bytes(cls: Any, blob: bytes) -> Any:
         # pylint: disable=no-member
-        f = io.BytesIO(blob)
-        return cls.parse(f)
+        b = memoryview(blob)[:size]
+        assert len(b) == size
+        return cls(b)
 
     def __bytes__(self: Any) -> bytes:
         f = io.BytesIO()
@@ -51,6 +52,7 @@ def make_sized_bytes(size):
         return "<%s: %s>" % (self.__class__.__name__, str(self))
 
     namespace = dict(
+        SIZE=size,
         __new__=__new__,
         parse=parse,
         stream=stream,
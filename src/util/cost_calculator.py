@@ -4,19 +4,32 @@ from src.consensus.condition_costs import ConditionCost
 from src.types.condition_opcodes import ConditionOpcode
 from src.types.program import Program
 from src.types.name_puzzle_condition import NPC
+from src.types.sized_bytes import bytes32
 from src.util.errors import Err
 from src.util.ints import uint64
-from src.util.mempool_check_conditions import get_name_puzzle_conditions
+from src.util.mempool_check_conditions import (
+    get_name_puzzle_conditions,
+    get_name_puzzle_conditions_cached,
+)
 
 
 def calculate_cost_of_program(
-    program: Program, clvm_cost_ratio_constant: int,
+    program: Program,
+    clvm_cost_ratio_constant: int,
+    generator_hash: Optional[bytes32] = None,
 ) -> Tuple[Optional[Err], List[NPC], uint64]:
     """
-    This function calculates the total cost of either block or a spendbundle
+    This function calculates the total cost of either block or a spendbundle.
+    For a block generator whose tree hash has been verified, pass it as generator_hash
+    to reuse the cached result of running it.
     """
     total_clvm_cost = 0
-    error, npc_list, cost = get_name_puzzle_conditions(program)
+    if generator_hash is not None:
+        error, npc_list, cost = get_name_puzzle_conditions_cached(
+            program, generator_hash
+        )
+    else:
+        error, npc_list, cost = get_name_puzzle_conditions(program)
     if error:
         raise Exception("get_name_puzzle_conditions raised error" + str(error))
     total_clvm_cost += cost
@@ -0,0 +1,84 @@
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterator, Optional, Tuple
+
+
+class LRUCache:
+    """
+    A dictionary bounded to a maximum number of entries. When it is full, inserting a new key
+    evicts the least recently used one, and calls on_evict with its key and value. All
+    operations are O(1). Lookups through get are counted in hits and misses, and evicted
+    entries in evictions.
+    """
+
+    def __init__(
+        self, capacity: int, on_evict: Optional[Callable[[Any, Any], None]] = None
+    ):
+        self.capacity = capacity
+        self.cache: OrderedDict = OrderedDict()
+        self.on_evict = on_evict
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _use(self, key: Any) -> None:
+        """ Marks a key as the most recently used one. """
+        self.cache.move_to_end(key)
+
+    def get(self, key: Any) -> Optional[Any]:
+        value = self.cache.get(key)
+        if value is not None:
+            self._use(key)
+            self.hits += 1
+        else:
+            self.misses += 1
+        return value
+
+    def put(self, key: Any, value: Any) -> None:
+        if key in self.cache:
+            self.cache[key] = value
+            self._use(key)
+            return
+        self.cache[key] = value
+        while len(self.cache) > self.capacity:
+            evicted_key, evicted_value = self.cache.popitem(last=False)
+            self.evictions += 1
+            if self.on_evict is not None:
+                self.on_evict(evicted_key, evicted_value)
+
+    def remove(self, key: Any) -> Optional[Any]:
+        return self.cache.pop(key, None)
+
+    def keys(self) -> Iterator[Any]:
+        """ The keys, from the first to be evicted to the last. """
+        return iter(self.cache.keys())
+
+    def values(self) -> Iterator[Any]:
+        return iter(self.cache.values())
+
+    def items(self) -> Iterator[Tuple[Any, Any]]:
+        return iter(self.cache.items())
+
+    def get_metrics(self) -> Dict[str, int]:
+        return {
+            "size": len(self.cache),
+            "capacity": self.capacity,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+    def __contains__(self, key: Any) -> bool:
+        return key in self.cache
+
+    def __len__(self) -> int:
+        return len(self.cache)
+
+
+class FIFOCache(LRUCache):
+    """
+    An LRUCache which evicts the entry that was inserted first, whether or not it was used
+    since. Putting a key which is already in the cache updates its value in place.
+    """
+
+    def _use(self, key: Any) -> None:
+        pass
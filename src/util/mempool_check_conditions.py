@@ -10,6 +10,7 @@ from src.types.sized_bytes import bytes32
 from src.util.clvm import EvalError, int_from_bytes, run_program
 from src.util.condition_tools import ConditionOpcode, conditions_dict_for_solution
 from src.util.errors import Err
+from src.util.lru_cache import LRUCache
 import time
 
 from src.util.ints import uint64
@@ -131,6 +132,37 @@ def get_name_puzzle_conditions(
     return None, npc_list, uint64(cost_sum)
 
 
+# Results of get_name_puzzle_conditions for block generators, keyed by generator tree hash
+NPC_CACHE_SIZE = 500
+npc_result_cache = LRUCache(NPC_CACHE_SIZE)
+
+
+def get_name_puzzle_conditions_cached(
+    block_program: Program, generator_hash: bytes32
+) -> Tuple[Optional[Err], List[NPC], uint64]:
+    """
+    Same as get_name_puzzle_conditions, but remembers the result for the most recent
+    generators, so a block's generator is not run again every time its additions and
+    removals are needed. generator_hash must be the tree hash of block_program, as checked
+    during block validation. The returned NPC list is shared, and must not be modified.
+    """
+    result = npc_result_cache.get(generator_hash)
+    if result is None:
+        result = get_name_puzzle_conditions(block_program)
+        npc_result_cache.put(generator_hash, result)
+    return result
+
+
+def cache_name_puzzle_conditions(
+    generator_hash: bytes32, result: Tuple[Optional[Err], List[NPC], uint64]
+) -> None:
+    """
+    Adds the result of running a block generator somewhere else, such as in a pre-validation
+    worker, to the cache. generator_hash must be the tree hash of the generator.
+    """
+    npc_result_cache.put(generator_hash, result)
+
+
 def mempool_check_conditions_dict(
     unspent: CoinRecord,
     spend_bundle: SpendBundle,
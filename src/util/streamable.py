@@ -4,8 +4,21 @@ from __future__ import annotations
 import dataclasses
 import io
 import pprint
+import struct
 from enum import Enum
-from typing import Any, BinaryIO, List, Type, get_type_hints, Dict
+from functools import partial
+from operator import attrgetter
+from typing import (
+    Any,
+    BinaryIO,
+    Callable,
+    Dict,
+    List,
+    Optional,
+    Tuple,
+    Type,
+    get_type_hints,
+)
 from src.util.byte_types import hexstr_to_bytes
 from src.types.program import Program
 from src.util.hash import std_hash
@@ -14,7 +27,9 @@ from blspy import PrivateKey, G1Element, G2Element
 
 from src.types.sized_bytes import bytes32
 from src.util.ints import uint32, uint64, int64, uint128, int512
+from src.util.struct_stream import StructStream
 from src.util.type_checking import (
+    construct_unchecked,
     is_type_List,
     is_type_Tuple,
     is_type_SpecificOptional,
@@ -35,6 +50,7 @@ unhashable_types = [
     G2Element,
     Program,
 ]
+uint32_struct = struct.Struct("!L")
 # JSON does not support big ints, so these types must be serialized differently in JSON
 big_ints = [uint64, int64, uint128, int512]
 
@@ -67,6 +83,473 @@ def dataclass_from_dict(klass, d):
         return klass(d)
 
 
+def fixed_struct_format(f_type: Type) -> Optional[str]:
+    """
+    Returns the struct format character(s) for types that always serialize to the same
+    number of bytes through a struct template (the StructStream ints and sized bytes),
+    or None for every other type.
+    """
+    if not isinstance(f_type, type):
+        return None
+    if (
+        issubclass(f_type, StructStream)
+        and f_type.parse.__func__ is StructStream.parse.__func__  # type: ignore
+    ):
+        return f_type.PACK.lstrip("!")
+    if issubclass(f_type, bytes) and isinstance(getattr(f_type, "SIZE", None), int):
+        return f"{f_type.SIZE}s"  # type: ignore
+    return None
+
+
+def fixed_struct_constructor(f_type: Type) -> Callable[[Any], Any]:
+    # Values coming out of struct.unpack already have the right range or length,
+    # so the checks in the type's __new__ can be skipped.
+    if issubclass(f_type, StructStream):
+        return partial(int.__new__, f_type)
+    return partial(bytes.__new__, f_type)
+
+
+def stream_struct_value(run_struct: struct.Struct, value: Any, f: BinaryIO) -> None:
+    f.write(run_struct.pack(value))
+
+
+def stream_struct_values(run_struct: struct.Struct, values: tuple, f: BinaryIO) -> None:
+    f.write(run_struct.pack(*values))
+
+
+def parse_function_for(f_type: Type) -> Callable[[BinaryIO], Any]:
+    """
+    Returns a function that parses one item of type f_type from a stream. This resolves
+    all the type dispatch of Streamable.parse_one_item once, instead of on every item.
+    """
+    inner_type: Type
+    if is_type_List(f_type):
+        inner_type = f_type.__args__[0]
+        assert inner_type != List.__args__[0]  # type: ignore
+        inner_format = fixed_struct_format(inner_type)
+        if inner_format is not None:
+            inner_size = struct.calcsize("!" + inner_format)
+            construct = fixed_struct_constructor(inner_type)
+
+            def parse_fixed_list(f: BinaryIO) -> List:
+                list_size = int.from_bytes(f.read(4), "big")
+                blob = f.read(list_size * inner_size)
+                items = struct.unpack(f"!{list_size * inner_format}", blob)
+                return [construct(item) for item in items]
+
+            return parse_fixed_list
+
+        parse_inner = parse_function_for(inner_type)
+
+        def parse_list(f: BinaryIO) -> List:
+            list_size = int.from_bytes(f.read(4), "big")
+            return [parse_inner(f) for _ in range(list_size)]
+
+        return parse_list
+    if is_type_SpecificOptional(f_type):
+        parse_present = parse_function_for(f_type.__args__[0])
+
+        def parse_optional(f: BinaryIO) -> Any:
+            if f.read(1) == b"\x01":
+                return parse_present(f)
+            return None
+
+        return parse_optional
+    if is_type_Tuple(f_type):
+        inner_parsers = [parse_function_for(t) for t in f_type.__args__]
+
+        def parse_tuple(f: BinaryIO) -> tuple:
+            return tuple(parse_inner(f) for parse_inner in inner_parsers)
+
+        return parse_tuple
+    if f_type is bool:
+        return lambda f: bool.from_bytes(f.read(4), "big")
+    if f_type == bytes:
+
+        def parse_bytes(f: BinaryIO) -> bytes:
+            return f.read(int.from_bytes(f.read(4), "big"))
+
+        return parse_bytes
+    fmt = fixed_struct_format(f_type)
+    if fmt is not None:
+        item_struct = struct.Struct("!" + fmt)
+        construct = fixed_struct_constructor(f_type)
+
+        def parse_fixed(f: BinaryIO) -> Any:
+            return construct(item_struct.unpack(f.read(item_struct.size))[0])
+
+        return parse_fixed
+    if hasattr(f_type, "parse"):
+        return f_type.parse
+    if hasattr(f_type, "from_bytes") and size_hints[f_type.__name__]:
+        size = size_hints[f_type.__name__]
+        from_bytes = f_type.from_bytes
+        return lambda f: from_bytes(f.read(size))
+    if f_type is str:
+
+        def parse_str(f: BinaryIO) -> str:
+            return bytes.decode(f.read(int.from_bytes(f.read(4), "big")), "utf-8")
+
+        return parse_str
+    raise RuntimeError(f"Type {f_type} does not have parse")
+
+
+def stream_function_for(f_type: Type) -> Callable[[Any, BinaryIO], None]:
+    """
+    Returns a function that streams one item of type f_type, resolving the dispatch of
+    Streamable.stream_one_item once.
+    """
+    inner_type: Type
+    if is_type_List(f_type):
+        inner_type = f_type.__args__[0]
+        assert inner_type != List.__args__[0]  # type: ignore
+        inner_format = fixed_struct_format(inner_type)
+        if inner_format is not None and issubclass(inner_type, bytes):
+
+            def stream_bytes_list(item: List, f: BinaryIO) -> None:
+                assert is_type_List(type(item))
+                f.write(len(item).to_bytes(4, "big"))
+                f.write(b"".join(item))
+
+            return stream_bytes_list
+        if inner_format is not None:
+
+            def stream_int_list(item: List, f: BinaryIO) -> None:
+                assert is_type_List(type(item))
+                f.write(struct.pack(f"!L{len(item) * inner_format}", len(item), *item))
+
+            return stream_int_list
+
+        stream_inner = stream_function_for(inner_type)
+
+        def stream_list(item: List, f: BinaryIO) -> None:
+            assert is_type_List(type(item))
+            f.write(len(item).to_bytes(4, "big"))
+            for element in item:
+                stream_inner(element, f)
+
+        return stream_list
+    if is_type_SpecificOptional(f_type):
+        stream_present = stream_function_for(f_type.__args__[0])
+
+        def stream_optional(item: Any, f: BinaryIO) -> None:
+            if item is None:
+                f.write(b"\x00")
+            else:
+                f.write(b"\x01")
+                stream_present(item, f)
+
+        return stream_optional
+    if is_type_Tuple(f_type):
+        inner_streamers = [stream_function_for(t) for t in f_type.__args__]
+
+        def stream_tuple(item: tuple, f: BinaryIO) -> None:
+            assert len(item) == len(inner_streamers)
+            for stream_inner, element in zip(inner_streamers, item):
+                stream_inner(element, f)
+
+        return stream_tuple
+    if f_type == bytes:
+
+        def stream_bytes(item: bytes, f: BinaryIO) -> None:
+            f.write(len(item).to_bytes(4, "big"))
+            f.write(item)
+
+        return stream_bytes
+    fmt = fixed_struct_format(f_type)
+    if fmt is not None:
+        return partial(stream_struct_value, struct.Struct("!" + fmt))
+    if hasattr(f_type, "stream"):
+        return lambda item, f: item.stream(f)
+    if hasattr(f_type, "__bytes__"):
+
+        def stream_serialized(item: Any, f: BinaryIO) -> None:
+            f.write(bytes(item))
+
+        return stream_serialized
+    if f_type is str:
+
+        def stream_str(item: str, f: BinaryIO) -> None:
+            encoded = item.encode("utf-8")
+            f.write(len(encoded).to_bytes(4, "big"))
+            f.write(encoded)
+
+        return stream_str
+    if f_type is bool:
+
+        def stream_bool(item: bool, f: BinaryIO) -> None:
+            f.write(int(item).to_bytes(4, "big"))
+
+        return stream_bool
+    raise NotImplementedError(f"can't stream {f_type}")
+
+
+def fixed_width_runs(fields: Dict[str, Type]) -> List[Any]:
+    """
+    Splits the fields of a class into consecutive runs. Each run is either a list of
+    (name, type) pairs that can all be packed with a single struct, or a single
+    (name, type) pair that needs its own codec.
+    """
+    runs: List[Any] = []
+    current_run: List = []
+    for f_name, f_type in fields.items():
+        if fixed_struct_format(f_type) is not None:
+            current_run.append((f_name, f_type))
+            continue
+        if current_run:
+            runs.append(current_run)
+            current_run = []
+        runs.append((f_name, f_type))
+    if current_run:
+        runs.append(current_run)
+    return runs
+
+
+def compile_parser(cls: Any) -> Callable[[BinaryIO], List[Any]]:
+    """
+    Builds a function that reads all the field values of a streamable class, in order.
+    """
+    steps: List = []
+    for run in fixed_width_runs(get_type_hints(cls)):
+        if isinstance(run, tuple):
+            steps.append((False, parse_function_for(run[1])))
+            continue
+        run_struct = struct.Struct("!" + "".join(fixed_struct_format(t) for _, t in run))  # type: ignore
+        constructors = [fixed_struct_constructor(t) for _, t in run]
+
+        def parse_run(
+            f: BinaryIO, run_struct=run_struct, constructors=constructors
+        ) -> List:
+            values = run_struct.unpack(f.read(run_struct.size))
+            return [construct(v) for construct, v in zip(constructors, values)]
+
+        steps.append((True, parse_run))
+
+    def parse_fields(f: BinaryIO) -> List[Any]:
+        values: List[Any] = []
+        for is_run, parse_step in steps:
+            if is_run:
+                values.extend(parse_step(f))
+            else:
+                values.append(parse_step(f))
+        return values
+
+    return parse_fields
+
+
+class ViewStream:
+    """
+    A minimal read-only stream over a memoryview, for types that can only parse themselves
+    from a stream. Each read copies just the bytes requested, never the rest of the buffer.
+    """
+
+    def __init__(self, buf: memoryview, pos: int = 0):
+        self.buf = buf
+        self.pos = pos
+
+    def read(self, size: int = -1) -> bytes:
+        end = len(self.buf) if size < 0 else self.pos + size
+        blob = self.buf[self.pos : end].tobytes()
+        self.pos += len(blob)
+        return blob
+
+
+def parse_view_function_for(
+    f_type: Type,
+) -> Callable[[memoryview, int], Tuple[Any, int]]:
+    """
+    Like parse_function_for, but the returned function reads one item of type f_type from
+    a memoryview at an offset, and returns the item along with the offset after it. Fixed
+    width items are unpacked in place instead of being read into intermediate bytes.
+    """
+    inner_type: Type
+    if is_type_List(f_type):
+        inner_type = f_type.__args__[0]
+        assert inner_type != List.__args__[0]  # type: ignore
+        inner_format = fixed_struct_format(inner_type)
+        if inner_format is not None and issubclass(inner_type, bytes):
+            inner_size = inner_type.SIZE  # type: ignore
+            construct = fixed_struct_constructor(inner_type)
+
+            def parse_bytes_list(buf: memoryview, pos: int) -> Tuple[List, int]:
+                (list_size,) = uint32_struct.unpack_from(buf, pos)
+                start = pos + 4
+                end = start + list_size * inner_size
+                if end > len(buf):
+                    raise ValueError(f"List of {inner_type.__name__} exceeds buffer")
+                items = [
+                    construct(buf[i : i + inner_size])
+                    for i in range(start, end, inner_size)
+                ]
+                return items, end
+
+            return parse_bytes_list
+        if inner_format is not None:
+            inner_size = struct.calcsize("!" + inner_format)
+            construct = fixed_struct_constructor(inner_type)
+
+            def parse_int_list(buf: memoryview, pos: int) -> Tuple[List, int]:
+                (list_size,) = uint32_struct.unpack_from(buf, pos)
+                items = struct.unpack_from(f"!{list_size}{inner_format}", buf, pos + 4)
+                return (
+                    [construct(item) for item in items],
+                    pos + 4 + list_size * inner_size,
+                )
+
+            return parse_int_list
+
+        parse_inner = parse_view_function_for(inner_type)
+
+        def parse_list(buf: memoryview, pos: int) -> Tuple[List, int]:
+            (list_size,) = uint32_struct.unpack_from(buf, pos)
+            pos += 4
+            full_list: List = []
+            for _ in range(list_size):
+                item, pos = parse_inner(buf, pos)
+                full_list.append(item)
+            return full_list, pos
+
+        return parse_list
+    if is_type_SpecificOptional(f_type):
+        parse_present = parse_view_function_for(f_type.__args__[0])
+
+        def parse_optional(buf: memoryview, pos: int) -> Tuple[Any, int]:
+            if pos < len(buf) and buf[pos] == 1:
+                return parse_present(buf, pos + 1)
+            return None, pos + 1
+
+        return parse_optional
+    if is_type_Tuple(f_type):
+        inner_parsers = [parse_view_function_for(t) for t in f_type.__args__]
+
+        def parse_tuple(buf: memoryview, pos: int) -> Tuple[tuple, int]:
+            items = []
+            for parse_inner in inner_parsers:
+                item, pos = parse_inner(buf, pos)
+                items.append(item)
+            return tuple(items), pos
+
+        return parse_tuple
+    if f_type is bool:
+
+        def parse_bool(buf: memoryview, pos: int) -> Tuple[bool, int]:
+            return bool.from_bytes(buf[pos : pos + 4], "big"), pos + 4
+
+        return parse_bool
+    if f_type == bytes:
+
+        def parse_bytes(buf: memoryview, pos: int) -> Tuple[bytes, int]:
+            (size,) = uint32_struct.unpack_from(buf, pos)
+            end = pos + 4 + size
+            if end > len(buf):
+                raise ValueError("Bytes exceed buffer")
+            return buf[pos + 4 : end].tobytes(), end
+
+        return parse_bytes
+    fmt = fixed_struct_format(f_type)
+    if fmt is not None:
+        item_struct = struct.Struct("!" + fmt)
+        construct = fixed_struct_constructor(f_type)
+
+        def parse_fixed(buf: memoryview, pos: int) -> Tuple[Any, int]:
+            return (
+                construct(item_struct.unpack_from(buf, pos)[0]),
+                pos + item_struct.size,
+            )
+
+        return parse_fixed
+    if isinstance(f_type, type) and issubclass(f_type, Streamable):
+        return f_type.parse_view
+    if hasattr(f_type, "parse"):
+        parse = f_type.parse
+
+        def parse_from_stream(buf: memoryview, pos: int) -> Tuple[Any, int]:
+            f = ViewStream(buf, pos)
+            return parse(f), f.pos
+
+        return parse_from_stream
+    if hasattr(f_type, "from_bytes") and size_hints[f_type.__name__]:
+        size = size_hints[f_type.__name__]
+        from_bytes = f_type.from_bytes
+
+        def parse_sized(buf: memoryview, pos: int) -> Tuple[Any, int]:
+            return from_bytes(buf[pos : pos + size].tobytes()), pos + size
+
+        return parse_sized
+    if f_type is str:
+
+        def parse_str(buf: memoryview, pos: int) -> Tuple[str, int]:
+            (size,) = uint32_struct.unpack_from(buf, pos)
+            end = pos + 4 + size
+            if end > len(buf):
+                raise ValueError("String exceeds buffer")
+            return bytes.decode(buf[pos + 4 : end].tobytes(), "utf-8"), end
+
+        return parse_str
+    raise RuntimeError(f"Type {f_type} does not have parse")
+
+
+def compile_view_parser(cls: Any) -> Callable[[memoryview, int], Tuple[List[Any], int]]:
+    """
+    Builds a function that reads all the field values of a streamable class from a
+    memoryview at an offset, and returns them with the offset after the last field.
+    """
+    steps: List = []
+    for run in fixed_width_runs(get_type_hints(cls)):
+        if isinstance(run, tuple):
+            steps.append((False, parse_view_function_for(run[1])))
+            continue
+        run_struct = struct.Struct("!" + "".join(fixed_struct_format(t) for _, t in run))  # type: ignore
+        constructors = [fixed_struct_constructor(t) for _, t in run]
+
+        def parse_run(
+            buf: memoryview, pos: int, run_struct=run_struct, constructors=constructors
+        ) -> Tuple[List, int]:
+            values = run_struct.unpack_from(buf, pos)
+            return (
+                [construct(v) for construct, v in zip(constructors, values)],
+                pos + run_struct.size,
+            )
+
+        steps.append((True, parse_run))
+
+    def parse_view_fields(buf: memoryview, pos: int) -> Tuple[List[Any], int]:
+        values: List[Any] = []
+        for is_run, parse_step in steps:
+            value, pos = parse_step(buf, pos)
+            if is_run:
+                values.extend(value)
+            else:
+                values.append(value)
+        return values, pos
+
+    return parse_view_fields
+
+
+def compile_streamer(cls: Any) -> Callable[[Any, BinaryIO], None]:
+    """
+    Builds a function that writes all the field values of a streamable object, in order.
+    """
+    steps: List = []
+    for run in fixed_width_runs(get_type_hints(cls)):
+        if isinstance(run, tuple):
+            steps.append((attrgetter(run[0]), stream_function_for(run[1])))
+            continue
+        run_struct = struct.Struct("!" + "".join(fixed_struct_format(t) for _, t in run))  # type: ignore
+        if len(run) == 1:
+            getter = attrgetter(run[0][0])
+            steps.append((getter, partial(stream_struct_value, run_struct)))
+        else:
+            getter = attrgetter(*[f_name for f_name, _ in run])
+            steps.append((getter, partial(stream_struct_values, run_struct)))
+
+    def stream_fields(obj: Any, f: BinaryIO) -> None:
+        for getter, stream_step in steps:
+            stream_step(getter(obj), f)
+
+    return stream_fields
+
+
 def streamable(cls: Any):
     """
     This is a decorator for class definitions. It applies the strictdataclass decorator,
@@ -83,6 +566,16 @@ def streamable(cls: Any):
     whereas uint32 can be.
 
     Furthermore, a get_hash() member is added, which performs a serialization and a sha256.
+    Since the objects are frozen, both the serialized bytes and the hash are memoized on
+    each instance the first time they are computed.
+
+    The parsers and serializer of each class are compiled once, on first use, from its type
+    hints (see compile_parser, compile_view_parser and compile_streamer), and cached on the
+    class. from_bytes decodes from a memoryview of the blob, so fixed width fields are
+    unpacked in place instead of being read into intermediate bytes objects. Consecutive
+    fixed width fields, such as uint64 and bytes32, are packed and unpacked with a single
+    struct. Since the parsers already produce values of the annotated types, parsed objects
+    are created with construct_unchecked, which skips the strictdataclass checks.
 
     This class is used for deterministic serialization and hashing, for consensus critical
     objects such as the block header.
@@ -94,7 +587,9 @@ def streamable(cls: Any):
     """
 
     cls1 = strictdataclass(cls)
-    return type(cls.__name__, (cls1, Streamable), {})
+    # Keep the module and qualified name of the decorated class, so instances can be pickled
+    namespace = {"__module__": cls.__module__, "__qualname__": cls.__qualname__}
+    return type(cls.__name__, (cls1, Streamable), namespace)
 
 
 class Streamable:
@@ -139,10 +634,11 @@ class Streamable:
 
     @classmethod
     def parse(cls: Type[cls.__name__], f: BinaryIO) -> cls.__name__:  # type: ignore
-        values = []
-        for _, f_type in get_type_hints(cls).items():
-            values.append(cls.parse_one_item(f_type, f))  # type: ignore
-        return cls(*values)
+        parse_fields = cls.__dict__.get("_parse_fields")
+        if parse_fields is None:
+            parse_fields = compile_parser(cls)
+            setattr(cls, "_parse_fields", parse_fields)
+        return construct_unchecked(cls, parse_fields(f))
 
     def stream_one_item(self, f_type: Type, item, f: BinaryIO) -> None:
         inner_type: Type
@@ -181,21 +677,55 @@ class Streamable:
             raise NotImplementedError(f"can't stream {item}, {f_type}")
 
     def stream(self, f: BinaryIO) -> None:
-        for f_name, f_type in get_type_hints(self).items():  # type: ignore
-            self.stream_one_item(f_type, getattr(self, f_name), f)
+        cached_bytes = self.__dict__.get("_cached_bytes")
+        if cached_bytes is not None:
+            f.write(cached_bytes)
+            return
+        cls = type(self)
+        stream_fields = cls.__dict__.get("_stream_fields")
+        if stream_fields is None:
+            stream_fields = compile_streamer(cls)
+            setattr(cls, "_stream_fields", stream_fields)
+        stream_fields(self, f)
 
     def get_hash(self) -> bytes32:
-        return bytes32(std_hash(bytes(self)))
+        cached_hash = self.__dict__.get("_cached_hash")
+        if cached_hash is None:
+            cached_hash = bytes32(std_hash(bytes(self)))
+            self.__dict__["_cached_hash"] = cached_hash
+        return cached_hash
+
+    @classmethod
+    def parse_view(cls: Any, buf: memoryview, pos: int = 0) -> Tuple[Any, int]:
+        """
+        Parses an object from buf, starting at pos, without copying the buffer. Returns
+        the object, and the position right after it.
+        """
+        parse_view_fields = cls.__dict__.get("_parse_view_fields")
+        if parse_view_fields is None:
+            parse_view_fields = compile_view_parser(cls)
+            setattr(cls, "_parse_view_fields", parse_view_fields)
+        values, pos = parse_view_fields(buf, pos)
+        return construct_unchecked(cls, values), pos
 
     @classmethod
     def from_bytes(cls: Any, blob: bytes) -> Any:
-        f = io.BytesIO(blob)
-        return cls.parse(f)
+        obj, _ = cls.parse_view(memoryview(blob))
+        return obj
 
     def __bytes__(self: Any) -> bytes:
-        f = io.BytesIO()
-        self.stream(f)
-        return bytes(f.getvalue())
+        cached_bytes = self.__dict__.get("_cached_bytes")
+        if cached_bytes is None:
+            f = io.BytesIO()
+            self.stream(f)
+            cached_bytes = f.getvalue()
+            self.__dict__["_cached_bytes"] = cached_bytes
+        return cached_bytes
+
+    def __reduce__(self: Any) -> Tuple[Any, Tuple[bytes]]:
+        # Pickle through the streamable serialization, since the BLS types can't be
+        # pickled. This also leaves the memoized bytes and hash out of the pickle.
+        return type(self).from_bytes, (bytes(self),)
 
     def __str__(self: Any) -> str:
         return pp.pformat(self.recurse_jsonify(dataclasses.asdict(self)))
@@ -1,4 +1,3 @@
-import io
 import struct
 from typing import Any, BinaryIO
 
@@ -29,10 +28,7 @@ class StructStream(int):
 
     @classmethod
     def from_bytes(cls: Any, blob: bytes) -> Any:  # type: ignore
-        f = io.BytesIO(blob)
-        return cls.parse(f)
+        return cls(*struct.unpack_from(cls.PACK, blob))
 
     def __bytes__(self: Any) -> bytes:
-        f = io.BytesIO()
-        self.stream(f)
-        return bytes(f.getvalue())
+        return struct.pack(self.PACK, self)
@@ -1,5 +1,5 @@
 import dataclasses
-from typing import Any, List, Type, Union, get_type_hints
+from typing import Any, List, Sequence, Type, Union, get_type_hints
 
 
 def is_type_List(f_type: Type) -> bool:
@@ -25,6 +25,26 @@ def is_type_Tuple(f_type: Type) -> bool:
     ) or f_type == tuple
 
 
+def construct_unchecked(cls: Any, values: Sequence[Any]) -> Any:
+    """
+    Creates an instance of a strictdataclass from positional field values, without running
+    the type checks and conversions of __post_init__. Only use this for values that already
+    have exactly the annotated types, such as the output of the Streamable parsers, which
+    check every field, so this is safe for bytes from users or peers. Values that were not
+    parsed that way, such as the fields of JSON or CBOR messages, must go through the normal
+    constructor.
+    """
+    field_names = cls.__dict__.get("_field_names")
+    if field_names is None:
+        field_names = tuple(f.name for f in dataclasses.fields(cls))
+        setattr(cls, "_field_names", field_names)
+    if len(values) != len(field_names):
+        raise ValueError(f"{cls.__name__} takes {len(field_names)} fields")
+    obj = object.__new__(cls)
+    obj.__dict__.update(zip(field_names, values))
+    return obj
+
+
 def strictdataclass(cls: Any):
     class _Local:
         """
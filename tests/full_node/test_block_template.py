@@ -0,0 +1,107 @@
+import unittest
+from secrets import token_bytes
+from typing import List, Optional
+
+from blspy import G2Element
+
+from src.consensus.constants import constants
+from src.full_node.block_template import BlockTemplate
+from src.full_node.mempool import Mempool
+from src.types.coin import Coin
+from src.types.coin_solution import CoinSolution
+from src.types.full_block import FullBlock
+from src.types.mempool_item import MempoolItem
+from src.types.program import Program
+from src.types.sized_bytes import bytes32
+from src.types.spend_bundle import SpendBundle
+from src.util.ints import uint32, uint64
+
+
+def make_item(fee: int, cost: int, removals: Optional[List[Coin]] = None) -> MempoolItem:
+    """ An item which spends the removals, or a new coin, and creates one coin. """
+    if removals is None:
+        removals = [Coin(bytes32(token_bytes(32)), bytes32(token_bytes(32)), 10000)]
+    amount = sum(coin.amount for coin in removals) - fee
+    addition = Coin(removals[0].name(), bytes32(token_bytes(32)), uint64(amount))
+    spend_bundle = SpendBundle(
+        [CoinSolution(coin, Program.to([])) for coin in removals], G2Element()
+    )
+    return MempoolItem(
+        spend_bundle, fee / cost, uint64(fee), uint64(cost), [], [addition], removals,
+    )
+
+
+def make_pool(items: List[MempoolItem]) -> Mempool:
+    header = FullBlock.from_bytes(constants["GENESIS_BLOCK"]).header
+    pool = Mempool.create(header, uint32(100))
+    for item in items:
+        pool.add_to_pool(item)
+    return pool
+
+
+class TestBlockTemplate(unittest.TestCase):
+    def test_highest_fee_per_cost_first(self):
+        low = make_item(100, 100)
+        high = make_item(500, 100)
+        big = make_item(1000, 250)
+        small = make_item(50, 100)
+        pool = make_pool([low, high, big, small])
+
+        # big does not fit after high, but smaller items still do
+        template = BlockTemplate.create(pool, 300)
+        assert list(template.items.keys()) == [high.name, low.name, small.name]
+        assert template.cost == 300
+        assert template.spend_bundle is not None
+        assert template.spend_bundle.removals() == (
+            high.removals + low.removals + small.removals
+        )
+
+        template = BlockTemplate.create(pool, 1000)
+        assert len(template.items) == 4
+
+        assert BlockTemplate.create(make_pool([]), 1000).spend_bundle is None
+
+    def test_packages(self):
+        parent = make_item(0, 100)
+        child = make_item(1000, 100, parent.additions)
+        other = make_item(300, 100)
+        pool = make_pool([parent, child, other])
+
+        # The child pays for the parent, which has to be in the block too
+        template = BlockTemplate.create(pool, 300)
+        assert set(template.items.keys()) == {parent.name, child.name, other.name}
+        template = BlockTemplate.create(pool, 200)
+        assert set(template.items.keys()) == {parent.name, child.name}
+        # Without the parent, the child can't be included
+        template = BlockTemplate.create(pool, 100)
+        assert list(template.items.keys()) == [other.name]
+
+    def test_add(self):
+        first = make_item(200, 100)
+        pool = make_pool([first])
+        template = BlockTemplate.create(pool, 300)
+
+        second = make_item(100, 100)
+        pool.add_to_pool(second)
+        assert template.add(second, pool)
+        assert list(template.items.keys()) == [first.name, second.name]
+        assert template.spend_bundle == SpendBundle.aggregate(
+            [first.spend_bundle, second.spend_bundle]
+        )
+
+        # A low fee item which does not fit does not change the template
+        large = make_item(10, 200)
+        pool.add_to_pool(large)
+        assert template.add(large, pool)
+        assert large.name not in template.items
+
+        # A higher fee item which does not fit needs a new template
+        valuable = make_item(1000, 200)
+        pool.add_to_pool(valuable)
+        assert not template.add(valuable, pool)
+        template = BlockTemplate.create(pool, 300)
+        assert list(template.items.keys()) == [valuable.name, first.name]
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -486,6 +486,16 @@ class TestBlockValidation:
         assert result == ReceiveBlockResult.INVALID_BLOCK
         assert error_code == Err.BAD_AGGREGATE_SIGNATURE
 
+        # Only the signature is invalid, which pre-validation also finds
+        results = await b.pre_validate_blocks_multiprocessing([blocks[9], block_bad])
+        assert [r[0] for r in results] == [True, True]
+        assert [r[2] for r in results] == [True, False]
+        validated, pos, signature_validated = results[1]
+        result, removed, error_code = await b.receive_block(
+            block_bad, validated, pos, signature_validated=signature_validated
+        )
+        assert error_code == Err.BAD_AGGREGATE_SIGNATURE
+
     @pytest.mark.asyncio
     async def test_invalid_fees_amount(self, initial_blockchain):
         blocks, b = initial_blockchain
@@ -720,6 +730,13 @@ class TestReorgs:
             )
             == 4
         )
+        for chain in [blocks, blocks_2, blocks_3, blocks_reorg]:
+            for other in [blocks, blocks_2, blocks_3, blocks_reorg]:
+                assert b.chain_index.find_fork_point(
+                    chain[-1].header_hash, other[-1].header_hash
+                ) == find_fork_point_in_chain(
+                    b.headers, chain[-1].header, other[-1].header
+                )
         assert b.lca_block.data == blocks[4].header.data
         await connection.close()
         b.shut_down()
@@ -743,3 +760,68 @@ class TestReorgs:
 
         await connection.close()
         b.shut_down()
+
+
+class TestChainSnapshot:
+    @pytest.mark.asyncio
+    async def test_load_from_snapshot(self):
+        blocks = bt.get_consecutive_blocks(test_constants, 5, [], 9, b"0")
+        blocks_fork = bt.get_consecutive_blocks(test_constants, 2, blocks[:4], 9, b"1")
+        db_path = Path("blockchain_test.db")
+        if db_path.exists():
+            db_path.unlink()
+        connection = await aiosqlite.connect(db_path)
+        coin_store = await CoinStore.create(connection)
+        store = await BlockStore.create(connection)
+        b: Blockchain = await Blockchain.create(coin_store, store, test_constants)
+        for block in blocks[1:] + blocks_fork[4:]:
+            await b.receive_block(block)
+        assert len(b.get_current_tips()) > 1
+        await b.write_snapshot()
+
+        async def assert_same_state(lca, tips):
+            store_2 = await BlockStore.create(connection)
+            b_2: Blockchain = await Blockchain.create(
+                coin_store, store_2, test_constants
+            )
+            assert b_2.lca_block == lca
+            assert set(t.header_hash for t in b_2.tips) == set(
+                t.header_hash for t in tips
+            )
+            assert b_2.height_to_hash == b.height_to_hash
+            for tip in tips:
+                assert b_2.get_header_hashes(tip.header_hash) == b.get_header_hashes(
+                    tip.header_hash
+                )
+            for key, height in store_2.proof_of_time_heights.items():
+                assert store.proof_of_time_heights[key] == height
+            b_2.shut_down()
+            return b_2, store_2
+
+        lca, tips = b.lca_block, b.get_current_tips()
+        assert await b._load_chain_from_snapshot(lca, tips)
+        b_2, store_2 = await assert_same_state(lca, tips)
+        assert b_2.headers == b.headers
+        assert store_2.proof_of_time_heights == store.proof_of_time_heights
+
+        # The blocks added after the snapshot are loaded from the headers
+        more_blocks = bt.get_consecutive_blocks(test_constants, 2, blocks, 9, b"2")
+        for block in more_blocks[5:]:
+            await b.receive_block(block)
+        lca, tips = b.lca_block, b.get_current_tips()
+        assert await b._load_chain_from_snapshot(lca, tips)
+        assert b._blocks_since_snapshot == 2
+        b_2, store_2 = await assert_same_state(lca, tips)
+        assert all(tip.header_hash in b_2.headers for tip in tips)
+
+        # A corrupt snapshot is ignored
+        await b.write_snapshot()
+        assert await b._load_chain_from_snapshot(lca, tips)
+        row = await store.get_chain_snapshot()
+        assert row is not None
+        await store.set_chain_snapshot(row[0], row[1][: len(row[1]) // 2])
+        assert not await b._load_chain_from_snapshot(lca, tips)
+        await assert_same_state(lca, tips)
+
+        await connection.close()
+        b.shut_down()
@@ -17,6 +17,7 @@ from src.types.spend_bundle import SpendBundle
 from src.util.clvm import int_to_bytes
 from src.util.errors import Err
 from src.util.ints import uint64
+from src.util.mempool_check_conditions import npc_result_cache
 from tests.setup_nodes import setup_two_nodes, test_constants, bt
 from src.util.wallet_tools import WalletTool
 
@@ -90,6 +91,13 @@ class TestBlockchainTransactions:
         )
 
         next_block = new_blocks[11]
+        # The aggregated signature of the transactions is verified in pre-validation
+        results = await full_node_1.blockchain.pre_validate_blocks_multiprocessing(
+            [next_block]
+        )
+        assert results[0][0] and results[0][2]
+        # The result of running the generator is reused by full validation
+        assert npc_result_cache.get(next_block.header.data.generator_hash) is not None
         async for _ in full_node_1.respond_block(
             full_node_protocol.RespondBlock(next_block)
         ):
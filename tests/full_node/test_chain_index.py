@@ -0,0 +1,57 @@
+import random
+import unittest
+from dataclasses import dataclass
+
+from src.consensus.find_fork_point import find_fork_point_in_chain
+from src.full_node.chain_index import ChainIndex, get_skip_height
+from src.util.hash import std_hash
+
+
+@dataclass(frozen=True)
+class FakeHeader:
+    header_hash: bytes
+    prev_header_hash: bytes
+    height: int
+
+
+class TestChainIndex(unittest.TestCase):
+    def test_skip_height(self):
+        for height in range(1, 5000):
+            assert get_skip_height(height) < height
+
+    def test_ancestors_and_fork_points(self):
+        rng = random.Random(0)
+        genesis = FakeHeader(std_hash(b"genesis"), bytes(32), 0)
+        headers = {genesis.header_hash: genesis}
+        index = ChainIndex()
+        index.add(genesis)
+        tips = [genesis]
+        # A main chain with forks branching off at random heights
+        for i in range(3000):
+            prev = tips[0] if rng.random() < 0.9 else rng.choice(list(headers.values()))
+            header = FakeHeader(
+                std_hash(bytes(str(i), "utf-8")), prev.header_hash, prev.height + 1
+            )
+            headers[header.header_hash] = header
+            index.add(header)
+            if prev in tips:
+                tips.remove(prev)
+            tips.append(header)
+            tips.sort(key=lambda h: h.height, reverse=True)
+
+        for header in rng.sample(list(headers.values()), 200):
+            chain = index.get_chain(header.header_hash)
+            assert len(chain) == header.height + 1
+            assert chain[-1] == header.header_hash
+            for height in rng.sample(
+                range(header.height + 1), min(header.height + 1, 20)
+            ):
+                assert index.get_ancestor(header.header_hash, height) == chain[height]
+            other = rng.choice(tips)
+            assert index.find_fork_point(
+                header.header_hash, other.header_hash
+            ) == find_fork_point_in_chain(headers, header, other)
+
+
+if __name__ == "__main__":
+    unittest.main()
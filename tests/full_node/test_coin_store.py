@@ -7,6 +7,8 @@ import pytest
 from src.full_node.blockchain import Blockchain, ReceiveBlockResult
 from src.full_node.coin_store import CoinStore
 from src.full_node.block_store import BlockStore
+from src.util.bundle_tools import best_solution_program
+from src.util.wallet_tools import WalletTool
 from tests.setup_nodes import test_constants, bt
 
 test_constants_dict = test_constants.copy()
@@ -109,6 +111,104 @@ class TestCoinStore:
         await connection.close()
         Path("fndb_test.db").unlink()
 
+    @pytest.mark.asyncio
+    async def test_cache(self):
+        blocks = bt.get_consecutive_blocks(test_constants_dict, 9, [], 9, b"0")
+
+        db_path = Path("fndb_test.db")
+        if db_path.exists():
+            db_path.unlink()
+        connection = await aiosqlite.connect(db_path)
+        db = await CoinStore.create(connection, cache_size=6, write_batch_size=8)
+
+        for block in blocks:
+            await db.add_lcas([block], commit=False)
+            await db.set_spent(block.get_coinbase().name(), block.height)
+        # Pending records are written whenever 8 of them are staged
+        assert 0 < len(db.dirty_coin_records) < 8
+        assert len(db.coin_record_cache) == 6
+
+        hits = db.coin_record_cache.hits
+        misses = db.coin_record_cache.misses
+        assert (await db.get_coin_record(blocks[-1].get_coinbase().name())).spent
+        assert db.coin_record_cache.hits == hits + 1
+        assert (await db.get_coin_record(blocks[0].get_coinbase().name())).spent
+        assert db.coin_record_cache.misses == misses + 1
+        assert blocks[0].get_coinbase().name() in db.coin_record_cache
+
+        reorg_index = 4
+        await db.rollback_lca_to_block(reorg_index, commit=False)
+        await db.flush()
+        disk_db = await CoinStore.create(connection)
+        for store in [db, disk_db]:
+            for block in blocks:
+                coinbase = await store.get_coin_record(block.get_coinbase().name())
+                fees = await store.get_coin_record(block.get_fees_coin().name())
+                if block.height <= reorg_index:
+                    assert coinbase.spent and coinbase.spent_block_index == block.height
+                    assert not fees.spent
+                else:
+                    assert coinbase is None
+                    assert fees is None
+        assert db.cached_names_by_height.keys()[-1] <= reorg_index
+
+        await connection.close()
+        Path("fndb_test.db").unlink()
+
+    @pytest.mark.asyncio
+    async def test_add_lcas_batch(self):
+        wallet_a = WalletTool()
+        wallet_receiver = WalletTool()
+        blocks = bt.get_consecutive_blocks(
+            test_constants_dict, 3, [], 10, b"", wallet_a.get_new_puzzlehash()
+        )
+        spent_coin = blocks[1].get_coinbase()
+        spend_bundle = wallet_a.generate_signed_transaction(
+            1000, wallet_receiver.get_new_puzzlehash(), spent_coin
+        )
+        assert spend_bundle is not None
+        dic_h = {
+            4: (best_solution_program(spend_bundle), spend_bundle.aggregated_signature)
+        }
+        blocks = bt.get_consecutive_blocks(
+            test_constants_dict, 1, blocks, 10, transaction_data_at_height=dic_h
+        )
+
+        db_path = Path("fndb_test.db")
+        if db_path.exists():
+            db_path.unlink()
+        connection = await aiosqlite.connect(db_path)
+        reader = await aiosqlite.connect(db_path)
+        db = await CoinStore.create(connection)
+
+        # The coin is created and spent within the same batch
+        await db.add_lcas(blocks, commit=False)
+        assert len((await CoinStore.create(reader)).coin_record_cache) == 0
+        cursor = await reader.execute("SELECT COUNT(*) from coin_record")
+        assert (await cursor.fetchone())[0] == 0
+        await cursor.close()
+        await db.flush()
+
+        # Read back from disk, bypassing the cache
+        disk_db = await CoinStore.create(reader)
+        for block in blocks:
+            for coin in [block.get_coinbase(), block.get_fees_coin()]:
+                record = await disk_db.get_coin_record(coin.name())
+                assert record == await db.get_coin_record(coin.name())
+                assert record.coin == coin
+                assert record.confirmed_block_index == block.height
+        spent = await disk_db.get_coin_record(spent_coin.name())
+        assert spent.spent
+        assert spent.spent_block_index == 4
+        for coin in spend_bundle.additions():
+            record = await disk_db.get_coin_record(coin.name())
+            assert record is not None
+            assert not record.spent
+
+        await reader.close()
+        await connection.close()
+        Path("fndb_test.db").unlink()
+
     @pytest.mark.asyncio
     async def test_basic_reorg(self):
         initial_block_count = 20
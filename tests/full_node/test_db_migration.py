@@ -0,0 +1,111 @@
+import asyncio
+from pathlib import Path
+
+import aiosqlite
+import pytest
+
+from src.full_node.block_store import BlockStore
+from src.full_node.coin_store import CoinStore
+from src.full_node.db_migration import DB_VERSION, migrate_db
+from src.util.hash import std_hash
+from tests.setup_nodes import test_constants, bt
+
+
+@pytest.fixture(scope="module")
+def event_loop():
+    loop = asyncio.get_event_loop()
+    yield loop
+
+
+async def create_hex_db(connection: aiosqlite.Connection, blocks) -> None:
+    """ Writes blocks and their coinbase coins with the version 0 schema. """
+    await connection.execute(
+        "CREATE TABLE blocks(height bigint, header_hash text PRIMARY KEY, block blob)"
+    )
+    await connection.execute(
+        "CREATE TABLE headers(height bigint, header_hash text PRIMARY KEY, proof_hash text,"
+        " challenge_hash text, header blob, is_lca tinyint, is_tip tinyint)"
+    )
+    await connection.execute("CREATE INDEX hh on headers(header_hash)")
+    await connection.execute(
+        "CREATE TABLE coin_record(coin_name text PRIMARY KEY, confirmed_index bigint,"
+        " spent_index bigint, spent int, coinbase int, puzzle_hash text, coin_parent text,"
+        " amount bigint)"
+    )
+    await connection.execute(
+        "CREATE INDEX coin_confirmed_index on coin_record(confirmed_index)"
+    )
+    for block in blocks:
+        proof_hash = std_hash(
+            block.proof_of_space.get_hash() + block.proof_of_time.output.get_hash()
+        )
+        await connection.execute(
+            "INSERT INTO blocks VALUES(?, ?, ?)",
+            (block.height, block.header_hash.hex(), bytes(block)),
+        )
+        await connection.execute(
+            "INSERT INTO headers VALUES(?, ?, ?, ?, ?, ?, ?)",
+            (
+                block.height,
+                block.header_hash.hex(),
+                proof_hash.hex(),
+                block.proof_of_space.challenge_hash.hex(),
+                bytes(block.header),
+                int(block == blocks[-1]),
+                int(block == blocks[-1]),
+            ),
+        )
+        coin = block.get_coinbase()
+        await connection.execute(
+            "INSERT INTO coin_record VALUES(?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                coin.name().hex(),
+                block.height,
+                0,
+                0,
+                1,
+                coin.puzzle_hash.hex(),
+                coin.parent_coin_info.hex(),
+                coin.amount,
+            ),
+        )
+    await connection.commit()
+
+
+class TestDbMigration:
+    @pytest.mark.asyncio
+    async def test_migrate_hex_db(self):
+        blocks = bt.get_consecutive_blocks(test_constants, 9, [], 9, b"0")
+        db_path = Path("migration_test.db")
+        if db_path.exists():
+            db_path.unlink()
+        connection = await aiosqlite.connect(db_path)
+        try:
+            await create_hex_db(connection, blocks)
+
+            # Batches smaller than the tables, so they take several transactions
+            assert await migrate_db(connection, batch_size=4)
+            assert not await migrate_db(connection)
+            cursor = await connection.execute("PRAGMA user_version")
+            assert (await cursor.fetchone())[0] == DB_VERSION
+            await cursor.close()
+
+            block_store = await BlockStore.create(connection)
+            coin_store = await CoinStore.create(connection)
+            headers = await block_store.get_headers()
+            assert len(headers) == len(blocks)
+            for block in blocks:
+                assert await block_store.get_block(block.header_hash) == block
+                assert headers[block.header_hash] == block.header
+                record = await coin_store.get_coin_record(block.get_coinbase().name())
+                assert record.coin == block.get_coinbase()
+                assert record.confirmed_block_index == block.height
+            assert await block_store.get_lca() == blocks[-1].header
+            await block_store.init_challenge_hashes()
+            assert (
+                block_store.get_challenge_hash(blocks[1].header_hash)
+                == blocks[1].proof_of_space.challenge_hash
+            )
+        finally:
+            await connection.close()
+            db_path.unlink()
@@ -0,0 +1,80 @@
+import asyncio
+from secrets import token_bytes
+
+import aiosqlite
+import pytest
+
+from src.full_node.fee_estimator import (
+    FeeEstimator,
+    MAX_TARGET_BLOCKS,
+    bucket_floor,
+    bucket_for_fee_per_cost,
+)
+from src.types.sized_bytes import bytes32
+from src.util.ints import uint32
+from tests.full_node.test_block_template import make_item
+
+
+@pytest.fixture(scope="module")
+def event_loop():
+    loop = asyncio.get_event_loop()
+    yield loop
+
+
+def confirm_items(
+    estimator: FeeEstimator, fee: int, count: int, height: int, blocks: int
+):
+    """ Tracks count items with the fee per 100 cost, included after blocks. """
+    for _ in range(count):
+        item = make_item(fee, 100)
+        estimator.item_added(item, uint32(height))
+        estimator.item_included(item.name, uint32(height + blocks))
+
+
+class TestFeeEstimator:
+    @pytest.mark.asyncio
+    async def test_estimates(self):
+        estimator = FeeEstimator()
+        assert estimator.estimate_fee_per_cost(1) is None
+
+        # High fee items confirm in the next block, low fee ones take 5 blocks
+        confirm_items(estimator, 1000, 20, 10, 1)
+        confirm_items(estimator, 10, 20, 10, 5)
+        await estimator.new_height(uint32(15))
+        high = bucket_floor(bucket_for_fee_per_cost(10))
+        low = bucket_floor(bucket_for_fee_per_cost(0.1))
+        assert estimator.estimate_fee_per_cost(1) == high
+        assert estimator.estimate_fee_per_cost(4) == high
+        assert estimator.estimate_fee_per_cost(5) == low
+        assert estimator.estimate_fee_per_cost(MAX_TARGET_BLOCKS + 10) == low
+
+        # Items which leave the pools unconfirmed count against their fee
+        for _ in range(20):
+            item = make_item(10, 100)
+            estimator.item_added(item, uint32(15))
+            estimator.item_removed(item.name)
+        assert estimator.estimate_fee_per_cost(5) == high
+        assert len(estimator.pending) == 0
+
+        # Items which were not tracked are ignored
+        estimator.item_included(bytes32(token_bytes(32)), uint32(16))
+        estimator.item_removed(bytes32(token_bytes(32)))
+
+    @pytest.mark.asyncio
+    async def test_decay_and_persistence(self):
+        connection = await aiosqlite.connect(":memory:")
+        estimator = await FeeEstimator.create(connection)
+        confirm_items(estimator, 1000, 20, 0, 1)
+        await estimator.new_height(uint32(1))
+        assert estimator.estimate_fee_per_cost(1) is not None
+
+        await estimator.save()
+        loaded = await FeeEstimator.create(connection)
+        assert loaded.height == 1
+        assert loaded.totals == estimator.totals
+        assert loaded.confirmed == estimator.confirmed
+
+        # Old confirmations weigh less, until there are not enough of them
+        await estimator.new_height(uint32(1000))
+        assert estimator.estimate_fee_per_cost(1) is None
+        await connection.close()
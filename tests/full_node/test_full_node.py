@@ -180,12 +180,13 @@ class TestFullNodeProtocol:
                 500, receiver_puzzlehash, coin_record.coin, fee=fee
             )
             respond_transaction = fnp.RespondTransaction(spend_bundle)
-            res = [
-                x async for x in full_node_1.respond_transaction(respond_transaction)
-            ]
+            [x async for x in full_node_1.respond_transaction(respond_transaction)]
 
             # Added to mempool
-            if len(res) > 0:
+            mempool_bundle = full_node_1.mempool_manager.get_spendbundle(
+                spend_bundle.name()
+            )
+            if mempool_bundle is not None:
                 total_fee += fee
                 spend_bundles.append(spend_bundle)
 
@@ -231,14 +232,75 @@ class TestFullNodeProtocol:
         assert spend_bundle is not None
         respond_transaction = fnp.RespondTransaction(spend_bundle)
         prop = [x async for x in full_node_1.respond_transaction(respond_transaction)]
-        assert len(prop) == 1
-        assert isinstance(prop[0].message.data, fnp.NewTransaction)
+        # Announced to the peers with the next batch
+        assert len(prop) == 0
+        assert spend_bundle.name() in full_node_1.transaction_inventory.queue
 
         request_transaction = fnp.RequestTransaction(spend_bundle.get_hash())
         msgs = [x async for x in full_node_1.request_transaction(request_transaction)]
         assert len(msgs) == 1
         assert msgs[0].message.data == fnp.RespondTransaction(spend_bundle)
 
+    @pytest.mark.asyncio
+    async def test_new_transactions(self, two_nodes, wallet_blocks_five):
+        full_node_1, full_node_2, server_1, server_2 = two_nodes
+        wallet_a, wallet_receiver, blocks = wallet_blocks_five
+
+        spend_bundle = wallet_a.generate_signed_transaction(
+            100, wallet_receiver.get_new_puzzlehash(), blocks[3].get_coinbase(),
+        )
+        assert spend_bundle is not None
+        [
+            x
+            async for x in full_node_1.respond_transaction(
+                fnp.RespondTransaction(spend_bundle)
+            )
+        ]
+        assert full_node_1.mempool_manager.seen(spend_bundle.name())
+        # A peer which sends us a transaction is not announced it
+        [
+            x
+            async for x in full_node_1.respond_transaction_with_peer_name(
+                fnp.RespondTransaction(spend_bundle), "peer_1"
+            )
+        ]
+        assert spend_bundle.name() in full_node_1.transaction_inventory.known["peer_1"]
+
+        # Only the transactions which were not seen are requested, in one message
+        new_ids = [token_bytes(32), token_bytes(32)]
+        announcement = fnp.NewTransactions(
+            [(spend_bundle.name(), uint64(100), uint64(100))]
+            + [(tx_id, uint64(100), uint64(100)) for tx_id in new_ids]
+        )
+        msgs = [
+            x
+            async for x in full_node_1.new_transactions_with_peer_name(
+                announcement, "peer_1"
+            )
+        ]
+        assert len(msgs) == 1
+        assert msgs[0].message.data == fnp.RequestTransactions(new_ids)
+
+        # Another peer announcing them does not request them again
+        msgs = [
+            x
+            async for x in full_node_1.new_transactions_with_peer_name(
+                announcement, "peer_2"
+            )
+        ]
+        assert len(msgs) == 0
+
+        msgs = [
+            x
+            async for x in full_node_1.request_transactions(
+                fnp.RequestTransactions([spend_bundle.name(), new_ids[0]])
+            )
+        ]
+        assert [msg.message.data for msg in msgs] == [
+            fnp.RespondTransaction(spend_bundle),
+            fnp.RejectTransactionRequest(new_ids[0]),
+        ]
+
     @pytest.mark.asyncio
     async def test_respond_transaction_fail(self, two_nodes, wallet_blocks):
         full_node_1, full_node_2, server_1, server_2 = two_nodes
@@ -808,7 +870,7 @@ class TestWalletProtocol:
                 wallet_protocol.SendTransaction(spend_bundle)
             )
         ]
-        assert len(msgs) == 2
+        assert len(msgs) == 1
 
         wallet_message = None
         for msg in msgs:
@@ -826,7 +888,7 @@ class TestWalletProtocol:
                 wallet_protocol.SendTransaction(spend_bundle)
             )
         ]
-        assert len(msgs) == 2
+        assert len(msgs) == 1
         ack_msg = None
         for msg in msgs:
             if msg.message.function == "transaction_ack":
@@ -4,6 +4,7 @@ from typing import List, Tuple
 
 import pytest
 
+from src.full_node.mempool_manager import pre_validate_spendbundle
 from src.server.outbound_message import OutboundMessage
 from src.protocols import full_node_protocol
 from src.types.coin_solution import CoinSolution
@@ -16,6 +17,7 @@ from src.util.condition_tools import (
     conditions_by_opcode,
     pkm_pairs_for_conditions_dict,
 )
+from src.util.bundle_tools import best_solution_program
 from src.util.clvm import int_to_bytes
 from src.util.ints import uint64
 from tests.setup_nodes import setup_two_nodes, test_constants, bt
@@ -663,16 +665,11 @@ class TestMempool:
             spend_bundle1
         )
 
-        outbound_messages: List[OutboundMessage] = []
-        async for outbound in full_node_1.respond_transaction(tx1):
-            outbound_messages.append(outbound)
-
-        new_transaction = False
-        for msg in outbound_messages:
-            if msg.message.function == "new_transaction":
-                new_transaction = True
+        async for _ in full_node_1.respond_transaction(tx1):
+            pass
 
-        assert new_transaction
+        # Queued to be announced to the peers
+        assert spend_bundle1.name() in full_node_1.transaction_inventory.queue
 
         mempool_bundle = full_node_1.mempool_manager.get_spendbundle(
             spend_bundle1.name()
@@ -881,3 +878,146 @@ class TestMempool:
 
         sb = full_node_1.mempool_manager.get_spendbundle(spend_bundle.name())
         assert sb is spend_bundle
+
+    @pytest.mark.asyncio
+    async def test_new_tip_keeps_items(self, two_nodes):
+        num_blocks = 3
+        wallet_a = bt.get_pool_wallet_tool()
+        receiver_puzzlehash = WalletTool().get_new_puzzlehash()
+
+        blocks = bt.get_consecutive_blocks(test_constants, num_blocks, [], 10, b"")
+        full_node_1, full_node_2, server_1, server_2 = two_nodes
+
+        for block in blocks:
+            async for _ in full_node_1.respond_block(
+                full_node_protocol.RespondBlock(block)
+            ):
+                pass
+
+        spend_bundles = []
+        for block in blocks[1:3]:
+            spend_bundle = wallet_a.generate_signed_transaction(
+                1000, receiver_puzzlehash, block.get_coinbase()
+            )
+            assert spend_bundle is not None
+            async for _ in full_node_1.respond_transaction(
+                full_node_protocol.RespondTransaction(spend_bundle)
+            ):
+                pass
+            spend_bundles.append(spend_bundle)
+        included, kept = spend_bundles
+
+        mempool_manager = full_node_1.mempool_manager
+        old_tip = blocks[-1]
+        old_pool = mempool_manager.mempools[old_tip.header_hash]
+        assert len(mempool_manager.items) == 2
+
+        program = best_solution_program(included)
+        dic_h = {num_blocks + 1: (program, included.aggregated_signature)}
+        new_blocks = bt.get_consecutive_blocks(
+            test_constants, 1, blocks, 10, b"", None, dic_h
+        )
+        new_tip = new_blocks[num_blocks + 1]
+        async for _ in full_node_1.respond_block(
+            full_node_protocol.RespondBlock(new_tip)
+        ):
+            pass
+
+        # The pool of the new tip starts from the pool of its parent, which is still a tip
+        new_pool = mempool_manager.mempools[new_tip.header_hash]
+        assert new_pool is not old_pool
+        assert list(new_pool.spends.keys()) == [kept.name()]
+        assert mempool_manager.mempools[old_tip.header_hash] is old_pool
+        assert len(old_pool.spends) == 2
+        assert mempool_manager.item_pool_counts[kept.name()] == 3
+        assert mempool_manager.get_spendbundle(kept.name()) is kept
+
+    @pytest.mark.asyncio
+    async def test_new_tip_removes_descendants(self, two_nodes):
+        num_blocks = 3
+        wallet_a = bt.get_pool_wallet_tool()
+        receiver_puzzlehash = WalletTool().get_new_puzzlehash()
+
+        blocks = bt.get_consecutive_blocks(test_constants, num_blocks, [], 10, b"")
+        full_node_1, full_node_2, server_1, server_2 = two_nodes
+
+        for block in blocks:
+            async for _ in full_node_1.respond_block(
+                full_node_protocol.RespondBlock(block)
+            ):
+                pass
+
+        # The child spends a coin created by the parent, which is not in a block yet
+        parent = wallet_a.generate_signed_transaction(
+            1000, wallet_a.get_new_puzzlehash(), blocks[1].get_coinbase()
+        )
+        assert parent is not None
+        parent_coin = [coin for coin in parent.additions() if coin.amount == 1000][0]
+        child = wallet_a.generate_signed_transaction(
+            1000, receiver_puzzlehash, parent_coin
+        )
+        assert child is not None
+        for spend_bundle in (parent, child):
+            async for _ in full_node_1.respond_transaction(
+                full_node_protocol.RespondTransaction(spend_bundle)
+            ):
+                pass
+            # Queued to be announced to the peers
+            assert spend_bundle.name() in full_node_1.transaction_inventory.queue
+
+        # A block which includes the parent, and one which spends its coin differently
+        conflicting = wallet_a.generate_signed_transaction(
+            500, receiver_puzzlehash, blocks[1].get_coinbase()
+        )
+        assert conflicting is not None
+        tips = []
+        for spend_bundle, seed in ((parent, b"1"), (conflicting, b"2")):
+            program = best_solution_program(spend_bundle)
+            dic_h = {num_blocks + 1: (program, spend_bundle.aggregated_signature)}
+            new_blocks = bt.get_consecutive_blocks(
+                test_constants, 1, blocks[:], 10, seed, None, dic_h
+            )
+            tips.append(new_blocks[num_blocks + 1])
+            async for _ in full_node_1.respond_block(
+                full_node_protocol.RespondBlock(tips[-1])
+            ):
+                pass
+
+        mempools = full_node_1.mempool_manager.mempools
+        assert list(mempools[tips[0].header_hash].spends.keys()) == [child.name()]
+        assert len(mempools[tips[1].header_hash].spends) == 0
+        assert len(mempools[blocks[-1].header_hash].spends) == 2
+        # The parent was confirmed in the next block, the child is still tracked
+        fee_estimator = full_node_1.mempool_manager.fee_estimator
+        assert list(fee_estimator.pending.keys()) == [child.name()]
+        assert sum(fee_estimator.confirmed[0]) == sum(fee_estimator.totals) > 0
+
+    def test_pre_validate_spendbundle(self):
+        wallet_a = bt.get_pool_wallet_tool()
+        receiver_puzzlehash = WalletTool().get_new_puzzlehash()
+        blocks = bt.get_consecutive_blocks(test_constants, 2, [], 10, b"")
+
+        spend_bundle = wallet_a.generate_signed_transaction(
+            1000, receiver_puzzlehash, blocks[1].get_coinbase()
+        )
+        assert spend_bundle is not None
+        error, npc_list, cost, validates = pre_validate_spendbundle(
+            bytes(spend_bundle), test_constants["CLVM_COST_RATIO_CONSTANT"]
+        )
+        assert error is None
+        assert [npc[0] for npc in npc_list] == spend_bundle.removal_names()
+        assert cost > 0
+        assert validates
+
+        other_bundle = wallet_a.generate_signed_transaction(
+            1000, receiver_puzzlehash, blocks[2].get_coinbase()
+        )
+        assert other_bundle is not None
+        bad_signature = SpendBundle(
+            spend_bundle.coin_solutions, other_bundle.aggregated_signature
+        )
+        error, npc_list, cost, validates = pre_validate_spendbundle(
+            bytes(bad_signature), test_constants["CLVM_COST_RATIO_CONSTANT"]
+        )
+        assert error is None
+        assert not validates
@@ -0,0 +1,57 @@
+import unittest
+
+from blspy import AugSchemeMPL, PrivateKey
+
+from src.full_node.signature_cache import SignatureCache
+
+
+def signed_pairs(seed: int, count: int):
+    sks = [PrivateKey.from_seed(bytes([seed, i]) * 16) for i in range(count)]
+    pks = [sk.get_g1() for sk in sks]
+    msgs = [bytes([seed, i]) * 8 for i in range(count)]
+    sig = AugSchemeMPL.aggregate(
+        [AugSchemeMPL.sign(sk, msg) for sk, msg in zip(sks, msgs)]
+    )
+    return pks, msgs, sig
+
+
+class TestSignatureCache(unittest.TestCase):
+    def test_aggregate_verify(self):
+        cache = SignatureCache()
+        bundle_1 = signed_pairs(1, 2)
+        bundle_2 = signed_pairs(2, 3)
+        pool = signed_pairs(3, 1)
+        assert cache.aggregate_verify(*bundle_1)
+        cache.add(*bundle_1)
+        assert cache.aggregate_verify(*bundle_1)
+        _, _, wrong_sig = signed_pairs(4, 2)
+        assert not cache.aggregate_verify(bundle_1[0], bundle_1[1], wrong_sig)
+
+        # An aggregate of a cached bundle, an unknown bundle and a single pair
+        pks = pool[0] + bundle_1[0] + bundle_2[0]
+        msgs = pool[1] + bundle_1[1] + bundle_2[1]
+        sig = AugSchemeMPL.aggregate([pool[2], bundle_1[2], bundle_2[2]])
+        assert cache.aggregate_verify(pks, msgs, sig)
+        assert not cache.aggregate_verify(pks, msgs, bundle_2[2])
+        assert not cache.aggregate_verify(pks[:-1], msgs[:-1], sig)
+        cache.add(*bundle_2)
+        assert cache.aggregate_verify(pks, msgs, sig)
+        assert not cache.aggregate_verify(pks, msgs, bundle_1[2])
+        # Only part of a cached bundle is in the aggregate
+        pks = pool[0] + bundle_1[0] + bundle_2[0][:2]
+        msgs = pool[1] + bundle_1[1] + bundle_2[1][:2]
+        assert not cache.aggregate_verify(pks, msgs, sig)
+
+    def test_eviction(self):
+        cache = SignatureCache(capacity=2)
+        bundles = [signed_pairs(i, 2) for i in range(3)]
+        for bundle in bundles:
+            cache.add(*bundle)
+        assert len(cache.bundles) == 2
+        assert len(cache.bundle_for_pair) == 4
+        for bundle in bundles:
+            assert cache.aggregate_verify(*bundle)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,73 @@
+import asyncio
+
+import aiosqlite
+import pytest
+
+from src.full_node.block_store import BlockStore
+from src.full_node.blockchain import Blockchain
+from src.full_node.coin_store import CoinStore
+from src.full_node.sync_blocks_processor import SyncBlocksProcessor
+from src.full_node.sync_store import SyncStore
+from src.util.ints import uint32
+from tests.setup_nodes import test_constants, bt
+
+
+@pytest.fixture(scope="module")
+def event_loop():
+    loop = asyncio.get_event_loop()
+    yield loop
+
+
+async def setup_sync(blocks):
+    """ A blockchain with only the genesis block, and all the blocks received for sync. """
+    connection = await aiosqlite.connect(":memory:")
+    coin_store = await CoinStore.create(connection)
+    block_store = await BlockStore.create(connection)
+    blockchain = await Blockchain.create(coin_store, block_store, test_constants)
+    sync_store = await SyncStore.create()
+    sync_store.set_sync_mode(True)
+    sync_store.set_potential_hashes([block.header_hash for block in blocks])
+    for block in blocks[1:]:
+        sync_store.potential_blocks[block.height] = block
+        sync_store.potential_blocks_received[block.height] = asyncio.Event()
+        sync_store.potential_blocks_received[block.height].set()
+    return connection, blockchain, sync_store
+
+
+class TestSyncBlocksProcessor:
+    @pytest.mark.asyncio
+    async def test_process(self):
+        blocks = bt.get_consecutive_blocks(test_constants, 25, [], 10)
+        connection, blockchain, sync_store = await setup_sync(blocks)
+        processor = SyncBlocksProcessor(sync_store, uint32(0), uint32(25), blockchain)
+        await processor.process()
+
+        assert max(h.height for h in blockchain.get_current_tips()) == 25
+        assert len(sync_store.potential_blocks) == 0
+        metrics = processor.get_metrics()
+        for stage in ("fetch", "pre_validate", "apply"):
+            assert metrics[f"{stage}_blocks"] == 25
+        assert metrics["queue_depth"] == 0
+        assert 1 <= metrics["max_queue_depth"] <= processor.PIPELINE_DEPTH
+
+        # The blocks were written to the store
+        assert await blockchain.block_store.get_block(blocks[25].header_hash) == (
+            blocks[25]
+        )
+        blockchain.shut_down()
+        await connection.close()
+
+    @pytest.mark.asyncio
+    async def test_invalid_block(self):
+        blocks = bt.get_consecutive_blocks(test_constants, 25, [], 10)
+        blocks_alt = bt.get_consecutive_blocks(test_constants, 25, [], 10, b"1")
+        blocks[15] = blocks_alt[15]
+        connection, blockchain, sync_store = await setup_sync(blocks)
+        processor = SyncBlocksProcessor(sync_store, uint32(0), uint32(25), blockchain)
+        with pytest.raises(RuntimeError):
+            await processor.process()
+
+        # The blocks before the invalid one were added and committed
+        assert max(h.height for h in blockchain.get_current_tips()) == 14
+        blockchain.shut_down()
+        await connection.close()
@@ -0,0 +1,62 @@
+import unittest
+from secrets import token_bytes
+
+from src.full_node import transaction_inventory
+from src.full_node.transaction_inventory import TransactionInventory
+from src.types.sized_bytes import bytes32
+from src.util.ints import uint64
+
+
+def new_ids(count: int):
+    return [bytes32(token_bytes(32)) for _ in range(count)]
+
+
+class TestTransactionInventory(unittest.TestCase):
+    def test_announcements(self):
+        inventory = TransactionInventory()
+        ids = new_ids(3)
+        for transaction_id in ids:
+            inventory.add_transaction(transaction_id, uint64(100), uint64(10))
+        # The first peer announced one of them to us
+        inventory.mark_known("peer_1", ids[:1])
+
+        announcements = inventory.pop_announcements(["peer_1", "peer_2"])
+        assert [entry[0] for entry in announcements["peer_1"][0]] == ids[1:]
+        assert [entry[0] for entry in announcements["peer_2"][0]] == ids
+        assert announcements["peer_2"][0][0] == (ids[0], 100, 10)
+
+        # Each id is only announced once to each peer
+        inventory.add_transaction(ids[0], uint64(100), uint64(10))
+        assert inventory.pop_announcements(["peer_1", "peer_2"]) == {}
+        # Peers which disconnected are forgotten
+        inventory.add_transaction(ids[0], uint64(100), uint64(10))
+        assert list(inventory.pop_announcements(["peer_2", "peer_3"]).keys()) == [
+            "peer_3"
+        ]
+        assert set(inventory.known.keys()) == {"peer_2", "peer_3"}
+
+    def test_batches(self):
+        inventory = TransactionInventory()
+        count = transaction_inventory.MAX_INVENTORY_PER_MESSAGE + 1
+        for transaction_id in new_ids(count):
+            inventory.add_transaction(transaction_id, uint64(100), uint64(10))
+        batches = inventory.pop_announcements(["peer_1"])["peer_1"]
+        assert [len(batch) for batch in batches] == [count - 1, 1]
+
+    def test_to_request(self):
+        inventory = TransactionInventory()
+        ids = new_ids(3)
+        assert inventory.to_request(ids[:2] + ids[:1]) == ids[:2]
+        # Requested from another peer, and not timed out yet
+        assert inventory.to_request(ids) == ids[2:]
+
+        timeout = transaction_inventory.REQUEST_TIMEOUT
+        transaction_inventory.REQUEST_TIMEOUT = 0
+        try:
+            assert inventory.to_request(ids) == ids
+        finally:
+            transaction_inventory.REQUEST_TIMEOUT = timeout
+
+
+if __name__ == "__main__":
+    unittest.main()
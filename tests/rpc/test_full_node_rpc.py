@@ -94,6 +94,10 @@ class TestRpc:
             )
             assert len(coins_lca) == 3
 
+            estimate = await client.get_fee_estimate(1, 1000)
+            assert estimate["fee_per_cost"] is None
+            assert estimate["fee"] is None
+
             assert len(await client.get_connections()) == 0
 
             await client.open_connection("localhost", server_2._port)
@@ -0,0 +1,98 @@
+import asyncio
+import unittest
+from typing import List
+
+from src.server.handler_scheduler import HandlerScheduler
+
+
+async def run_handler(
+    scheduler: HandlerScheduler,
+    connection: str,
+    function: str,
+    log: List[str],
+    release: asyncio.Event,
+):
+    ticket = await scheduler.admit(connection, function)
+
+    async def handler():
+        async with ticket:
+            log.append(f"start {function}")
+            await release.wait()
+            log.append(f"end {function}")
+
+    return asyncio.create_task(handler())
+
+
+class TestHandlerScheduler(unittest.TestCase):
+    def test_cheap_bypass(self):
+        async def test():
+            scheduler = HandlerScheduler(max_handlers=1, max_handlers_per_peer=1)
+            log: List[str] = []
+            blocked = asyncio.Event()
+            done = asyncio.Event()
+            done.set()
+            first = await run_handler(scheduler, "a", "respond_block", log, blocked)
+            second = await run_handler(
+                scheduler, "b", "respond_unfinished_block", log, done
+            )
+            cheap = await run_handler(scheduler, "b", "request_header", log, done)
+            await asyncio.wait_for(cheap, 1)
+            # The expensive handler waits for the global slot, the query does not
+            assert log == [
+                "start respond_block",
+                "start request_header",
+                "end request_header",
+            ]
+            assert scheduler.get_metrics()["in_flight"] == 1
+
+            blocked.set()
+            await asyncio.wait_for(asyncio.gather(first, second), 1)
+            assert scheduler.get_metrics()["in_flight"] == 0
+            latencies = scheduler.get_metrics()["latencies"]
+            assert latencies["respond_block"]["count"] == 1
+            assert latencies["request_header"]["count"] == 1
+
+        asyncio.run(test())
+
+    def test_ordered(self):
+        async def test():
+            scheduler = HandlerScheduler()
+            log: List[str] = []
+            first_release = asyncio.Event()
+            second_release = asyncio.Event()
+            second_release.set()
+            first = await run_handler(
+                scheduler, "a", "respond_transaction", log, first_release
+            )
+            second = await run_handler(scheduler, "a", "new_tip", log, second_release)
+            # Another peer is not ordered behind peer a
+            other = await run_handler(scheduler, "b", "new_tip", log, second_release)
+            await asyncio.wait_for(other, 1)
+            assert log == ["start respond_transaction", "start new_tip", "end new_tip"]
+
+            first_release.set()
+            await asyncio.wait_for(asyncio.gather(first, second), 1)
+            assert log[3:] == [
+                "end respond_transaction",
+                "start new_tip",
+                "end new_tip",
+            ]
+
+        asyncio.run(test())
+
+    def test_pending(self):
+        async def test():
+            scheduler = HandlerScheduler(max_pending_per_peer=1)
+            log: List[str] = []
+            release = asyncio.Event()
+            first = await run_handler(scheduler, "a", "respond_block", log, release)
+            # The peer is not read until its message is handled
+            admit = asyncio.create_task(scheduler.admit("a", "respond_block"))
+            await asyncio.sleep(0.01)
+            assert not admit.done()
+            release.set()
+            await asyncio.wait_for(first, 1)
+            ticket = await asyncio.wait_for(admit, 1)
+            ticket.release()
+
+        asyncio.run(test())
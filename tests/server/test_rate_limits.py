@@ -0,0 +1,113 @@
+import unittest
+
+from src.server.outbound_message import NodeType
+from src.server.rate_limits import RateLimit, RateLimiter
+
+
+class TestRateLimiter(unittest.TestCase):
+    def test_message_type(self):
+        limiter = RateLimiter({"full_node": {"request_all_header_hashes": [0.5, 2]}})
+        for _ in range(2):
+            assert (
+                limiter.process_message(
+                    "a", NodeType.FULL_NODE, "request_all_header_hashes"
+                )
+                == 0
+            )
+        # Over the burst, so it waits for the bucket to refill
+        delay = limiter.process_message(
+            "a", NodeType.FULL_NODE, "request_all_header_hashes"
+        )
+        assert delay is not None and 1.9 < delay <= 2
+        assert limiter.throttled == 1
+        # Other peers and other messages have their own buckets
+        assert (
+            limiter.process_message("b", NodeType.FULL_NODE, "request_all_header_hashes")
+            == 0
+        )
+        assert limiter.process_message("a", NodeType.FULL_NODE, "request_block") == 0
+
+    def test_total_cost(self):
+        limiter = RateLimiter({"wallet": {"total": [1, 150]}}, 600, 100)
+        assert limiter.limits[NodeType.WALLET]["total"] == RateLimit(1, 150)
+        now = 1000.0
+        assert limiter.process_message("a", NodeType.WALLET, "request_header", now) == 0
+        # Costs 100 of the remaining 149
+        assert (
+            limiter.process_message(
+                "a", NodeType.WALLET, "request_all_proof_hashes", now
+            )
+            == 0
+        )
+        # Owes 51 tokens, so it waits for the bucket to refill
+        delay = limiter.process_message(
+            "a", NodeType.WALLET, "request_mempool_transactions", now
+        )
+        assert delay == 51
+        now += delay
+        delay = limiter.process_message(
+            "a", NodeType.WALLET, "request_all_header_hashes_after", now
+        )
+        assert delay == 20
+        now += delay
+        assert limiter.throttled == 2
+        assert limiter.disconnected == 0
+        # Throttled for more than 100 seconds of the window, so the peer is disconnected
+        assert (
+            limiter.process_message(
+                "a", NodeType.WALLET, "request_all_proof_hashes", now
+            )
+            is None
+        )
+        assert limiter.disconnected == 1
+        limiter.remove_peer("a")
+        assert limiter.buckets == {} and limiter.throttle_windows == {}
+
+    def test_slow_default_limits(self):
+        limiter = RateLimiter()
+        now = 1000.0
+
+        def request(peer):
+            return limiter.process_message(
+                peer, NodeType.FULL_NODE, "request_mempool_transactions", now
+            )
+
+        for _ in range(5):
+            assert request("a") == 0
+        # Over a burst of 5 at one a minute, the peer is throttled. Like the pipeline, it
+        # waits for each delay, and sends its next message a second later.
+        for _ in range(5):
+            delay = request("a")
+            assert delay is not None and 58 < delay <= 60
+            now += delay + 1
+        assert limiter.throttled == 5
+        assert limiter.disconnected == 0
+        # Throttled for more than 300 seconds within 10 minutes
+        assert request("a") is None
+        assert limiter.disconnected == 1
+
+        # A peer which pauses between its bursts starts a new window
+        for _ in range(5):
+            assert request("b") == 0
+        for _ in range(4):
+            delay = request("b")
+            assert delay is not None
+            now += delay + 1
+        now += 600
+        for _ in range(5):
+            assert request("b") == 0
+        for _ in range(4):
+            delay = request("b")
+            assert delay is not None
+            now += delay + 1
+        assert limiter.disconnected == 1
+
+    def test_unlimited(self):
+        limiter = RateLimiter()
+        for _ in range(10000):
+            assert (
+                limiter.process_message("a", NodeType.FARMER, "header_signature") == 0
+            )
+        assert limiter.process_message("a", None, "handshake") == 0
+        limiter.remove_peer("a")
+        assert limiter.buckets == {}
@@ -0,0 +1,59 @@
+import asyncio
+import time
+import unittest
+
+from src.server.outbound_message import Message
+from src.server.send_queue import MessagePriority, SendQueue, message_priority
+
+
+def take_all(queue: SendQueue):
+    async def take():
+        return [(await queue.get()).function for _ in range(queue.size)]
+
+    return asyncio.run(take())
+
+
+class TestSendQueue(unittest.TestCase):
+    def test_priorities(self):
+        assert message_priority("respond_block") == MessagePriority.HIGH
+        assert message_priority("request_header") == MessagePriority.NORMAL
+        assert message_priority("new_transactions") == MessagePriority.LOW
+
+        queue = SendQueue(10)
+        for function in ("new_transactions", "request_header", "respond_block"):
+            assert queue.put(Message(function, None))
+        assert queue.put(Message("new_tip", None))
+        assert take_all(queue) == [
+            "respond_block",
+            "new_tip",
+            "request_header",
+            "new_transactions",
+        ]
+        assert queue.get_metrics()["sent"] == 4
+        assert queue.get_metrics()["max_queued"] == 4
+
+    def test_full(self):
+        queue = SendQueue(2)
+        assert queue.put(Message("new_transactions", None))
+        assert queue.put(Message("request_header", None))
+        # Replaces the lower priority transaction gossip
+        assert queue.put(Message("respond_block", None))
+        # There is nothing of lower priority left to replace
+        assert not queue.put(Message("request_peers", None))
+        metrics = queue.get_metrics()
+        assert metrics["dropped_by_priority"] == {"HIGH": 0, "NORMAL": 1, "LOW": 1}
+        assert metrics["queued"] == 2
+        assert take_all(queue) == ["respond_block", "request_header"]
+
+    def test_stalled(self):
+        queue = SendQueue(1, stalled_timeout=10)
+        assert queue.put(Message("request_header", None))
+        assert not queue.put(Message("request_header", None))
+        assert not queue.is_stalled()
+        assert queue.full_since is not None
+        queue.full_since = time.time() - 11
+        assert queue.is_stalled()
+
+        # The peer took a message, so it is not stalled anymore
+        assert take_all(queue) == ["request_header"]
+        assert not queue.is_stalled()
@@ -4,7 +4,10 @@ import pytest
 
 from src.util.bundle_tools import best_solution_program
 from src.util.cost_calculator import calculate_cost_of_program
-from src.util.mempool_check_conditions import get_name_puzzle_conditions
+from src.util.mempool_check_conditions import (
+    get_name_puzzle_conditions,
+    get_name_puzzle_conditions_cached,
+)
 from tests.setup_nodes import test_constants, bt
 from src.util.wallet_tools import WalletTool
 
@@ -42,3 +45,10 @@ class TestCostCalculation:
         assert (
             clvm_cost == 200 * ratio + 20 * ratio + len(bytes(program)) * ratio + cost
         )
+
+        # The cached path returns the same result, and does not run the program again
+        generator_hash = program.get_tree_hash()
+        cached = get_name_puzzle_conditions_cached(program, generator_hash)
+        assert cached == (error, npc_list, cost)
+        assert get_name_puzzle_conditions_cached(program, generator_hash) is cached
+        assert calculate_cost_of_program(program, ratio, generator_hash)[2] == clvm_cost
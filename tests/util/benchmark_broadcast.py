@@ -0,0 +1,99 @@
+import asyncio
+import logging
+import time
+from typing import List, Tuple
+
+from src.protocols import full_node_protocol
+from src.protocols.protocol_message_types import MESSAGE_TYPES
+from src.server.connection import ChiaConnection, EncodedMessage
+from src.server.outbound_message import Message, NodeType
+from src.types.full_block import FullBlock
+from tests.setup_nodes import test_constants, bt
+
+
+class NullSocket:
+    def getsockname(self) -> Tuple[str, int]:
+        return ("127.0.0.1", 8444)
+
+
+class NullWriter:
+    """ A StreamWriter which discards everything written to it. """
+
+    def __init__(self, port: int):
+        self.port = port
+        self.written = 0
+
+    def get_extra_info(self, name: str):
+        if name == "socket":
+            return NullSocket()
+        return ("127.0.0.1", self.port)
+
+    def write(self, data: bytes) -> None:
+        self.written += len(data)
+
+    async def drain(self) -> None:
+        pass
+
+    def is_closing(self) -> bool:
+        return False
+
+
+def connections(count: int, binary: bool) -> List[ChiaConnection]:
+    result = []
+    for index in range(count):
+        connection = ChiaConnection(
+            NodeType.FULL_NODE,
+            NodeType.FULL_NODE,
+            None,  # type: ignore
+            NullWriter(10000 + index),  # type: ignore
+            8444,
+            None,
+            logging.getLogger(__name__),
+        )
+        if binary:
+            connection.peer_binary_message_types = len(MESSAGE_TYPES)
+        result.append(connection)
+    return result
+
+
+async def broadcast(block_bytes: bytes, peers: List[ChiaConnection], shared: bool):
+    # A new block object each time, so its serialization is not memoized yet
+    message = Message(
+        "respond_block",
+        full_node_protocol.RespondBlock(FullBlock.from_bytes(block_bytes)),
+    )
+    if shared:
+        encoded = EncodedMessage(message)
+        for peer in peers:
+            await peer.send(encoded)
+    else:
+        for peer in peers:
+            await peer.send(message)
+
+
+async def main():
+    """
+    Compares the cost of broadcasting a block when each peer encodes the message, against
+    encoding it once and sharing the bytes, for CBOR and binary framing.
+    """
+    blocks = bt.get_consecutive_blocks(test_constants, 10, [], 10)
+    block_bytes = bytes(blocks[-1])
+    repeats = 20
+    print(f"Broadcast of a {len(block_bytes)} byte block, {repeats} times")
+    for binary in (False, True):
+        for peer_count in (1, 10, 50, 200):
+            peers = connections(peer_count, binary)
+            times = []
+            for shared in (False, True):
+                start = time.time()
+                for _ in range(repeats):
+                    await broadcast(block_bytes, peers, shared)
+                times.append((time.time() - start) / repeats)
+            print(
+                f"  {'binary' if binary else 'cbor':6} {peer_count:4} peers: "
+                f"per peer {times[0] * 1000:8.2f}ms, shared {times[1] * 1000:8.2f}ms"
+            )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
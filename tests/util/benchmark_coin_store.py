@@ -0,0 +1,129 @@
+import asyncio
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import aiosqlite
+
+from src.full_node.coin_store import CoinStore
+from src.types.coin import Coin
+from src.types.coin_record import CoinRecord
+from src.types.sized_bytes import bytes32
+from src.util.ints import uint32
+
+# The version 0 coin_record schema. The puzzle_hash index reused the name coin_spent,
+# so it was never created.
+HEX_SCHEMA = [
+    "CREATE TABLE coin_record(coin_name text PRIMARY KEY, confirmed_index bigint,"
+    " spent_index bigint, spent int, coinbase int, puzzle_hash text, coin_parent text,"
+    " amount bigint)",
+    "CREATE INDEX coin_confirmed_index on coin_record(confirmed_index)",
+    "CREATE INDEX coin_spent_index on coin_record(spent_index)",
+    "CREATE INDEX coin_spent on coin_record(spent)",
+]
+
+
+def random_rows(count: int) -> List[Tuple]:
+    """ Coin records spread over 200k blocks, a third of them spent. """
+    rng = random.Random(0)
+    rows = []
+    for _ in range(count):
+        confirmed = rng.randint(1, 200000)
+        spent = rng.randint(confirmed, 200000) if rng.random() < 0.33 else 0
+        rows.append(
+            (
+                rng.getrandbits(256).to_bytes(32, "big"),
+                confirmed,
+                spent,
+                int(spent > 0),
+                0,
+                rng.getrandbits(256).to_bytes(32, "big"),
+                rng.getrandbits(256).to_bytes(32, "big"),
+                rng.randint(1, 2 ** 40),
+            )
+        )
+    return rows
+
+
+def hex_row(row: Tuple) -> Tuple:
+    return (row[0].hex(),) + row[1:5] + (row[5].hex(), row[6].hex(), row[7])
+
+
+def table_sizes(db_path: Path) -> Dict[str, int]:
+    """ Bytes used by each table and index, if sqlite was built with dbstat. """
+    connection = sqlite3.connect(db_path)
+    try:
+        rows = connection.execute(
+            "SELECT name, SUM(pgsize) FROM dbstat GROUP BY name"
+        ).fetchall()
+    except sqlite3.OperationalError:
+        rows = []
+    connection.close()
+    return {name: size for name, size in rows}
+
+
+async def hex_get_coin_record(
+    connection: aiosqlite.Connection, coin_name: bytes32
+) -> Optional[CoinRecord]:
+    """ The version 0 CoinStore.get_coin_record, without the cache. """
+    cursor = await connection.execute(
+        "SELECT * from coin_record WHERE coin_name=?", (coin_name.hex(),)
+    )
+    row = await cursor.fetchone()
+    await cursor.close()
+    if row is not None:
+        coin = Coin(
+            bytes32(bytes.fromhex(row[6])), bytes32(bytes.fromhex(row[5])), row[7]
+        )
+        return CoinRecord(coin, row[1], row[2], row[3], row[4])
+    return None
+
+
+def report(name: str, db_path: Path, lookup_time: float):
+    print(f"{name}: file {db_path.stat().st_size / 2 ** 20:.1f}MiB")
+    for table, size in sorted(table_sizes(db_path).items()):
+        print(f"  {table}: {size / 2 ** 20:.1f}MiB")
+    print(f"  get_coin_record: {lookup_time * 1e6:.1f}us")
+
+
+async def main(count: int, lookups: int):
+    rows = random_rows(count)
+    names = [bytes32(row[0]) for row in random.Random(1).sample(rows, lookups)]
+    insert = "INSERT INTO coin_record VALUES(?, ?, ?, ?, ?, ?, ?, ?)"
+
+    with tempfile.TemporaryDirectory() as directory:
+        hex_path = Path(directory) / "hex.db"
+        connection = await aiosqlite.connect(hex_path)
+        for statement in HEX_SCHEMA:
+            await connection.execute(statement)
+        await connection.executemany(insert, [hex_row(row) for row in rows])
+        await connection.commit()
+        start = time.time()
+        for name in names:
+            assert await hex_get_coin_record(connection, name) is not None
+        hex_time = (time.time() - start) / lookups
+        await connection.close()
+
+        blob_path = Path(directory) / "blob.db"
+        connection = await aiosqlite.connect(blob_path)
+        coin_store = await CoinStore.create(connection, cache_size=uint32(0))
+        await connection.executemany(insert, rows)
+        await connection.commit()
+        start = time.time()
+        for name in names:
+            assert await coin_store.get_coin_record(name) is not None
+        blob_time = (time.time() - start) / lookups
+        await connection.close()
+
+        print(f"{count} coin records, {lookups} random lookups")
+        report("hex text (version 0)", hex_path, hex_time)
+        report("blob (version 1)", blob_path, blob_time)
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    asyncio.run(main(count, 10000))
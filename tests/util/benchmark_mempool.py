@@ -0,0 +1,140 @@
+import asyncio
+import dataclasses
+import random
+import sys
+import time
+from typing import List, Tuple
+
+import aiosqlite
+from blspy import G2Element
+
+from src.consensus.constants import constants
+from src.full_node.coin_store import CoinStore
+from src.full_node.mempool import Mempool
+from src.full_node.mempool_manager import MempoolManager
+from src.types.coin import Coin
+from src.types.coin_solution import CoinSolution
+from src.types.full_block import FullBlock
+from src.types.header import Header
+from src.types.mempool_item import MempoolItem
+from src.types.program import Program
+from src.types.sized_bytes import bytes32
+from src.types.spend_bundle import SpendBundle
+from src.util.ints import uint32, uint64
+
+
+def random_items(rng: random.Random, count: int) -> List[MempoolItem]:
+    """ Items which each spend one confirmed coin, and create one coin. """
+    items = []
+    for _ in range(count):
+        coin = Coin(
+            bytes32(rng.getrandbits(256).to_bytes(32, "big")),
+            bytes32(rng.getrandbits(256).to_bytes(32, "big")),
+            uint64(rng.randint(1000, 2 ** 40)),
+        )
+        addition = Coin(coin.name(), coin.puzzle_hash, uint64(coin.amount - 1000))
+        spend_bundle = SpendBundle([CoinSolution(coin, Program.to([]))], G2Element())
+        cost = uint64(rng.randint(1000, 100000))
+        items.append(
+            MempoolItem(
+                spend_bundle, 1000 / cost, uint64(1000), cost, [], [addition], [coin]
+            )
+        )
+    return items
+
+
+def child_header(header: Header, rng: random.Random) -> Header:
+    """ A header at the next height, only the hash and the height are used. """
+    data = dataclasses.replace(
+        header.data,
+        height=uint32(header.height + 1),
+        prev_header_hash=header.header_hash,
+        generator_hash=bytes32(rng.getrandbits(256).to_bytes(32, "big")),
+    )
+    return dataclasses.replace(header, data=data)
+
+
+def block_spends(
+    rng: random.Random, pool: Mempool, spends: int
+) -> Tuple[List[bytes32], List[Coin]]:
+    """
+    The removals and additions of a block which includes half of the spends from the pool,
+    and spends the coins of the other half differently.
+    """
+    removals: List[bytes32] = []
+    additions: List[Coin] = []
+    for index, item in enumerate(rng.sample(list(pool.spends.values()), spends)):
+        removals.append(item.removals[0].name())
+        if index % 2 == 0:
+            additions.extend(item.additions)
+        else:
+            additions.append(
+                Coin(item.removals[0].name(), bytes32(bytes(32)), uint64(1))
+            )
+    return removals, additions
+
+
+async def main(count: int, blocks: int, spends: int):
+    rng = random.Random(0)
+    items = random_items(rng, count)
+    connection = await aiosqlite.connect(":memory:")
+    coin_store = await CoinStore.create(connection)
+    await connection.executemany(
+        "INSERT INTO coin_record VALUES(?, ?, ?, ?, ?, ?, ?, ?)",
+        [
+            (
+                item.removals[0].name(),
+                1,
+                0,
+                0,
+                0,
+                item.removals[0].puzzle_hash,
+                item.removals[0].parent_coin_info,
+                item.removals[0].amount,
+            )
+            for item in items
+        ],
+    )
+    await connection.commit()
+    mempool_manager = MempoolManager(coin_store, constants, validation_workers=0)
+
+    header = FullBlock.from_bytes(constants["GENESIS_BLOCK"]).header
+    pool = Mempool.create(header, uint32(count))
+    start = time.time()
+    for item in items:
+        error, _ = await mempool_manager.add_item_to_pool(item, pool)
+        assert error is None
+    build_time = time.time() - start
+    mempool_manager.mempools = {header.header_hash: pool}
+
+    copy_time = 0.0
+    update_time = 0.0
+    removed_count = 0
+    for _ in range(blocks):
+        removals, additions = block_spends(rng, pool, spends)
+        header = child_header(header, rng)
+        start = time.time()
+        new_pool = pool.copy(header)
+        copy_time += time.time() - start
+        start = time.time()
+        removed = mempool_manager.remove_block_spends(new_pool, removals, additions)
+        update_time += time.time() - start
+        removed_count += len(removed)
+        pool = new_pool
+
+    print(f"{count} items, {blocks} blocks spending {spends} of their coins")
+    print(
+        f"  add the items to a new pool, as when it is rebuilt: {build_time * 1000:.1f}ms"
+    )
+    print(f"  copy the pool of the parent: {copy_time / blocks * 1000:.1f}ms/block")
+    print(
+        f"  remove the spends of a block: {update_time / blocks * 1000:.1f}ms/block,"
+        f" {removed_count / blocks:.0f} items"
+    )
+    mempool_manager.shut_down()
+    await connection.close()
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 60000
+    asyncio.run(main(count, 20, 1000))
@@ -0,0 +1,126 @@
+import io
+import time
+from typing import Any, BinaryIO, Callable, get_type_hints
+
+from src.types.challenge import Challenge
+from src.types.full_block import FullBlock
+from src.types.header_block import HeaderBlock
+from src.types.spend_bundle import SpendBundle
+from src.util.bundle_tools import best_solution_program
+from src.util.hash import std_hash
+from src.util.streamable import Streamable, compile_streamer
+from src.util.wallet_tools import WalletTool
+from tests.setup_nodes import test_constants, bt
+
+
+class ReflectiveCodec(Streamable):
+    """
+    The serialization path that walks the type hints of every object on every call, as
+    Streamable did before the per-class codecs. Used as the baseline of this benchmark.
+    """
+
+    @classmethod
+    def parse_one_item(cls, f_type: Any, f: BinaryIO):  # type: ignore
+        if isinstance(f_type, type) and issubclass(f_type, Streamable):
+            return reflective_parse(f_type, f)
+        return super().parse_one_item(f_type, f)
+
+    def stream_one_item(self, f_type: Any, item, f: BinaryIO) -> None:
+        if isinstance(f_type, type) and issubclass(f_type, Streamable):
+            reflective_stream(item, f)
+        else:
+            super().stream_one_item(f_type, item, f)
+
+
+def reflective_parse(cls: Any, f: BinaryIO) -> Any:
+    values = []
+    for _, f_type in get_type_hints(cls).items():
+        values.append(ReflectiveCodec.parse_one_item(f_type, f))
+    return cls(*values)
+
+
+def reflective_stream(obj: Any, f: BinaryIO) -> None:
+    codec = ReflectiveCodec()
+    for f_name, f_type in get_type_hints(obj).items():
+        codec.stream_one_item(f_type, getattr(obj, f_name), f)
+
+
+def time_per_call(function: Callable, iterations: int) -> float:
+    start = time.time()
+    for _ in range(iterations):
+        function()
+    return (time.time() - start) / iterations
+
+
+def compare(name: str, obj: Any, iterations: int):
+    cls = type(obj)
+    blob = bytes(obj)
+
+    f = io.BytesIO()
+    reflective_stream(obj, f)
+    assert f.getvalue() == blob
+    assert reflective_parse(cls, io.BytesIO(blob)) == cls.from_bytes(blob) == obj
+    assert cls.parse(io.BytesIO(blob)) == obj
+
+    old_parse = time_per_call(
+        lambda: reflective_parse(cls, io.BytesIO(blob)), iterations
+    )
+    stream_parse = time_per_call(lambda: cls.parse(io.BytesIO(blob)), iterations)
+    new_parse = time_per_call(lambda: cls.from_bytes(blob), iterations)
+    old_stream = time_per_call(lambda: reflective_stream(obj, io.BytesIO()), iterations)
+    # Calls the compiled streamer directly, since bytes(obj) is memoized
+    stream_fields = compile_streamer(cls)
+    new_stream = time_per_call(lambda: stream_fields(obj, io.BytesIO()), iterations)
+
+    print(f"{name} ({len(blob)} bytes)")
+    print(
+        f"  parse:  reflective {old_parse * 1e6:.1f}us, compiled {stream_parse * 1e6:.1f}us,"
+        f" memoryview {new_parse * 1e6:.1f}us, speedup {old_parse / new_parse:.2f}x"
+    )
+    print(
+        f"  stream: reflective {old_stream * 1e6:.1f}us, compiled {new_stream * 1e6:.1f}us,"
+        f" speedup {old_stream / new_stream:.2f}x"
+    )
+
+
+if __name__ == "__main__":
+    """
+    Compares the compiled Streamable codecs against walking the type hints on every call,
+    for the objects that dominate serialization on a full node.
+    """
+    wallet_a = WalletTool()
+    wallet_receiver = WalletTool()
+    blocks = bt.get_consecutive_blocks(
+        test_constants, 3, [], 10, b"", wallet_a.get_new_puzzlehash()
+    )
+    spend_bundle = wallet_a.generate_signed_transaction(
+        1000, wallet_receiver.get_new_puzzlehash(), blocks[1].get_coinbase()
+    )
+    assert spend_bundle is not None
+    dic_h = {
+        4: (best_solution_program(spend_bundle), spend_bundle.aggregated_signature)
+    }
+    blocks = bt.get_consecutive_blocks(
+        test_constants, 1, blocks, 10, transaction_data_at_height=dic_h
+    )
+
+    full_block: FullBlock = blocks[-1]
+    assert full_block.proof_of_time is not None
+    assert full_block.transactions_generator is not None
+    challenge = Challenge(
+        full_block.proof_of_space.challenge_hash,
+        std_hash(
+            full_block.proof_of_space.get_hash()
+            + full_block.proof_of_time.output.get_hash()
+        ),
+        None,
+    )
+    header_block = HeaderBlock(
+        full_block.proof_of_space,
+        full_block.proof_of_time,
+        challenge,
+        full_block.header,
+    )
+    compare("FullBlock", full_block, 1000)
+    compare("HeaderBlock", header_block, 1000)
+    compare("SpendBundle", SpendBundle.from_bytes(bytes(spend_bundle)), 1000)
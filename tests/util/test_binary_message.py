@@ -0,0 +1,63 @@
+import unittest
+
+import pytest
+
+from src.protocols import full_node_protocol, shared_protocol, wallet_protocol
+from src.protocols.protocol_message_types import MESSAGE_TYPES
+from src.server.outbound_message import Message
+from src.types.mempool_inclusion_status import MempoolInclusionStatus
+from src.util import binary_message
+from src.util.errors import ProtocolError
+from src.util.streamable import compile_streamer, compile_view_parser
+from tests.setup_nodes import test_constants, bt
+
+
+class TestBinaryMessage(unittest.TestCase):
+    def test_all_message_types_compile(self):
+        for _, cls in MESSAGE_TYPES:
+            compile_streamer(cls)
+            compile_view_parser(cls)
+
+    def test_round_trip(self):
+        blocks = bt.get_consecutive_blocks(test_constants, 2, [], 10)
+        message = Message("respond_block", full_node_protocol.RespondBlock(blocks[2]))
+        encoded = binary_message.dumps(message, len(MESSAGE_TYPES))
+        assert encoded[:2] != b"\x00\x00"
+        assert encoded[2:] == bytes(blocks[2])
+
+        decoded = binary_message.loads(encoded)
+        assert decoded.function == "respond_block"
+        assert decoded.data == message.data
+        assert type(decoded.data) is full_node_protocol.RespondBlock
+
+    def test_cbor_fallback(self):
+        ping = Message("ping", shared_protocol.Ping(bytes([1] * 32)))
+        # The peer does not know any binary message types
+        encoded = binary_message.dumps(ping, 0)
+        assert encoded[:2] == b"\x00\x00"
+        decoded = binary_message.loads(encoded)
+        assert decoded.function == "ping"
+        assert decoded.data == {"nonce": bytes([1] * 32)}
+
+        # Messages without a binary message type
+        ack = Message(
+            "transaction_ack",
+            wallet_protocol.TransactionAck(
+                bytes([2] * 32), MempoolInclusionStatus.SUCCESS, None
+            ),
+        )
+        encoded = binary_message.dumps(ack, len(MESSAGE_TYPES))
+        assert encoded[:2] == b"\x00\x00"
+        assert binary_message.loads(encoded).function == "transaction_ack"
+
+    def test_invalid(self):
+        ping = Message("ping", shared_protocol.Ping(bytes([1] * 32)))
+        encoded = binary_message.dumps(ping, len(MESSAGE_TYPES))
+        assert binary_message.loads(encoded).data == ping.data
+
+        with pytest.raises(ProtocolError):
+            binary_message.loads(encoded[:-1])
+        with pytest.raises(ProtocolError):
+            binary_message.loads(encoded + b"\x00")
+        with pytest.raises(ProtocolError):
+            binary_message.loads((len(MESSAGE_TYPES) + 1).to_bytes(2, "big"))
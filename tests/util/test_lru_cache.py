@@ -0,0 +1,56 @@
+import unittest
+
+from src.util.lru_cache import FIFOCache, LRUCache
+
+
+class TestLRUCache(unittest.TestCase):
+    def test_eviction(self):
+        cache = LRUCache(2)
+        cache.put(1, "a")
+        cache.put(2, "b")
+        assert cache.get(1) == "a"
+        # 2 is now the least recently used
+        cache.put(3, "c")
+        assert 2 not in cache
+        assert cache.get(1) == "a"
+        assert cache.get(3) == "c"
+        assert len(cache) == 2
+
+    def test_remove(self):
+        cache = LRUCache(2)
+        cache.put(1, "a")
+        cache.remove(1)
+        cache.remove(2)
+        assert cache.get(1) is None
+        assert len(cache) == 0
+
+    def test_fifo(self):
+        evicted = []
+        cache = FIFOCache(2, lambda key, value: evicted.append(key))
+        cache.put(1, "a")
+        cache.put(2, "b")
+        assert cache.get(1) == "a"
+        cache.put(1, "c")
+        # 1 was inserted first, using or updating it does not keep it
+        cache.put(3, "d")
+        assert 1 not in cache
+        assert evicted == [1]
+        assert list(cache.items()) == [(2, "b"), (3, "d")]
+
+    def test_metrics(self):
+        cache = LRUCache(2)
+        for i in range(5):
+            cache.put(i, str(i))
+        cache.get(4)
+        cache.get(0)
+        assert cache.get_metrics() == {
+            "size": 2,
+            "capacity": 2,
+            "hits": 1,
+            "misses": 1,
+            "evictions": 3,
+        }
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,3 +1,4 @@
+import pickle
 import unittest
 from dataclasses import dataclass
 from typing import List, Optional
@@ -52,6 +53,79 @@ class TestStreamable(unittest.TestCase):
         except NotImplementedError:
             pass
 
+    def test_fixed_width_fields(self):
+        @dataclass(frozen=True)
+        @streamable
+        class TestClass4(Streamable):
+            a: uint32
+            b: bytes32
+            c: List[uint32]
+            d: List[bytes32]
+            e: Optional[uint32]
+            f: bytes
+            g: uint32
+
+        a = TestClass4(
+            uint32(1),
+            bytes32([2] * 32),
+            [uint32(3), uint32(4)],
+            [bytes32([5] * 32)],
+            None,
+            b"6",
+            uint32(7),
+        )
+        b: bytes = bytes(a)
+        assert b == (
+            bytes([0, 0, 0, 1])
+            + bytes([2] * 32)
+            + bytes([0, 0, 0, 2, 0, 0, 0, 3, 0, 0, 0, 4])
+            + bytes([0, 0, 0, 1])
+            + bytes([5] * 32)
+            + bytes([0])
+            + bytes([0, 0, 0, 1])
+            + b"6"
+            + bytes([0, 0, 0, 7])
+        )
+        assert TestClass4.from_bytes(b) == a
+        assert type(TestClass4.from_bytes(b).d[0]) is bytes32
+        assert TestClass4.parse_view(memoryview(bytes([9]) + b), 1) == (a, len(b) + 1)
+
+    def test_truncated_variable_size_fields(self):
+        @dataclass(frozen=True)
+        @streamable
+        class TestClass5(Streamable):
+            a: uint32
+            b: bytes
+
+        @dataclass(frozen=True)
+        @streamable
+        class TestClass6(Streamable):
+            a: uint32
+            b: str
+
+        for value in (
+            TestClass5(uint32(1), b"hello world"),
+            TestClass6(uint32(1), "hello world"),
+        ):
+            raw = bytes(value)
+            assert type(value).from_bytes(raw) == value
+            with self.assertRaises(ValueError):
+                type(value).from_bytes(raw[:-5])
+
+    def test_memoized_hash(self):
+        block = bt.create_genesis_block(test_constants, bytes([0] * 32), b"0")
+        copy = FullBlock.from_bytes(bytes(block))
+        header_hash = block.header_hash
+        assert block.header.get_hash() is header_hash
+        assert copy == block
+        assert copy.header_hash == header_hash
+        assert "_cached_hash" not in block.to_json_dict()["header"]
+
+        unpickled = pickle.loads(pickle.dumps(block))
+        assert "_cached_hash" not in unpickled.header.__dict__
+        assert unpickled == block
+        assert unpickled.header_hash == header_hash
+
     def test_json(self):
         block = bt.create_genesis_block(test_constants, bytes([0] * 32), b"0")
 
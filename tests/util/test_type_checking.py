@@ -4,6 +4,7 @@ from typing import Dict, List, Optional, Tuple
 
 from src.util.ints import uint8
 from src.util.type_checking import (
+    construct_unchecked,
     is_type_List,
     is_type_SpecificOptional,
     strictdataclass,
@@ -102,6 +103,22 @@ class TestStrictClass(unittest.TestCase):
 
         A()
 
+    def test_construct_unchecked(self):
+        @dataclass(frozen=True)
+        @strictdataclass
+        class TestClass:
+            a: uint8
+            b: List[uint8]
+
+        checked = TestClass(uint8(1), [uint8(2)])
+        unchecked = construct_unchecked(TestClass, [uint8(1), [uint8(2)]])
+        assert unchecked == checked
+        try:
+            construct_unchecked(TestClass, [uint8(1)])
+            assert False
+        except ValueError:
+            pass
+
 
 if __name__ == "__main__":
     unittest.main()